@@ -0,0 +1,442 @@
+"""DBサーバー・Webサーバーの負荷試験
+
+サーバーを子プロセスまたは同じプロセス内のスレッドで起動し、応答するまで待ってから
+指定した並列数でリクエストを送り続け、1秒あたりの処理件数と応答時間の
+パーセンタイル (p50 / p95 / p99) を出力する。結果は JSON に保存でき、
+以前の結果と比べて性能が落ちていれば終了コード1で終わる。
+
+    python bench/load_test.py --workload mixed --threads 16 --duration 10
+    python bench/load_test.py --workload select_by_id --spawn inprocess --output base.json
+    python bench/load_test.py --workload select_by_id --compare base.json --threshold 0.1
+    python bench/load_test.py --spawn none --db-port 8000 --web-port 8001   # 起動中のサーバーに対して実行
+    python bench/load_test.py --workload product_page --data-backend local   # WebサーバーがDBを直接読む
+    python bench/load_test.py --workload select_by_id --server-processes 4   # 4プロセスで起動 (プリフォーク)
+    python bench/load_test.py --workload mixed --server-replicas 4   # DBサーバーの読み取りをメモリ上のコピーから
+
+ワークロード: select_all, select_by_id, products_page, product_page, login,
+add_to_cart, mixed (読み取りと書き込みの混在)
+"""
+import argparse
+import http.client
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.http_servers import SERVER_MODES, wait_until_ready
+
+# 既定の結果の保存先
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# ログインに使うアカウント (web_server.USERS と同じ)
+USERNAME = 'admin'
+PASSWORD = 'password123'
+
+# ワークロードごとの (操作, 重み)
+WORKLOADS = {
+    'select_all': [('select_all', 1)],
+    'select_by_id': [('select_by_id', 1)],
+    'products_page': [('products_page', 1)],
+    'product_page': [('product_page', 1)],
+    'login': [('login', 1)],
+    'add_to_cart': [('add_to_cart', 1)],
+    'mixed': [('product_page', 50), ('products_page', 20), ('select_by_id', 15),
+              ('add_to_cart', 10), ('login', 5)],
+}
+
+# 操作ごとの (送信先, 正常とみなすステータス)
+# add_to_cart は在庫切れ (409) も正しい応答として数える
+OPERATIONS = {
+    'select_all': ('db', (200,)),
+    'select_by_id': ('db', (200,)),
+    'products_page': ('web', (200,)),
+    'product_page': ('web', (200,)),
+    'login': ('web', (302,)),
+    'add_to_cart': ('web', (302, 409)),
+}
+
+# 結果の比較で見る指標 (値が大きいほど良いものは True)
+COMPARED_METRICS = [('rps', True), ('p95', False), ('p99', False)]
+
+class Client:
+    """1スレッド分の接続 (DBサーバーとWebサーバーへの持続的接続とセッション)"""
+
+    def __init__(self, targets, max_product_id, seed):
+        self.targets = targets
+        self.max_product_id = max_product_id
+        self.rng = random.Random(seed)
+        self.connections = {}
+        self.cookie = None
+
+    def request(self, target, method, path, body=None, headers=None):
+        """リクエストを送り (ステータス, 応答ヘッダー) を返す (切断された接続は1回だけ張り直す)"""
+        headers = dict(headers or {})
+        if target == 'web' and self.cookie:
+            headers['Cookie'] = self.cookie
+        for attempt in range(2):
+            conn = self.connections.get(target)
+            if conn is None:
+                host, port = self.targets[target]
+                conn = self.connections[target] = http.client.HTTPConnection(host, port, timeout=30)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    self._close(target)
+                return response.status, response
+            except (OSError, http.client.HTTPException):
+                self._close(target)
+                if attempt == 1:
+                    raise
+
+    def login(self):
+        body = urlencode({'username': USERNAME, 'password': PASSWORD})
+        status, response = self.request('web', 'POST', '/login', body,
+                                        {'Content-Type': 'application/x-www-form-urlencoded'})
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';')[0]
+        return status
+
+    def run(self, operation):
+        """操作を1回実行しステータスを返す"""
+        product_id = self.rng.randint(1, self.max_product_id)
+        if operation == 'select_all':
+            return self.request('db', 'GET', '/select_all')[0]
+        if operation == 'select_by_id':
+            return self.request('db', 'GET', f'/select?id={product_id}')[0]
+        if operation == 'products_page':
+            return self.request('web', 'GET', '/products')[0]
+        if operation == 'product_page':
+            return self.request('web', 'GET', f'/product/{product_id}')[0]
+        if operation == 'login':
+            return self.login()
+        if operation == 'add_to_cart':
+            body = urlencode({'product_id': product_id, 'quantity': 1})
+            return self.request('web', 'POST', '/add_to_cart', body,
+                                {'Content-Type': 'application/x-www-form-urlencoded'})[0]
+        raise ValueError(f"不明な操作です: {operation}")
+
+    def close(self):
+        for target in list(self.connections):
+            self._close(target)
+
+    def _close(self, target):
+        conn = self.connections.pop(target, None)
+        if conn is not None:
+            conn.close()
+
+def percentile(sorted_values, fraction):
+    """昇順に並んだ値のパーセンタイル (最近傍順位法)"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, errors, elapsed):
+    """応答時間 (秒) のリストから集計値を作る (時間はミリ秒)"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': count / elapsed if elapsed > 0 else 0.0,
+        'mean': sum(values) / count * 1000 if count else 0.0,
+        'p50': percentile(values, 0.50) * 1000,
+        'p95': percentile(values, 0.95) * 1000,
+        'p99': percentile(values, 0.99) * 1000,
+        'max': values[-1] * 1000 if values else 0.0,
+    }
+
+def run_workload(targets, workload, threads, duration=None, requests=None,
+                 max_product_id=1, seed=0):
+    """threads 本のスレッドでワークロードを実行し、全体と操作ごとの集計を返す
+
+    duration (秒) を過ぎるか、合計 requests 件を送ったところで終了する。
+    """
+    operations = [name for name, _ in WORKLOADS[workload]]
+    weights = [weight for _, weight in WORKLOADS[workload]]
+    needs_session = any(OPERATIONS[name][0] == 'web' for name in operations)
+    per_thread = None if requests is None else max(1, requests // threads)
+    results = []
+    lock = threading.Lock()
+    ready = threading.Barrier(threads + 1)
+    deadline = [None]
+
+    def worker(index):
+        client = Client(targets, max_product_id, seed + index)
+        latencies = {name: [] for name in operations}
+        errors = {name: 0 for name in operations}
+        try:
+            if needs_session:
+                client.login()
+            ready.wait()
+            sent = 0
+            while (per_thread is None or sent < per_thread) and \
+                    (deadline[0] is None or time.perf_counter() < deadline[0]):
+                name = client.rng.choices(operations, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = client.run(name)
+                except (OSError, http.client.HTTPException):
+                    status = None
+                latencies[name].append(time.perf_counter() - started)
+                if status not in OPERATIONS[name][1]:
+                    errors[name] += 1
+                sent += 1
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            client.close()
+            with lock:
+                results.append((latencies, errors))
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    if duration is not None:
+        deadline[0] = started + duration
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = {'operations': {}}
+    for name in operations:
+        latencies = [value for result in results for value in result[0][name]]
+        errors = sum(result[1][name] for result in results)
+        summary['operations'][name] = summarize(latencies, errors, elapsed)
+    summary['total'] = summarize([value for result in results for values in result[0].values()
+                                  for value in values],
+                                 sum(sum(result[1].values()) for result in results), elapsed)
+    summary['elapsed'] = elapsed
+    return summary
+
+def compare_results(baseline, current, threshold):
+    """2つの結果を比べ、threshold (割合) を超えて悪化した指標の説明のリストを返す"""
+    regressions = []
+    sections = [('total', baseline.get('total'), current.get('total'))]
+    for name, metrics in current.get('operations', {}).items():
+        sections.append((name, baseline.get('operations', {}).get(name), metrics))
+    for name, before, after in sections:
+        if not before or not after:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before[metric], after[metric]
+            if old <= 0:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(f"{name} {metric}: {old:.2f} -> {new:.2f} ({change:+.1%})")
+    return regressions
+
+def print_summary(summary):
+    print(f"{'操作':<16}{'件数':>9}{'エラー':>8}{'件/秒':>10}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'最大':>9}  (ms)")
+    rows = list(summary['operations'].items())
+    if len(rows) > 1:
+        rows.append(('合計', summary['total']))
+    for name, metrics in rows:
+        print(f"{name:<16}{metrics['requests']:>9}{metrics['errors']:>8}{metrics['rps']:>10.1f}"
+              f"{metrics['p50']:>9.2f}{metrics['p95']:>9.2f}{metrics['p99']:>9.2f}"
+              f"{metrics['max']:>9.2f}")
+
+def free_port():
+    """空いているポート番号を取得"""
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+def start_subprocess_servers(db_port, web_port, mode, workers, data_backend='http',
+                             server_processes=1, server_replicas=0):
+    """サーバーを子プロセスで起動し、応答するまで待って Popen のリストを返す
+
+    server_processes が2以上の場合は各サーバーをプリフォークで起動する
+    (Webサーバーのセッションはワーカー間で共有できる sqlite にする)。
+    server_replicas が1以上の場合はDBサーバーの読み取りをメモリ上のコピーから行う。
+    """
+    processes = []
+    prefork = ['--processes', str(server_processes)] if server_processes > 1 else []
+    replicas = ['--replicas', str(server_replicas)] if server_replicas > 0 else []
+    sessions = ['--session-backend', 'sqlite'] if server_processes > 1 else []
+    commands = [
+        ([sys.executable, str(project_root / "db" / "db_server.py"), '--port', str(db_port),
+          '--mode', mode, '--workers', str(workers), '--access-log-sample', '0', *prefork, *replicas],
+         db_port, '/stats'),
+        ([sys.executable, str(project_root / "web" / "web_server.py"), '--port', str(web_port),
+          '--mode', mode, '--workers', str(workers), '--db-port', str(db_port),
+          '--access-log-sample', '0', '--data-backend', data_backend, *prefork, *sessions],
+         web_port, '/'),
+    ]
+    for command, port, probe in commands:
+        # 起動時のメッセージは計測結果の表示の邪魔になるため捨てる
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+        if not wait_until_ready('localhost', port, probe, timeout=30,
+                                is_alive=lambda: process.poll() is None):
+            stop_subprocess_servers(processes)
+            raise RuntimeError(f"サーバーが起動しませんでした: {' '.join(command)}")
+    return processes
+
+def stop_subprocess_servers(processes):
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def start_inprocess_servers(db_port, web_port, mode, workers, data_backend='http'):
+    """サーバーを同じプロセスのスレッドで起動し、応答するまで待つ (プロセスの終了とともに止まる)"""
+    from db.db_server import run_server
+    # Webサーバーのモジュールは web/ から直接読み込まれる前提 (render_select_all などを import する)
+    sys.path.append(str(project_root / "web"))
+    from web_server import run_web_server
+
+    # アクセスログはエラーだけを記録する
+    db_thread = threading.Thread(target=run_server, daemon=True,
+                                 kwargs={'port': db_port, 'mode': mode, 'workers': workers,
+                                         'access_log_sample': 0})
+    db_thread.start()
+    if not wait_until_ready('localhost', db_port, '/stats', is_alive=db_thread.is_alive):
+        raise RuntimeError("DBサーバーが起動しませんでした")
+    web_thread = threading.Thread(target=run_web_server, daemon=True,
+                                  kwargs={'port': web_port, 'mode': mode, 'workers': workers,
+                                          'db_port': db_port, 'access_log_sample': 0,
+                                          'data_backend': data_backend})
+    web_thread.start()
+    if not wait_until_ready('localhost', web_port, '/', is_alive=web_thread.is_alive):
+        raise RuntimeError("Webサーバーが起動しませんでした")
+
+def fetch_max_product_id(db_target):
+    """商品IDの最大値を取得 (商品の ID は1から連続している前提)"""
+    conn = http.client.HTTPConnection(*db_target, timeout=10)
+    try:
+        conn.request("GET", "/select?fields=id&order=-id&limit=1")
+        response = conn.getresponse()
+        data = json.loads(response.read().decode())
+    finally:
+        conn.close()
+    if response.status != 200 or not data.get('products'):
+        raise RuntimeError("商品を取得できませんでした")
+    return data['products'][0][0]
+
+def main():
+    parser = argparse.ArgumentParser(description='DBサーバー・Webサーバーの負荷試験')
+    parser.add_argument('--workload', choices=sorted(WORKLOADS), default='mixed')
+    parser.add_argument('--threads', type=int, default=8, help='同時に送信するクライアント数')
+    parser.add_argument('--duration', type=float, default=10.0, help='計測する秒数')
+    parser.add_argument('--requests', type=int, default=None,
+                        help='送信する合計件数 (指定すると --duration より先に達した方で終了)')
+    parser.add_argument('--warmup', type=float, default=1.0, help='計測前に送り続ける秒数')
+    parser.add_argument('--spawn', choices=['subprocess', 'inprocess', 'none'],
+                        default='subprocess',
+                        help='サーバーの起動方法 (none は起動中のサーバーに対して実行)')
+    parser.add_argument('--mode', choices=SERVER_MODES, default='threaded',
+                        help='起動するサーバーの並行処理モード')
+    parser.add_argument('--server-workers', type=int, default=None,
+                        help='起動するサーバーのワーカー数 (省略時はスレッド数の2倍)。'
+                             'threaded モードでは持続的接続1本がワーカーを1つ占有し、'
+                             'DBサーバーにはベンチマークとWebサーバーの両方から接続するため')
+    parser.add_argument('--data-backend', choices=['http', 'local'], default='http',
+                        help='Webサーバーの商品データの取得先 (local はDBサーバーを経由しない)')
+    parser.add_argument('--server-processes', type=int, default=1,
+                        help='起動するサーバーのプロセス数 (2以上でプリフォーク、--spawn subprocess のみ)')
+    parser.add_argument('--server-replicas', type=int, default=0,
+                        help='DBサーバーの読み取り用のメモリ上のコピーの数 (--spawn subprocess のみ)')
+    parser.add_argument('--products', type=int, default=1000,
+                        help='起動前にDBを作り直して投入する商品数 (0 で作り直さない)')
+    parser.add_argument('--db-port', type=int, default=None)
+    parser.add_argument('--web-port', type=int, default=None)
+    parser.add_argument('--host', default='localhost', help='--spawn none のときの接続先')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=None,
+                        help='結果の保存先 (省略時は bench/results/ワークロード-日時.json)')
+    parser.add_argument('--compare', type=Path, default=None, help='比較する以前の結果')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='性能の低下とみなす悪化の割合')
+    args = parser.parse_args()
+    if args.server_workers is None:
+        args.server_workers = args.threads * 2
+    if args.server_processes > 1 and args.spawn != 'subprocess':
+        parser.error('--server-processes は --spawn subprocess の場合のみ指定できます')
+    if args.server_replicas > 0 and args.spawn != 'subprocess':
+        parser.error('--server-replicas は --spawn subprocess の場合のみ指定できます')
+
+    processes = []
+    if args.spawn == 'none':
+        targets = {'db': (args.host, args.db_port or 8000), 'web': (args.host, args.web_port or 8001)}
+    else:
+        if args.products > 0:
+            from db.db_initialize import initialize_database
+            initialize_database(args.products)
+        db_port = args.db_port or free_port()
+        web_port = args.web_port or free_port()
+        targets = {'db': ('localhost', db_port), 'web': ('localhost', web_port)}
+        if args.spawn == 'subprocess':
+            processes = start_subprocess_servers(db_port, web_port, args.mode, args.server_workers,
+                                                 args.data_backend, args.server_processes,
+                                                 args.server_replicas)
+        else:
+            start_inprocess_servers(db_port, web_port, args.mode, args.server_workers,
+                                    args.data_backend)
+
+    try:
+        max_product_id = fetch_max_product_id(targets['db'])
+        if args.warmup > 0:
+            run_workload(targets, args.workload, args.threads, duration=args.warmup,
+                         max_product_id=max_product_id, seed=args.seed + 10000)
+        summary = run_workload(targets, args.workload, args.threads, duration=args.duration,
+                               requests=args.requests, max_product_id=max_product_id,
+                               seed=args.seed)
+    finally:
+        stop_subprocess_servers(processes)
+
+    result = {
+        'workload': args.workload,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'threads': args.threads, 'duration': args.duration, 'requests': args.requests,
+            'spawn': args.spawn, 'mode': args.mode, 'server_workers': args.server_workers,
+            'data_backend': args.data_backend, 'server_processes': args.server_processes,
+            'server_replicas': args.server_replicas,
+            'products': max_product_id,
+        },
+        **summary,
+    }
+    print(f"ワークロード: {args.workload}, スレッド数: {args.threads}, "
+          f"経過時間: {summary['elapsed']:.2f} 秒, 商品数: {max_product_id}")
+    print_summary(summary)
+
+    output = args.output or RESULTS_DIR / f"{args.workload}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"結果を保存しました: {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        if baseline.get('workload') != args.workload:
+            print(f"注意: 比較する結果のワークロードが異なります ({baseline.get('workload')})")
+        regressions = compare_results(baseline, result, args.threshold)
+        if regressions:
+            print(f"性能の低下 (しきい値 {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"性能の低下はありません (しきい値 {args.threshold:.0%})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
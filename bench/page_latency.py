@@ -0,0 +1,131 @@
+"""Webサーバーのデータの取得先 (http / local) ごとのページ単位の応答時間のベンチマーク
+
+DBサーバーとWebサーバーを子プロセスで起動し、1つのクライアントからページの種類ごとに
+順番にリクエストを送って応答時間のパーセンタイルを計る。取得先ごとにサーバーを
+起動し直し、最後に http (DBサーバーへの HTTP の往復) と local (同じプロセスで
+DBを直接読む) を並べて出力する。
+
+    python bench/page_latency.py --products 10000 --requests 500
+    python bench/page_latency.py --backends local --pages product_page,search
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from bench.load_test import (Client, fetch_max_product_id, free_port, start_subprocess_servers,
+                             stop_subprocess_servers, summarize)
+from db.pagination import encode_cursor
+
+# 検索ページで使う語 (カタログ生成の商品名・説明に含まれる語)
+SEARCH_TERMS = ['マウス', 'ワイヤレス', 'モニター 4K', 'キーボード', 'USB', 'ノイズキャンセリング',
+                'SSD', 'Bluetooth対応', 'ブラック', '静音']
+
+# ページの種類 -> (メソッド, パスを作る関数, 正常とみなすステータス)
+# products_page は同じページの再表示 (描画済みページの再検証)、products_cursor は
+# 毎回異なるページ (DBからの取得と描画) を表す
+PAGES = {
+    'products_page': ('GET', lambda rng, max_id: '/products', (200,)),
+    'products_cursor': ('GET', lambda rng, max_id:
+                        '/products?' + urlencode({'cursor': encode_cursor(rng.randint(0, max_id))}),
+                        (200,)),
+    'product_page': ('GET', lambda rng, max_id: f'/product/{rng.randint(1, max_id)}', (200,)),
+    'search': ('GET', lambda rng, max_id:
+               '/products?' + urlencode({'q': rng.choice(SEARCH_TERMS)}), (200,)),
+    'add_to_cart': ('POST', lambda rng, max_id: '/add_to_cart', (302, 409)),
+}
+
+def measure_pages(targets, pages, requests, warmup, max_product_id, seed):
+    """ページの種類ごとに requests 件を順番に送り、{ページ: 集計値} を返す"""
+    client = Client(targets, max_product_id, seed)
+    rng = random.Random(seed)
+    results = {}
+    try:
+        client.login()
+        for page in pages:
+            method, make_path, expected = PAGES[page]
+            latencies = []
+            errors = 0
+            for index in range(warmup + requests):
+                body = headers = None
+                if method == 'POST':
+                    body = urlencode({'product_id': rng.randint(1, max_product_id), 'quantity': 1})
+                    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+                path = make_path(rng, max_product_id)
+                started = time.perf_counter()
+                status, _ = client.request('web', method, path, body, headers)
+                elapsed = time.perf_counter() - started
+                if index < warmup:
+                    continue
+                if status in expected:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+            results[page] = summarize(latencies, errors, sum(latencies))
+    finally:
+        client.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='データの取得先ごとのページの応答時間')
+    parser.add_argument('--backends', default='http,local',
+                        help='比較する取得先 (カンマ区切り、http / local)')
+    parser.add_argument('--pages', default=','.join(PAGES),
+                        help=f'計測するページ (カンマ区切り、{", ".join(PAGES)})')
+    parser.add_argument('--requests', type=int, default=300, help='ページごとのリクエスト数')
+    parser.add_argument('--warmup', type=int, default=30, help='ページごとの計測前のリクエスト数')
+    parser.add_argument('--products', type=int, default=10000,
+                        help='起動前にDBを作り直して投入する商品数 (0 で作り直さない)')
+    parser.add_argument('--mode', default='threaded', help='起動するサーバーの並行処理モード')
+    parser.add_argument('--server-workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    backends = [name for name in args.backends.split(',') if name]
+    pages = [name for name in args.pages.split(',') if name]
+    unknown = [name for name in pages if name not in PAGES]
+    if unknown:
+        parser.error(f"不明なページです: {', '.join(unknown)}")
+
+    if args.products > 0:
+        from db.db_initialize import initialize_database
+        initialize_database(args.products)
+
+    results = {}
+    for backend in backends:
+        db_port, web_port = free_port(), free_port()
+        targets = {'db': ('localhost', db_port), 'web': ('localhost', web_port)}
+        processes = start_subprocess_servers(db_port, web_port, args.mode, args.server_workers,
+                                             backend)
+        try:
+            max_product_id = fetch_max_product_id(targets['db'])
+            results[backend] = measure_pages(targets, pages, args.requests, args.warmup,
+                                             max_product_id, args.seed)
+        finally:
+            stop_subprocess_servers(processes)
+
+    print(f"商品数: {max_product_id:,}, ページごとに {args.requests} 件 (1クライアントで順番に送信)")
+    header = f"{'ページ':<18}" + ''.join(f"{backend + ' p50':>12}{backend + ' p95':>12}"
+                                           for backend in backends)
+    if {'http', 'local'} <= set(backends):
+        header += f"{'p50 比':>10}"
+    print(header + "  (ミリ秒)")
+    for page in pages:
+        line = f"{page:<18}"
+        for backend in backends:
+            summary = results[backend][page]
+            line += f"{summary['p50']:>12.2f}{summary['p95']:>12.2f}"
+            if summary['errors']:
+                line += f" (エラー {summary['errors']})"
+        if {'http', 'local'} <= set(backends):
+            local = results['local'][page]['p50']
+            line += f"{results['http'][page]['p50'] / local:>9.2f}x" if local else f"{'-':>10}"
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""在庫予約の競合ベンチマーク
+
+在庫の限られた1つの商品に多数のスレッドから同時に予約を入れ、
+1秒あたりの処理件数と売り越しが起きないことを確認する。
+
+    python bench/reservation_contention.py --threads 32 --requests 20000 --stock 5000
+    python bench/reservation_contention.py --naive   # 読み取り→書き込みでの売り越しを再現
+    python bench/reservation_contention.py --http localhost:8000   # 起動中のDBサーバーに対して実行
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from db.connection_pool import ConnectionPool
+from db.reservation import OutOfStockError, ReservationStore
+from db.sqlite_profile import get_profile
+from web.db_client import DBClient
+
+def create_database(path, stock):
+    """商品が1件だけのベンチマーク用DBを作成"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute('''
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        description TEXT,
+        stock INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    conn.execute("INSERT INTO products (name, price, description, stock) VALUES (?, ?, ?, ?)",
+                 ('セール商品', 1000, 'ベンチマーク用', stock))
+    conn.commit()
+    conn.close()
+
+def naive_reserve(pool, product_id, quantity):
+    """在庫を読んでから書き戻す従来の方法 (競合すると更新が失われる)"""
+    conn = pool.acquire()
+    try:
+        stock = conn.execute("SELECT stock FROM products WHERE id = ?",
+                             (product_id,)).fetchone()[0]
+        if stock < quantity:
+            raise OutOfStockError(product_id, quantity, stock)
+        conn.execute("UPDATE products SET stock = ? WHERE id = ?", (stock - quantity, product_id))
+        conn.commit()
+    finally:
+        pool.release(conn)
+
+def run(reserve, threads, requests):
+    """threads 本のスレッドで合計 requests 件の予約を実行し、(成功, 在庫不足, エラー, 秒) を返す"""
+    counts = {'ok': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+    per_thread = requests // threads
+    start_barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        ok = rejected = errors = 0
+        start_barrier.wait()
+        for i in range(per_thread):
+            try:
+                if reserve(f"user-{index}-{i}"):
+                    ok += 1
+                else:
+                    rejected += 1
+            except OutOfStockError:
+                rejected += 1
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"エラー: {e}")
+        with lock:
+            counts['ok'] += ok
+            counts['rejected'] += rejected
+            counts['errors'] += errors
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return counts, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='在庫予約の競合ベンチマーク')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=20000, help='予約の合計件数')
+    parser.add_argument('--stock', type=int, default=5000, help='商品の初期在庫')
+    parser.add_argument('--naive', action='store_true',
+                        help='条件付き減算を使わず、読み取り→書き込みで在庫を減らす')
+    parser.add_argument('--http', metavar='HOST:PORT',
+                        help='起動中のDBサーバーの /reserve に対して実行 (商品ID 1 を使う)')
+    args = parser.parse_args()
+
+    if args.http:
+        host, _, port = args.http.partition(':')
+        client = DBClient(host, int(port or 8000), pool_size=args.threads)
+
+        def reserve(owner):
+            body = json.dumps({'product_id': 1, 'quantity': 1, 'owner': owner}).encode()
+            status, _, data = client.request("POST", "/reserve", body=body)
+            if status not in (200, 409):
+                raise RuntimeError(data.decode())
+            return status == 200
+
+        initial = client.get_json("/select?id=1")['products'][0][4]
+        counts, elapsed = run(reserve, args.threads, args.requests)
+        final = client.get_json("/select?id=1")['products'][0][4]
+        client.close()
+    else:
+        directory = tempfile.TemporaryDirectory()
+        path = Path(directory.name) / "bench.db"
+        create_database(path, args.stock)
+        pool = ConnectionPool(path, max_size=args.threads, pragmas=get_profile('performance'))
+        store = ReservationStore(pool)
+
+        if args.naive:
+            def reserve(owner):
+                naive_reserve(pool, 1, 1)
+                return True
+        else:
+            def reserve(owner):
+                store.reserve(1, 1, owner)
+                return True
+
+        initial = args.stock
+        counts, elapsed = run(reserve, args.threads, args.requests)
+        conn = pool.acquire()
+        final = conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0]
+        pool.release(conn)
+        pool.close()
+        directory.cleanup()
+
+    total = counts['ok'] + counts['rejected'] + counts['errors']
+    # 成功した予約の数だけ在庫が減っていなければ、更新が失われて売り越している
+    oversold = counts['ok'] - (initial - final)
+    print(f"方式: {'http' if args.http else 'naive' if args.naive else 'reservation'}")
+    print(f"スレッド数: {args.threads}, 予約件数: {total}, 経過時間: {elapsed:.2f} 秒")
+    print(f"処理件数: {total / elapsed:.0f} 件/秒")
+    print(f"成功: {counts['ok']}, 在庫不足: {counts['rejected']}, エラー: {counts['errors']}")
+    print(f"在庫: {initial} -> {final}, 売り越し: {oversold}")
+    return 1 if oversold > 0 or final < 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
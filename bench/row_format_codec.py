@@ -0,0 +1,111 @@
+"""応答形式 (json / columnar / binary) のエンコード・デコードのベンチマーク
+
+生成したカタログの行を各形式でエンコード・デコードし、1回あたりの時間、
+1秒あたりの行数、本文のサイズ (gzip 後も) を出力する。デコード結果が元の
+応答と一致することも確認する。
+
+    python bench/row_format_codec.py --rows 100000
+    python bench/row_format_codec.py --rows 1000 --repeat 200   # 1ページ程度の小さな応答
+    python bench/row_format_codec.py --http localhost:8000 --rows 10000   # 起動中のDBサーバーから取得
+"""
+import argparse
+import gzip
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.row_formats import FORMATS, decode_result, encode_result
+from db.catalog_generator import DEFAULT_SEED, generate_products
+from db.query_builder import TABLE_COLUMNS
+from web.db_client import DBClient
+
+COLUMNS = TABLE_COLUMNS['products']
+
+def generate_response(rows, seed):
+    """select_all と同じ形の応答データを作る"""
+    products = [[product_id, *product] for product_id, product
+                in enumerate(generate_products(rows, seed), start=1)]
+    return {'products': products, 'next_cursor': None}
+
+def best_of(repeat, function):
+    """repeat 回実行した中で最短の秒数と最後の戻り値"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def measure(data, repeat):
+    """形式ごとに {'encode', 'decode', 'size', 'gzip_size', 'exact'} を返す"""
+    results = {}
+    for fmt, content_type in FORMATS.items():
+        encode_seconds, body = best_of(repeat, lambda: encode_result(data, COLUMNS, fmt))
+        decode_seconds, decoded = best_of(repeat, lambda: decode_result(body, content_type))
+        results[fmt] = {
+            'encode': encode_seconds,
+            'decode': decode_seconds,
+            'size': len(body),
+            'gzip_size': len(gzip.compress(body, compresslevel=6, mtime=0)),
+            'exact': decoded['products'] == data['products']
+                     and decoded.get('next_cursor') == data.get('next_cursor'),
+        }
+    return results
+
+def fetch_http(address, rows, repeat):
+    """DBサーバーから各形式で取得し、(形式, 受信+デコードの秒数, サイズ) を返す"""
+    host, _, port = address.partition(':')
+    client = DBClient(host, int(port or 8000), pool_size=1, timeout=60)
+    path = f'/select_all?limit={rows}'
+    results = []
+    try:
+        for fmt in FORMATS:
+            def fetch():
+                _, headers, data = client.get_rows(path, headers={'Cache-Control': 'no-cache'},
+                                                   fmt=fmt)
+                return int(headers.get('Content-Length', 0)), len(data['products'])
+            seconds, (size, count) = best_of(repeat, fetch)
+            results.append((fmt, seconds, size, count))
+    finally:
+        client.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='応答形式のエンコード・デコードのベンチマーク')
+    parser.add_argument('--rows', type=int, default=100000, help='1回の応答に含める行数')
+    parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数 (最短の時間を使う)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--http', metavar='HOST:PORT', default=None,
+                        help='起動中のDBサーバーから取得する時間も計測する')
+    args = parser.parse_args()
+
+    data = generate_response(args.rows, args.seed)
+    results = measure(data, args.repeat)
+    baseline = results['json']
+    print(f"行数: {args.rows:,} (繰り返し {args.repeat} 回の最短)")
+    print(f"{'形式':<10}{'エンコード':>12}{'デコード':>12}{'デコード 行/秒':>16}"
+          f"{'サイズ':>14}{'gzip後':>12}  一致")
+    for fmt, result in results.items():
+        print(f"{fmt:<10}{result['encode'] * 1000:>10.1f}ms{result['decode'] * 1000:>10.1f}ms"
+              f"{args.rows / result['decode']:>16,.0f}{result['size']:>14,}"
+              f"{result['gzip_size']:>12,}  {'OK' if result['exact'] else 'NG'}")
+    for fmt, result in results.items():
+        if fmt != 'json':
+            print(f"{fmt}: エンコード {baseline['encode'] / result['encode']:.2f} 倍, "
+                  f"デコード {baseline['decode'] / result['decode']:.2f} 倍, "
+                  f"サイズ {result['size'] / baseline['size']:.0%} (json 比)")
+
+    if args.http:
+        print(f"\nDBサーバー ({args.http}) から limit={args.rows} で取得 (キャッシュを迂回)")
+        for fmt, seconds, size, count in fetch_http(args.http, args.rows, args.repeat):
+            print(f"{fmt:<10}{seconds * 1000:>10.1f}ms  {size:>12,} バイト  {count:,} 行")
+
+    if not all(result['exact'] for result in results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""セッションストアのベンチマーク
+
+指定した件数のセッションを作成した状態で、複数のスレッドから参照し続け、
+1秒あたりの参照件数とメモリ使用量を出力する。
+
+    python bench/session_lookup.py --sessions 1000000 --threads 8
+    python bench/session_lookup.py --backend sqlite --sessions 100000
+    python bench/session_lookup.py --shards 1   # ロックを分割しない場合との比較
+"""
+import argparse
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# プロジェクトルートと web/ へのパスを追加 (web のモジュールは直接読み込まれる前提)
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "web"))
+
+from session_store import (BACKENDS, DEFAULT_SHARDS, MemorySessionStore, SQLiteSessionStore,
+                           new_session_id)
+
+def max_rss_mib():
+    """プロセスの最大常駐メモリ (MiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run(store, session_ids, threads, duration, miss_rate):
+    """threads 本のスレッドで duration 秒間参照し、(参照件数, 見つかった件数, 秒) を返す"""
+    counts = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        rng = random.Random(index)
+        # 乱数の生成を計測から外すため、参照するIDを先に選んでおく
+        targets = [new_session_id() if rng.random() < miss_rate else rng.choice(session_ids)
+                   for _ in range(10000)]
+        lookups = hits = 0
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            for session_id in targets[:1000]:
+                if store.get(session_id) is not None:
+                    hits += 1
+            lookups += 1000
+            targets = targets[1000:] + targets[:1000]
+        with lock:
+            counts.append((lookups, hits))
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sum(c[0] for c in counts), sum(c[1] for c in counts), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='セッションストアのベンチマーク')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='memory')
+    parser.add_argument('--sessions', type=int, default=1000000, help='作成するセッション数')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='参照を続ける秒数')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help='memory の分割数')
+    parser.add_argument('--miss-rate', type=float, default=0.05,
+                        help='存在しないIDで参照する割合')
+    args = parser.parse_args()
+
+    directory = None
+    if args.backend == 'memory':
+        # 分割ごとの件数の偏りで上限に達して破棄されないよう余裕を持たせる
+        store = MemorySessionStore(max_sessions=args.sessions * 2, shards=args.shards)
+    else:
+        directory = tempfile.TemporaryDirectory()
+        store = SQLiteSessionStore(Path(directory.name) / "sessions.db",
+                                   pool_size=args.threads)
+
+    rss_before = max_rss_mib()
+    started = time.perf_counter()
+    if args.backend == 'memory':
+        session_ids = [store.create(f"user{i}") for i in range(args.sessions)]
+    else:
+        # 1件ずつコミットすると作成に時間がかかりすぎるため、まとめて投入する
+        expires_at = time.time() + store.ttl
+        session_ids = [new_session_id() for _ in range(args.sessions)]
+        conn = store.pool.acquire()
+        conn.executemany("INSERT INTO sessions (id, username, expires_at) VALUES (?, ?, ?)",
+                         ((sid, f"user{i}", expires_at) for i, sid in enumerate(session_ids)))
+        conn.commit()
+        store.pool.release(conn)
+    create_seconds = time.perf_counter() - started
+
+    lookups, hits, elapsed = run(store, session_ids, args.threads, args.duration, args.miss_rate)
+
+    print(f"ストア: {args.backend}" + (f" (分割数 {args.shards})" if args.backend == 'memory' else ''))
+    print(f"セッション数: {len(store):,}, 作成: {create_seconds:.1f} 秒 "
+          f"({args.sessions / create_seconds:,.0f} 件/秒)")
+    print(f"スレッド数: {args.threads}, 参照: {lookups:,} 件 / {elapsed:.2f} 秒 "
+          f"= {lookups / elapsed:,.0f} 件/秒 (見つかった割合 {hits / max(lookups, 1):.1%})")
+    print(f"最大常駐メモリ: {max_rss_mib():,.0f} MiB (作成前 {rss_before:,.0f} MiB)")
+
+    store.close()
+    if directory is not None:
+        directory.cleanup()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
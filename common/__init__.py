@@ -0,0 +1 @@
+# サーバー共通の部品をまとめたパッケージ
@@ -0,0 +1,91 @@
+import random
+import sys
+import threading
+import time
+from typing import List, Optional, TextIO
+
+# 間引かずに記録するステータス (これ以上は全て記録する)
+ALWAYS_LOG_STATUS = 500
+
+class AccessLog:
+    """間引きとバッファリングを行うアクセスログ
+
+    BaseHTTPRequestHandler はリクエストごとに標準エラー出力へ1行書き込むため、
+    大量のリクエストではその書き込み自体が負荷になる。ここでは sample_rate の
+    割合のリクエストだけを記録し (ステータス500以上は全て記録)、
+    buffer_lines 行たまるか flush_interval 秒経つとまとめて書き込む。
+    リクエストが途絶えても残りが書き込まれるよう、バッファが空でなくなった時点で
+    flush_interval 秒後に書き込むタイマーを仕掛ける。
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, sample_rate: float = 0.01,
+                 buffer_lines: int = 256, flush_interval: float = 1.0):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.buffer_lines = buffer_lines
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        # バッファに行がある間だけ動く書き込み用のタイマー
+        self._timer: Optional[threading.Timer] = None
+        self._stats = {'requests': 0, 'logged': 0, 'flushes': 0}
+
+    def log_request(self, client: str, requestline: str, status: int, duration: float) -> None:
+        """リクエストの終了を記録 (間引きの対象)"""
+        with self._lock:
+            self._stats['requests'] += 1
+        if status < ALWAYS_LOG_STATUS and (self.sample_rate <= 0
+                                           or random.random() >= self.sample_rate):
+            return
+        timestamp = time.strftime('%d/%b/%Y %H:%M:%S')
+        self.write(f'{client} - - [{timestamp}] "{requestline}" {status} '
+                   f'{duration * 1000:.1f}ms')
+
+    def write(self, line: str) -> None:
+        """1行を記録 (間引かない)"""
+        with self._lock:
+            self._stats['logged'] += 1
+            self._buffer.append(line)
+            if len(self._buffer) < self.buffer_lines and \
+                    time.monotonic() - self._last_flush < self.flush_interval:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            lines = self._take()
+        self._write(lines)
+
+    def flush(self) -> None:
+        """バッファの内容を書き込む"""
+        with self._lock:
+            lines = self._take()
+        self._write(lines)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buffered'] = len(self._buffer)
+        return stats
+
+    def _take(self) -> List[str]:
+        lines = self._buffer
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if lines:
+            self._stats['flushes'] += 1
+        return lines
+
+    def _write(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        stream = self.stream or sys.stderr
+        try:
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+        except (OSError, ValueError) as e:
+            print(f"アクセスログの書き込みエラー: {e}")
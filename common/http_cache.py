@@ -0,0 +1,72 @@
+import gzip
+import hashlib
+import zlib
+from typing import Optional
+
+# これより小さい本文は圧縮しても効果が薄いためそのまま返す
+MIN_COMPRESS_SIZE = 1024
+
+# 対応する Content-Encoding (優先順)
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+
+def make_etag(*parts) -> str:
+    """値の組から強い ETag を作る"""
+    digest = hashlib.sha1('\x00'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+def encoding_etag(etag: str, encoding: Optional[str]) -> str:
+    """Content-Encoding ごとに異なる ETag にする (強い ETag は表現ごとに一意である必要がある)"""
+    if not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def applied_encoding(encoding: Optional[str], size: int) -> Optional[str]:
+    """size バイトの本文に実際に付ける Content-Encoding (MIN_COMPRESS_SIZE 未満は圧縮しない)
+
+    ETag の encoding_etag にもこの値を渡し、圧縮しない本文は Accept-Encoding に
+    かかわらず同じ ETag にする。
+    """
+    return encoding if encoding and size >= MIN_COMPRESS_SIZE else None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match が ETag に一致するか (弱い比較)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding から使う圧縮形式を選ぶ (圧縮しない場合は None)"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """本文を指定の形式で圧縮"""
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(body, 6)
+    raise ValueError(f"未対応の圧縮形式です: {encoding}")
@@ -0,0 +1,298 @@
+import asyncio
+import http.client
+import io
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+from typing import Optional
+
+# run_server / run_web_server の --mode で選べる並行処理モード
+SERVER_MODES = ('single', 'threaded', 'async')
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """ワーカースレッド数と受付キューを制限したHTTPサーバー
+
+    受け付けた接続はスレッドプールで処理する。処理待ちの接続が
+    workers + queue_size に達すると accept を止め、以降の接続は
+    listen キュー (長さ queue_size) に滞留させる。
+    """
+
+    # ワーカーが複数あるため、ハンドラーは接続を維持してよい
+    keep_alive = True
+    # 持続的接続で次のリクエストを待つ秒数 (common.http_streaming.KeepAliveMixin)。
+    # 待っている間もワーカーを1つ占有するため、workers 個のアイドル接続で
+    # 他のクライアントが処理されなくならないよう短くする
+    keep_alive_timeout = 2.0
+    # 処理待ちが上限のときに空きを待ちながら停止の要求を確認する間隔 (秒)
+    slot_poll_interval = 0.5
+
+    def __init__(self, server_address, handler_class, workers: int = 8,
+                 queue_size: int = 64, bind_and_activate: bool = True):
+        self.workers = workers
+        # True にすると応答を返した接続を閉じる (drain 中に持続的接続を残さない)
+        self.draining = False
+        # shutdown() が呼ばれたか (空きを待っている accept のスレッドを止める)
+        self._stopping = False
+        # listen() のバックログ長 (server_activate で参照される)
+        self.request_queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='http-worker')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        """接続をワーカースレッドに渡す"""
+        # 空きを待ち続けると serve_forever がループに戻れず shutdown() が返らないため、
+        # 一定間隔で停止の要求を確認し、停止するなら受け付けた接続を閉じる
+        while not self._slots.acquire(timeout=self.slot_poll_interval):
+            if self._stopping:
+                self.shutdown_request(request)
+                return
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # シャットダウン済み
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stopping = False
+
+    def shutdown(self):
+        self._stopping = True
+        super().shutdown()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+class _BufferedSocket:
+    """asyncio で読み込み済みのリクエストをハンドラーに渡すための疑似ソケット
+
+    ハンドラーはワーカースレッドで動くため、書き込みはイベントループに
+    依頼し、送信バッファが掃けるまで待つ (大きな応答でもメモリが膨らまない)。
+    """
+
+    def __init__(self, raw_request: bytes, loop, writer):
+        self._raw_request = raw_request
+        self._loop = loop
+        self._writer = writer
+
+    def makefile(self, mode, bufsize=None):
+        return io.BytesIO(self._raw_request)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def sendall(self, data):
+        future = asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self._loop)
+        future.result()
+
+    async def _write(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+class AsyncioHTTPServer:
+    """asyncio で接続を受け付け、ハンドラーの処理をスレッドプールで実行するHTTPサーバー
+
+    接続の待ち受けとリクエストの読み込みはイベントループで行うため、
+    大量のアイドル接続があってもスレッドを消費しない。SQLite へのアクセスを
+    含むハンドラー本体は executor 上で実行されるので、既存の
+    BaseHTTPRequestHandler サブクラスをそのまま使える。
+    """
+
+    max_header_size = 65536
+    # 持続的接続で次のリクエストを待つ秒数
+    keep_alive_timeout = 15.0
+    keep_alive = True
+    # 停止時に処理中のリクエストの完了を待つ秒数 (0 なら待たずに打ち切る)
+    drain_timeout = 0.0
+
+    def __init__(self, server_address, handler_class, workers: int = 8,
+                 queue_size: int = 64, sock: Optional[socket.socket] = None):
+        self.RequestHandlerClass = handler_class
+        self.workers = workers
+        self.draining = False
+        self.socket = sock if sock is not None else \
+            socket.create_server(server_address, backlog=queue_size)
+        self.server_address = self.socket.getsockname()
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='http-async-worker')
+        self._loop = None
+        self._stopped = None
+        self._shutdown_requested = False
+        self._done = threading.Event()
+        # 接続ごとのタスクと、そのうち次のリクエストを待っているもの
+        self._clients = set()
+        self._idle = set()
+
+    def serve_forever(self):
+        """イベントループを起動してリクエストを処理"""
+        self._done.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._done.set()
+
+    async def _serve(self):
+        self._stopped = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        if self._shutdown_requested:
+            return
+        server = await asyncio.start_server(self._handle_client, sock=self.socket,
+                                            limit=self.max_header_size)
+        async with server:
+            await self._stopped.wait()
+            # 新しい接続の受け付けをやめ、リクエストを待っているだけの接続を閉じてから
+            # 処理中のリクエストが終わるのを待つ
+            server.close()
+            for task in list(self._idle):
+                task.cancel()
+            if self._clients and self.drain_timeout > 0:
+                await asyncio.wait(list(self._clients), timeout=self.drain_timeout)
+
+    def shutdown(self):
+        """serve_forever を停止し、終了するまで待つ"""
+        self._shutdown_requested = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+            self._done.wait()
+
+    def server_close(self):
+        self.socket.close()
+        self._executor.shutdown(wait=False)
+
+    async def _read_request(self, reader):
+        """ヘッダーと Content-Length 分の本文を読み込む (接続終了時は None)"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                          self.keep_alive_timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError):
+            return None
+        content_length = 0
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                content_length = int(value.strip() or 0)
+                break
+        body = await reader.readexactly(content_length) if content_length else b''
+        return head + body
+
+    async def _handle_client(self, reader, writer):
+        client_address = writer.get_extra_info('peername')
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            while not self._stopped.is_set():
+                self._idle.add(task)
+                try:
+                    raw_request = await self._read_request(reader)
+                finally:
+                    self._idle.discard(task)
+                if raw_request is None:
+                    break
+                close_connection = await self._loop.run_in_executor(
+                    self._executor, self._run_handler, raw_request, writer, client_address)
+                if close_connection:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError,
+                asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    def _run_handler(self, raw_request, writer, client_address):
+        """ワーカースレッドでハンドラーを1リクエスト分実行"""
+        sock = _BufferedSocket(raw_request, self._loop, writer)
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request = sock
+        handler.client_address = client_address
+        handler.server = self
+        try:
+            handler.setup()
+            try:
+                handler.close_connection = True
+                handler.handle_one_request()
+            finally:
+                handler.finish()
+        except ConnectionError:
+            return True
+        except Exception:
+            print(f"リクエスト処理中にエラーが発生しました ({client_address})")
+            traceback.print_exc()
+            return True
+        return handler.close_connection
+
+def _use_socket(httpd: HTTPServer, sock: socket.socket) -> HTTPServer:
+    """bind していないサーバーに待ち受け済みのソケットを使わせる"""
+    httpd.socket.close()
+    httpd.socket = sock
+    httpd.server_address = sock.getsockname()
+    # HTTPServer.server_bind と同じ属性を設定する
+    host, port = httpd.server_address[:2]
+    httpd.server_name = socket.getfqdn(host)
+    httpd.server_port = port
+    return httpd
+
+def make_server(server_address, handler_class, mode: str = 'threaded',
+                workers: int = 8, queue_size: int = 64,
+                sock: Optional[socket.socket] = None):
+    """並行処理モードに応じたHTTPサーバーを作成
+
+    sock に待ち受け済みのソケットを渡すと、server_address に bind せずにそれを使う
+    (common.prefork で親プロセスが作ったソケットを子プロセスで共有する場合など)。
+    """
+    if mode not in SERVER_MODES:
+        raise ValueError(f"不明なサーバーモードです: {mode}")
+    if mode == 'async':
+        return AsyncioHTTPServer(server_address, handler_class,
+                                 workers=workers, queue_size=queue_size, sock=sock)
+    bind = sock is None
+    if mode == 'single':
+        httpd = HTTPServer(server_address, handler_class, bind_and_activate=bind)
+    else:
+        httpd = ThreadPoolHTTPServer(server_address, handler_class, workers=workers,
+                                     queue_size=queue_size, bind_and_activate=bind)
+    return httpd if bind else _use_socket(httpd, sock)
+
+def wait_until_ready(host: str, port: int, path: str = '/', timeout: float = 10.0,
+                     is_alive=None) -> bool:
+    """サーバーが path に応答するまで待つ (timeout 秒以内に応答しなければ False)
+
+    is_alive にはサーバーのプロセスやスレッドが動いているかを返す関数を渡せる。
+    False を返した時点で待つのをやめる。
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_alive is not None and not is_alive():
+            return False
+        conn = http.client.HTTPConnection(host, port, timeout=1)
+        try:
+            conn.request("GET", path)
+            conn.getresponse().read()
+            return True
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.05)
+        finally:
+            conn.close()
+    return False
@@ -0,0 +1,73 @@
+class KeepAliveMixin:
+    """BaseHTTPRequestHandler の持続的接続の扱いを決めるミックスイン
+
+    接続ごとにワーカースレッドを1つ占有するサーバーでは、次のリクエストを待つ
+    だけの接続がスレッドを塞ぐ。サーバーに keep_alive_timeout があれば、
+    2つ目以降のリクエストはその秒数だけ待ち (送受信のタイムアウト timeout より
+    短い場合)、届かなければ接続を閉じてスレッドを空ける。
+    """
+
+    def _keep_alive(self):
+        """接続を維持してよいか
+
+        1スレッドで処理するサーバーでは、維持した接続が他のクライアントを
+        待たせてしまうため毎回切断する。
+        """
+        return getattr(self.server, 'keep_alive', False)
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self._wait_for_request():
+                break
+            self.handle_one_request()
+
+    def _wait_for_request(self):
+        """次のリクエストが届くまで待つ (keep_alive_timeout 秒以内に届かなければ False)"""
+        idle_timeout = getattr(self.server, 'keep_alive_timeout', None)
+        if idle_timeout is None or (self.timeout is not None and idle_timeout >= self.timeout):
+            return True
+        self.connection.settimeout(idle_timeout)
+        try:
+            # 先読みした分があればすぐに返り、なければ最初のバイトが届くまで待つ
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+class StreamingResponseMixin(KeepAliveMixin):
+    """BaseHTTPRequestHandler に本文を少しずつ送る応答を追加するミックスイン
+
+    HTTP/1.1 のクライアントにはチャンク転送、HTTP/1.0 のクライアントには
+    接続の切断で終端を示す形式で送る。チャンク転送を使うハンドラーは
+    protocol_version を 'HTTP/1.1' にしておく必要がある。
+    """
+
+    def _start_stream(self, content_type, headers=None):
+        """ストリーミング応答のヘッダーを送る"""
+        self._chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self._chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        if not self._chunked or not self._keep_alive():
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        """応答本文の一部を送る"""
+        if not data:
+            return
+        if self._chunked:
+            self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def _end_stream(self):
+        """ストリーミング応答を終える"""
+        if self._chunked:
+            self.wfile.write(b'0\r\n\r\n')
@@ -0,0 +1,300 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 応答時間のヒストグラムの区切り (秒)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prometheus のテキスト形式の Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ステータスがこの値以上のリクエストをエラーとして数える (4xx は利用者側の誤りとして除く)
+ERROR_STATUS = 500
+
+class Histogram:
+    """区切りごとの件数・合計・件数を持つヒストグラム (ロックは MetricsRegistry 側で取る)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # 末尾は +Inf の区切り
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, その値以下の件数) のリスト (Prometheus の形式)"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((_format_value(bound), total))
+        result.append(('+Inf', total + self.counts[-1]))
+        return result
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    items = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        items.append(f'{name}="{value}"')
+    return '{' + ','.join(items) + '}'
+
+class MetricsRegistry:
+    """HTTPサーバーの計測値を集め、Prometheus のテキスト形式で出力する
+
+    - {prefix}_requests_total{route, method, status}: リクエスト数
+    - {prefix}_request_errors_total{route}: ステータス500以上または例外で終わったリクエスト数
+    - {prefix}_request_duration_seconds{route}: 応答時間のヒストグラム
+    - {prefix}_phase_duration_seconds{route, phase}: 処理段階 (SQL の実行・シリアライズ・
+      ソケットへの書き込みなど) ごとの時間のヒストグラム
+    - {prefix}_requests_in_flight{route}: 処理中のリクエスト数
+    - add_stats() で登録した統計 (プール・キャッシュなど) のゲージ
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, int], int] = {}
+        self._errors: Dict[str, int] = {}
+        self._durations: Dict[str, Histogram] = {}
+        self._phases: Dict[Tuple[str, str], Histogram] = {}
+        self._in_flight: Dict[str, int] = {}
+        # (メトリクス名, 説明, 統計を返す関数)
+        self._stats: List[Tuple[str, str, Callable[[], Optional[Dict[str, Any]]]]] = []
+        # (メトリクス名, 説明, ラベル名, {ラベルの値: 統計} を返す関数)
+        self._labeled_stats: List[Tuple[str, str, str, Callable[[], Dict[Any, Dict[str, Any]]]]] = []
+
+    def start(self, route: str) -> None:
+        """リクエストの処理を開始"""
+        with self._lock:
+            self._in_flight[route] = self._in_flight.get(route, 0) + 1
+
+    def finish(self, route: str, method: str, status: int, duration: float,
+               phases: Optional[Dict[str, float]] = None) -> None:
+        """リクエストの処理が終わったときに結果を記録"""
+        with self._lock:
+            self._in_flight[route] -= 1
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if status >= ERROR_STATUS:
+                self._errors[route] = self._errors.get(route, 0) + 1
+            histogram = self._durations.get(route)
+            if histogram is None:
+                histogram = self._durations[route] = Histogram()
+            histogram.observe(duration)
+            for phase, seconds in (phases or {}).items():
+                histogram = self._phases.get((route, phase))
+                if histogram is None:
+                    histogram = self._phases[(route, phase)] = Histogram()
+                histogram.observe(seconds)
+
+    def add_stats(self, name: str, description: str,
+                  collect: Callable[[], Optional[Dict[str, Any]]]) -> None:
+        """統計の辞書を返す関数を登録 (数値の項目が {prefix}_{name}_{項目} のゲージになる)"""
+        self._stats.append((name, description, collect))
+
+    def add_labeled_stats(self, name: str, description: str, label: str,
+                          collect: Callable[[], Dict[Any, Dict[str, Any]]]) -> None:
+        """{ラベルの値: 統計の辞書} を返す関数を登録
+
+        数値の項目が {prefix}_{name}_{項目}{label="ラベルの値"} のゲージになる
+        (プリフォークのワーカーごとの統計など)。
+        """
+        self._labeled_stats.append((name, description, label, collect))
+
+    def totals(self) -> Dict[str, int]:
+        """全ルートの合計 (requests: 完了したリクエスト数, errors, in_flight: 処理中)"""
+        with self._lock:
+            return {
+                'requests': sum(self._requests.values()),
+                'errors': sum(self._errors.values()),
+                'in_flight': sum(self._in_flight.values()),
+            }
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で出力"""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            errors = sorted(self._errors.items())
+            in_flight = sorted(self._in_flight.items())
+            durations = sorted((route, h.cumulative(), h.sum, h.count)
+                               for route, h in self._durations.items())
+            phases = sorted((key, h.cumulative(), h.sum, h.count)
+                            for key, h in self._phases.items())
+        lines: List[str] = []
+        name = f'{self.prefix}_requests_total'
+        self._header(lines, name, 'counter', 'HTTPリクエスト数')
+        for (route, method, status), count in requests:
+            lines.append(f'{name}{_format_labels({"route": route, "method": method, "status": status})} {count}')
+        name = f'{self.prefix}_request_errors_total'
+        self._header(lines, name, 'counter', 'ステータス500以上で終わったリクエスト数')
+        for route, count in errors:
+            lines.append(f'{name}{_format_labels({"route": route})} {count}')
+        name = f'{self.prefix}_requests_in_flight'
+        self._header(lines, name, 'gauge', '処理中のリクエスト数')
+        for route, count in in_flight:
+            lines.append(f'{name}{_format_labels({"route": route})} {count}')
+        self._histograms(lines, f'{self.prefix}_request_duration_seconds', '応答時間 (秒)',
+                         [({'route': route}, buckets, total, count)
+                          for route, buckets, total, count in durations])
+        self._histograms(lines, f'{self.prefix}_phase_duration_seconds', '処理段階ごとの時間 (秒)',
+                         [({'route': route, 'phase': phase}, buckets, total, count)
+                          for (route, phase), buckets, total, count in phases])
+        for stats_name, description, collect in self._stats:
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"統計の取得エラー ({stats_name}): {e}")
+                continue
+            for key, value in sorted((stats or {}).items()):
+                if isinstance(value, (int, float)):
+                    metric = f'{self.prefix}_{stats_name}_{key}'
+                    self._header(lines, metric, 'gauge', f'{description}: {key}')
+                    lines.append(f'{metric} {_format_value(value)}')
+        for stats_name, description, label, collect in self._labeled_stats:
+            try:
+                series = collect()
+            except Exception as e:
+                print(f"統計の取得エラー ({stats_name}): {e}")
+                continue
+            # 項目ごとに HELP / TYPE を1回だけ書き、ラベルの値ごとの行を続ける
+            metrics: Dict[str, List[str]] = {}
+            for label_value, stats in sorted((series or {}).items()):
+                for key, value in sorted((stats or {}).items()):
+                    if isinstance(value, (int, float)):
+                        metrics.setdefault(key, []).append(
+                            f'{_format_labels({label: label_value})} {_format_value(value)}')
+            for key, values in metrics.items():
+                metric = f'{self.prefix}_{stats_name}_{key}'
+                self._header(lines, metric, 'gauge', f'{description}: {key}')
+                lines.extend(metric + value for value in values)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _header(lines: List[str], name: str, kind: str, description: str) -> None:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    def _histograms(self, lines: List[str], name: str, description: str,
+                    series: Iterable[Tuple[Dict[str, Any], List[Tuple[str, int]], float, int]]) -> None:
+        self._header(lines, name, 'histogram', description)
+        for labels, buckets, total, count in series:
+            for bound, cumulative in buckets:
+                lines.append(f'{name}_bucket{_format_labels({**labels, "le": bound})} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+class MetricsMixin:
+    """BaseHTTPRequestHandler にリクエストごとの計測とアクセスログを追加するミックスイン
+
+    サーバーに metrics (MetricsRegistry) があれば、ルートごとの件数と時間を記録する。
+    ルート名は _metrics_route() で決める (既定はパスそのもの。ID などを含むパスは
+    サブクラスでまとめて、ラベルの種類が増え続けないようにする)。
+    処理段階の時間は with self._phase('sql'): のように計る。
+    サーバーに access_log (AccessLog) があれば、標準エラー出力への1行ずつの書き込みの
+    代わりにそこへ記録する。
+    """
+
+    def handle_one_request(self):
+        self._metrics_started = None
+        self._phase_times = {}
+        self._response_status = None
+        try:
+            super().handle_one_request()
+        except Exception:
+            # 応答前に例外で終わったリクエストは500として記録する
+            if self._response_status is None:
+                self._response_status = 500
+            raise
+        finally:
+            if self._metrics_started is not None:
+                self._finish_request()
+            if getattr(self.server, 'draining', False):
+                # 停止中のサーバーは応答を返した接続を閉じ、次のリクエストを待たない
+                self.close_connection = True
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        self._metrics_started = time.perf_counter()
+        self._metrics_route_name = self._metrics_route(self.path.split('?', 1)[0])
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is not None:
+            metrics.start(self._metrics_route_name)
+        return True
+
+    def _metrics_route(self, path: str) -> str:
+        """メトリクスのラベルに使うルート名"""
+        return path
+
+    def send_response(self, code, message=None):
+        self._response_status = code
+        super().send_response(code, message)
+
+    @contextmanager
+    def _phase(self, name: str):
+        """処理段階の時間を計る (同じ段階を複数回計った場合は合計する)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = getattr(self, '_phase_times', None)
+            if phases is not None:
+                phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+    def _finish_request(self):
+        duration = time.perf_counter() - self._metrics_started
+        status = self._response_status or 500
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is not None:
+            metrics.finish(self._metrics_route_name, self.command, status, duration,
+                           self._phase_times)
+        access_log = getattr(self.server, 'access_log', None)
+        if access_log is not None:
+            access_log.log_request(self.address_string(), self.requestline, status, duration)
+
+    def _send_metrics(self):
+        """/metrics の応答 (メトリクスが無効なら404)"""
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is None:
+            self.send_error(404, 'Metrics are disabled')
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        if not getattr(self.server, 'keep_alive', False):
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code='-', size='-'):
+        # アクセスログはリクエストの終了時に応答時間と合わせて記録する
+        if getattr(self.server, 'access_log', None) is None:
+            super().log_request(code, size)
+
+    def log_message(self, format, *args):
+        access_log = getattr(self.server, 'access_log', None)
+        if access_log is None:
+            super().log_message(format, *args)
+        else:
+            # エラーなどのメッセージは間引かずに記録する
+            access_log.write(f"{self.address_string()} - {format % args}")
@@ -0,0 +1,347 @@
+import mmap
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict
+
+# 停止時に処理中のリクエストの完了を待つ秒数
+DRAIN_TIMEOUT = 10.0
+# drain の待ち時間を過ぎても終わらないワーカーを SIGKILL で止めるまでの追加の猶予 (秒)
+KILL_GRACE = 5.0
+# 起動直後に終了したワーカーを起動し直すまでの待ち時間 (続けて失敗するたびに倍にする)
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+# 起動からこの秒数以内に終了したワーカーは起動に失敗したとみなす
+MIN_UPTIME = 5.0
+# ワーカーが自分の統計を共有メモリに書き込む間隔 (秒)
+HEARTBEAT_INTERVAL = 1.0
+# 監視プロセスが子プロセスの終了を確認する間隔 (秒)
+POLL_INTERVAL = 0.1
+
+def create_listen_socket(server_address, backlog: int = 64, reuse_port: bool = False,
+                         listen: bool = True) -> socket.socket:
+    """待ち受け用のソケットを作る
+
+    reuse_port を指定すると SO_REUSEPORT を設定し、同じポートに複数のプロセスが
+    それぞれ bind できるようにする (接続はカーネルがソケットごとに振り分ける)。
+    listen=False の場合は bind だけ行う (ポートを確保しておくため)。
+    """
+    host = server_address[0]
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise ValueError("この環境では SO_REUSEPORT を使えません")
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(server_address)
+        if listen:
+            sock.listen(backlog)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+class WorkerTable:
+    """ワーカーごとの統計を置く共有メモリ (fork の前に作り、全プロセスから読み書きする)
+
+    項目ごとに書き込むプロセスが決まっている (pid・restarts・started は監視プロセス、
+    それ以外はワーカー自身) ため、ロックを使わずに項目単位で書き込む。
+    """
+
+    # (項目名, struct の型)。全て8バイト
+    FIELDS = (('pid', 'q'), ('restarts', 'q'), ('started', 'd'), ('heartbeat', 'd'),
+              ('requests', 'q'), ('errors', 'q'), ('in_flight', 'q'))
+    SLOT_SIZE = 8 * len(FIELDS)
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        # 無名の共有マッピング (fork した子プロセスと同じ領域を指す)
+        self._buffer = mmap.mmap(-1, self.SLOT_SIZE * slots)
+        self._offsets = {name: (offset * 8, '<' + code)
+                         for offset, (name, code) in enumerate(self.FIELDS)}
+
+    def set(self, index: int, **values) -> None:
+        """index 番のワーカーの項目を書き込む"""
+        for name, value in values.items():
+            offset, fmt = self._offsets[name]
+            struct.pack_into(fmt, self._buffer, index * self.SLOT_SIZE + offset, value)
+
+    def get(self, index: int) -> Dict[str, Any]:
+        """index 番のワーカーの項目を読む"""
+        return {name: struct.unpack_from(fmt, self._buffer, index * self.SLOT_SIZE + offset)[0]
+                for name, (offset, fmt) in self._offsets.items()}
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        """起動中のワーカーごとの統計 ({番号: 統計})"""
+        now = time.time()
+        result = {}
+        for index in range(self.slots):
+            slot = self.get(index)
+            if not slot['pid']:
+                continue
+            result[index] = {
+                'pid': slot['pid'],
+                'restarts': slot['restarts'],
+                'uptime': now - slot['started'],
+                'requests': slot['requests'],
+                'errors': slot['errors'],
+                'in_flight': slot['in_flight'],
+                # 最後に統計を書き込んでからの秒数 (大きい場合はワーカーが止まっている)
+                'heartbeat_age': now - slot['heartbeat'] if slot['heartbeat'] else -1,
+            }
+        return result
+
+class Worker:
+    """子プロセスで動く1つのワーカー (PreforkSupervisor が worker_main に渡す)"""
+
+    def __init__(self, index: int, sock: socket.socket, table: WorkerTable,
+                 drain_timeout: float = DRAIN_TIMEOUT):
+        self.index = index
+        self.socket = sock
+        self.table = table
+        self.drain_timeout = drain_timeout
+        self._stopping = threading.Event()
+        self._done = threading.Event()
+
+    def serve(self, httpd) -> None:
+        """SIGTERM / SIGINT を受けるまで httpd を動かす
+
+        停止の合図を受けると新しい接続の受け付けをやめ、応答を返した接続を閉じ、
+        処理中のリクエストが終わるまで (最大 drain_timeout 秒) 待ってから戻る。
+        サーバーに metrics があれば、このプロセスとワーカー全体の統計を追加する。
+        """
+        metrics = getattr(httpd, 'metrics', None)
+        if metrics is not None:
+            metrics.add_stats('process', 'このプロセス',
+                              lambda: {'worker': self.index, 'pid': os.getpid()})
+            metrics.add_labeled_stats('workers', 'プリフォークのワーカー', 'worker',
+                                      self.table.stats)
+        # async モードではイベントループの中で処理中のリクエストを待つ
+        httpd.drain_timeout = self.drain_timeout
+
+        def request_stop(signum, frame):
+            if self._stopping.is_set():
+                return
+            self._stopping.set()
+            httpd.draining = True
+            # shutdown は serve_forever の終了を待つため、別のスレッドから呼ぶ
+            threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        heartbeat = threading.Thread(target=self._heartbeat, args=(metrics,),
+                                     name='prefork-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            httpd.serve_forever()
+        finally:
+            if not self._wait_idle(metrics):
+                print(f"ワーカー {self.index}: {self.drain_timeout} 秒以内に"
+                      f"終わらなかったリクエストを打ち切ります")
+            httpd.server_close()
+            self._done.set()
+            heartbeat.join()
+            self._record(metrics)
+
+    def _wait_idle(self, metrics) -> bool:
+        """処理中のリクエストがなくなるまで待つ (時間内に終わらなければ False)"""
+        if metrics is None:
+            return True
+        deadline = time.monotonic() + self.drain_timeout
+        while metrics.totals()['in_flight'] > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _heartbeat(self, metrics) -> None:
+        while not self._done.wait(HEARTBEAT_INTERVAL):
+            self._record(metrics)
+
+    def _record(self, metrics) -> None:
+        """このワーカーの統計を共有メモリに書き込む"""
+        values = metrics.totals() if metrics is not None else {}
+        self.table.set(self.index, heartbeat=time.time(), **values)
+
+def _describe_exit(status: int) -> str:
+    code = os.waitstatus_to_exitcode(status)
+    if code < 0:
+        return f"シグナル {signal.Signals(-code).name}"
+    return f"終了コード {code}"
+
+class PreforkSupervisor:
+    """待ち受けソケットを共有する複数のワーカープロセスを起動・監視する
+
+    既定では監視プロセスで bind・listen したソケットを fork で子プロセスに引き継ぎ、
+    全てのワーカーが同じ受付キューから accept する。reuse_port を指定すると
+    各ワーカーが SO_REUSEPORT を付けたソケットをそれぞれ作り、カーネルが接続を
+    振り分ける (ワーカー間の偏りは少ないが、停止したワーカーの受付キューに
+    残っていた接続はリセットされる)。
+
+    異常終了したワーカーは同じ番号で起動し直す (起動直後の終了が続く場合は
+    間隔を空ける)。SIGTERM / SIGINT を受けると全ワーカーに SIGTERM を送り、
+    各ワーカーは処理中のリクエストを終えてから終了する (Worker.serve)。
+    drain_timeout + KILL_GRACE 秒経っても終わらないワーカーは SIGKILL で止める。
+    ワーカーごとの統計は共有メモリ (WorkerTable) に集め、どのワーカーの /metrics でも
+    {prefix}_workers_*{worker="番号"} として返す。
+
+    worker_main(worker) は子プロセスで呼ばれ、worker.socket を使うサーバーを作って
+    worker.serve(httpd) を呼ぶ。fork するため、run() はスレッドや DB への接続を
+    作る前に呼ぶこと。検索結果のキャッシュ・メモリ上のセッションなどはプロセスごとに
+    別々になる。
+    """
+
+    def __init__(self, server_address, processes: int, worker_main: Callable[[Worker], None],
+                 queue_size: int = 64, reuse_port: bool = False,
+                 drain_timeout: float = DRAIN_TIMEOUT, name: str = 'server'):
+        if processes < 1:
+            raise ValueError("processes は1以上を指定してください")
+        self.processes = processes
+        self.worker_main = worker_main
+        self.queue_size = queue_size
+        self.reuse_port = reuse_port
+        self.drain_timeout = drain_timeout
+        self.name = name
+        # reuse_port ではポートの確保だけ行う (listen すると接続がここにも振り分けられる)
+        self._socket = create_listen_socket(server_address, queue_size, reuse_port,
+                                            listen=not reuse_port)
+        self.server_address = self._socket.getsockname()
+        self.table = WorkerTable(processes)
+        self._workers: Dict[int, int] = {}  # pid -> ワーカー番号
+        self._started = [0.0] * processes
+        self._failures = [0] * processes
+        self._next_start = [0.0] * processes
+        self._stopping = False
+
+    def run(self) -> None:
+        """ワーカーを起動し、SIGTERM / SIGINT を受けて全て終了するまで監視する"""
+        previous = {sig: signal.signal(sig, self._request_stop)
+                    for sig in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            while not self._stopping:
+                self._reap()
+                self._spawn_missing()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self._stopping = True
+            self._stop_workers()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            self._socket.close()
+        for index in range(self.processes):
+            slot = self.table.get(index)
+            print(f"{self.name}: ワーカー {index}: リクエスト {slot['requests']} 件, "
+                  f"エラー {slot['errors']} 件, 再起動 {slot['restarts']} 回")
+
+    def stop(self) -> None:
+        """run() を終了させる (シグナルハンドラーと同じ)"""
+        self._stopping = True
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        return self.table.stats()
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn_missing(self) -> None:
+        running = set(self._workers.values())
+        now = time.monotonic()
+        for index in range(self.processes):
+            if index not in running and now >= self._next_start[index]:
+                self._spawn(index)
+
+    def _spawn(self, index: int) -> None:
+        # 子プロセスに書き込み前のバッファを引き継がない
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.table.set(index, pid=0, heartbeat=0.0, requests=0, errors=0, in_flight=0)
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(index)
+        self._workers[pid] = index
+        self._started[index] = time.monotonic()
+        self.table.set(index, pid=pid, started=time.time())
+
+    def _run_worker(self, index: int) -> None:
+        """子プロセスでワーカーを動かし、終わったらプロセスを終了する (戻らない)"""
+        code = 0
+        try:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            sock = self._socket
+            if self.reuse_port:
+                sock = create_listen_socket(self.server_address, self.queue_size,
+                                            reuse_port=True)
+                self._socket.close()
+            self.worker_main(Worker(index, sock, self.table, self.drain_timeout))
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            # 親プロセスから引き継いだ atexit などを実行しない
+            os._exit(code)
+
+    def _reap(self) -> None:
+        """終了した子プロセスを回収する"""
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._workers.clear()
+                return
+            if pid == 0:
+                return
+            index = self._workers.pop(pid, None)
+            if index is not None:
+                self._on_exit(index, pid, status)
+
+    def _on_exit(self, index: int, pid: int, status: int) -> None:
+        self.table.set(index, pid=0)
+        if self._stopping:
+            return
+        uptime = time.monotonic() - self._started[index]
+        self._failures[index] = self._failures[index] + 1 if uptime < MIN_UPTIME else 0
+        delay = 0.0
+        if self._failures[index]:
+            delay = min(RESTART_DELAY * 2 ** (self._failures[index] - 1), MAX_RESTART_DELAY)
+        self._next_start[index] = time.monotonic() + delay
+        self.table.set(index, restarts=self.table.get(index)['restarts'] + 1)
+        print(f"{self.name}: ワーカー {index} (pid {pid}) が終了しました "
+              f"({_describe_exit(status)})。{delay:.1f} 秒後に起動し直します")
+
+    def _stop_workers(self) -> None:
+        """全ワーカーに SIGTERM を送り、終わらないものは SIGKILL で止める"""
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.drain_timeout + KILL_GRACE
+        while self._workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(POLL_INTERVAL)
+        if self._workers:
+            print(f"{self.name}: 終了しないワーカーを強制終了します: "
+                  f"{', '.join(str(index) for index in sorted(self._workers.values()))}")
+            self._signal_workers(signal.SIGKILL)
+            for pid, index in list(self._workers.items()):
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+                self.table.set(index, pid=0)
+            self._workers.clear()
+
+    def _signal_workers(self, sig) -> None:
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,252 @@
+import json
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 行の一覧を返す応答の形式 -> Content-Type
+#   json: {"products": [[id, name, ...], ...], ...} (従来の形式、既定)
+#   columnar: {"columns": [列名, ...], "products": [[列1の値, ...], [列2の値, ...], ...], ...}
+#   binary: 列ごとに型付き配列を並べた長さ付きのバイナリ (encode_binary を参照)
+FORMATS = {
+    'json': 'application/json',
+    'columnar': 'application/x-columnar+json',
+    'binary': 'application/x-catalog-rows',
+}
+
+CONTENT_TYPES = {content_type: name for name, content_type in FORMATS.items()}
+
+# 行の一覧を持つ応答のキー
+ROWS_KEY = 'products'
+
+# バイナリ形式: 識別子, 行数, 列数, 付加情報 (JSON) のバイト数
+_HEADER = struct.Struct('<4sIHI')
+MAGIC = b'CRW1'
+# 列ごと: 列名のバイト数, 型, NULL を含むか, 値の部分のバイト数
+_COLUMN = struct.Struct('<HBBI')
+
+# 列の型 (値の部分の表現)
+TYPE_INT = 1    # 64ビット整数の配列
+TYPE_FLOAT = 2  # 倍精度浮動小数点数の配列
+TYPE_TEXT = 3   # 全文字列を NUL で区切って連結した UTF-8 (値に NUL を含まない場合)
+TYPE_JSON = 4   # 型が混在する列など: 値の JSON 配列
+TYPE_INT32 = 5  # 32ビットに収まる整数の配列
+TYPE_TEXT_LENGTHS = 6  # 各文字列の長さ (文字数、32ビット) の配列 + 全文字列を連結した UTF-8
+
+# TYPE_TEXT の区切り文字 (デコード時に str.split でまとめて分割できる)
+TEXT_SEPARATOR = '\x00'
+
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+# 配列はリトルエンディアンで書く (ビッグエンディアンの環境では入れ替える)
+_SWAP = sys.byteorder == 'big'
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Accept ヘッダーから応答の形式を選ぶ (q の大きい順、同じなら指定順。既定は json)"""
+    if not accept:
+        return 'json'
+    best, best_quality = 'json', 0.0
+    for item in accept.split(','):
+        media_type, _, params = item.strip().partition(';')
+        name = CONTENT_TYPES.get(media_type.strip().lower())
+        if name is None:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+def encode_result(data: Dict[str, Any], columns: Sequence[str], fmt: str = 'json') -> bytes:
+    """data[ROWS_KEY] に行の一覧を持つ応答を指定の形式でエンコード
+
+    columns は行の各値の列名。ROWS_KEY 以外のキー (next_cursor など) はそのまま含める。
+    """
+    if fmt == 'json':
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+    if fmt == 'columnar':
+        return json.dumps(to_columnar(data, columns), ensure_ascii=False).encode('utf-8')
+    if fmt == 'binary':
+        return encode_binary(data, columns)
+    raise ValueError(f"未対応の形式です: {fmt}")
+
+def decode_result(body: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """応答の本文を行形式の辞書に戻す (形式は Content-Type で判定)
+
+    columnar / binary の場合は columns (列名のリスト) も含む。
+    """
+    media_type = (content_type or '').partition(';')[0].strip().lower()
+    fmt = CONTENT_TYPES.get(media_type, 'json')
+    if fmt == 'binary':
+        return decode_binary(body)
+    data = json.loads(body.decode('utf-8'))
+    if fmt == 'columnar':
+        return from_columnar(data)
+    return data
+
+def _check_width(rows: List[Sequence[Any]], columns: Sequence[str]) -> None:
+    if rows and len(rows[0]) != len(columns):
+        raise ValueError(f"列数が一致しません: 行 {len(rows[0])}, 列名 {len(columns)}")
+
+def to_columnar(data: Dict[str, Any], columns: Sequence[str]) -> Dict[str, Any]:
+    """行形式の応答を列形式にする (列名は1回だけ、値は列ごとの配列)"""
+    rows = data[ROWS_KEY]
+    _check_width(rows, columns)
+    result = {'columns': list(columns)}
+    # 列の配列は zip で転置する (タプルは JSON の配列になる)
+    result[ROWS_KEY] = list(zip(*rows)) if rows else [[] for _ in columns]
+    for key, value in data.items():
+        if key not in result:
+            result[key] = value
+    return result
+
+def from_columnar(data: Dict[str, Any]) -> Dict[str, Any]:
+    """列形式の応答を行形式に戻す"""
+    result = dict(data)
+    result[ROWS_KEY] = list(map(list, zip(*data[ROWS_KEY])))
+    return result
+
+def _column_type(values: Sequence[Any]) -> Tuple[int, bool]:
+    """列の型と NULL を含むかを判定"""
+    kinds = set(map(type, values))
+    has_nulls = type(None) in kinds
+    kinds.discard(type(None))
+    if kinds <= {int}:
+        return TYPE_INT, has_nulls
+    if kinds == {float}:
+        return TYPE_FLOAT, has_nulls
+    if kinds == {str}:
+        return TYPE_TEXT, has_nulls
+    # bool (int の派生型) や型の混在は JSON でそのまま表す
+    return TYPE_JSON, False
+
+def _typed_array(typecode: str, values) -> bytes:
+    values = array(typecode, values)
+    if _SWAP:
+        values.byteswap()
+    return values.tobytes()
+
+def _encode_column(values: Sequence[Any]) -> Tuple[int, bool, bytes]:
+    """列の値を (型, NULL を含むか, 値の部分) にする"""
+    column_type, has_nulls = _column_type(values)
+    filled = values
+    if has_nulls:
+        # NULL の位置は別に持つため、値の部分には型に合う仮の値を入れる
+        placeholder = {TYPE_INT: 0, TYPE_FLOAT: 0.0, TYPE_TEXT: ''}[column_type]
+        filled = [placeholder if value is None else value for value in values]
+    try:
+        if column_type == TYPE_INT:
+            if not filled or (INT32_MIN <= min(filled) and max(filled) <= INT32_MAX):
+                return TYPE_INT32, has_nulls, _typed_array('i', filled)
+            return column_type, has_nulls, _typed_array('q', filled)
+        if column_type == TYPE_FLOAT:
+            return column_type, has_nulls, _typed_array('d', filled)
+        if column_type == TYPE_TEXT:
+            text = TEXT_SEPARATOR.join(filled)
+            if text.count(TEXT_SEPARATOR) == max(len(filled) - 1, 0):
+                return column_type, has_nulls, text.encode('utf-8')
+            # 値に区切り文字を含む列は長さを並べる
+            text = ''.join(filled).encode('utf-8')
+            return TYPE_TEXT_LENGTHS, has_nulls, _typed_array('I', map(len, filled)) + text
+    except OverflowError:
+        # 64ビットに収まらない整数や長すぎる文字列は JSON で表す
+        pass
+    return TYPE_JSON, False, json.dumps(list(values), ensure_ascii=False).encode('utf-8')
+
+def encode_binary(data: Dict[str, Any], columns: Sequence[str]) -> bytes:
+    """行形式の応答をバイナリ形式にエンコード
+
+    先頭に識別子・行数・列数・付加情報のバイト数、続いて付加情報 (ROWS_KEY 以外の
+    キーの JSON)、各列について 列名のバイト数・型・NULL を含むか・値の部分の
+    バイト数と列名、NULL を含む列は行ごとの NULL フラグ (1バイト)、値の部分を並べる。
+    数値は型付き配列のまま (32ビットに収まる整数は32ビット)、文字列は NUL で区切って
+    連結した UTF-8 (値に NUL を含む列は長さの配列と連結した UTF-8) で表すため、
+    値ごとに JSON を解析するより読み込みが速い。整数・浮動小数点数・文字列・NULL は
+    元の値にそのまま戻る。
+    """
+    rows = data[ROWS_KEY]
+    _check_width(rows, columns)
+    metadata = {key: value for key, value in data.items() if key not in (ROWS_KEY, 'columns')}
+    metadata = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    parts = [_HEADER.pack(MAGIC, len(rows), len(columns), len(metadata)), metadata]
+    column_values = list(zip(*rows)) if rows else [() for _ in columns]
+    for name, values in zip(columns, column_values):
+        column_type, has_nulls, payload = _encode_column(values)
+        encoded_name = name.encode('utf-8')
+        parts.append(_COLUMN.pack(len(encoded_name), column_type, has_nulls, len(payload)))
+        parts.append(encoded_name)
+        if has_nulls:
+            parts.append(bytes(value is None for value in values))
+        parts.append(payload)
+    return b''.join(parts)
+
+def _from_array(typecode: str, payload: memoryview) -> list:
+    values = array(typecode)
+    values.frombytes(payload)
+    if _SWAP:
+        values.byteswap()
+    return values.tolist()
+
+def _decode_column(column_type: int, payload: memoryview, count: int) -> list:
+    if column_type == TYPE_INT32:
+        return _from_array('i', payload)
+    if column_type == TYPE_INT:
+        return _from_array('q', payload)
+    if column_type == TYPE_FLOAT:
+        return _from_array('d', payload)
+    if column_type == TYPE_TEXT:
+        return str(payload, 'utf-8').split(TEXT_SEPARATOR) if count else []
+    if column_type == TYPE_TEXT_LENGTHS:
+        lengths_size = count * 4
+        text = str(payload[lengths_size:], 'utf-8')
+        ends = list(accumulate(_from_array('I', payload[:lengths_size])))
+        return [text[start:end] for start, end in zip([0] + ends, ends)]
+    if column_type == TYPE_JSON:
+        return json.loads(str(payload, 'utf-8'))
+    raise ValueError(f"不明な列の型です: {column_type}")
+
+def decode_binary(body: bytes) -> Dict[str, Any]:
+    """バイナリ形式を行形式の辞書 (columns を含む) に戻す (不正な形式は ValueError)"""
+    view = memoryview(body)
+    try:
+        magic, count, column_count, metadata_size = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("バイナリ形式の識別子が一致しません")
+        offset = _HEADER.size
+        metadata = json.loads(str(view[offset:offset + metadata_size], 'utf-8'))
+        offset += metadata_size
+        columns = []
+        column_values = []
+        for _ in range(column_count):
+            name_size, column_type, has_nulls, payload_size = _COLUMN.unpack_from(view, offset)
+            offset += _COLUMN.size
+            columns.append(str(view[offset:offset + name_size], 'utf-8'))
+            offset += name_size
+            nulls = None
+            if has_nulls:
+                nulls = view[offset:offset + count]
+                offset += count
+            values = _decode_column(column_type, view[offset:offset + payload_size], count)
+            offset += payload_size
+            if len(values) != count:
+                raise ValueError("列の値の数が行数と一致しません")
+            if nulls is not None:
+                values = [None if null else value for value, null in zip(values, nulls)]
+            column_values.append(values)
+    except struct.error:
+        raise ValueError("バイナリ形式が途中で終わっています")
+    if offset != len(body):
+        raise ValueError("バイナリ形式の末尾に余分なデータがあります")
+    result = {'columns': columns}
+    if column_values:
+        result[ROWS_KEY] = list(map(list, zip(*column_values)))
+    else:
+        result[ROWS_KEY] = [[] for _ in range(count)]
+    result.update(metadata)
+    return result
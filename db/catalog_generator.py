@@ -0,0 +1,79 @@
+import math
+import random
+from typing import Iterator, Tuple
+
+# 乱数の既定のシード (同じシードからは常に同じカタログが生成される)
+DEFAULT_SEED = 42
+
+# (カテゴリ名, 価格の中央値, 価格のばらつき, 説明に使う特徴)
+CATEGORIES = [
+    ('ノートパソコン', 98000, 0.45, ['Core i5搭載', 'Core i7搭載', 'メモリ16GB', 'SSD 512GB',
+                                 '14インチ', '軽量1.1kg', 'バッテリー最大18時間']),
+    ('デスクトップPC', 128000, 0.5, ['Ryzen 7搭載', 'メモリ32GB', 'SSD 1TB', '静音設計',
+                                  'Wi-Fi 6対応', 'グラフィックボード搭載']),
+    ('モニター', 24800, 0.5, ['23.8インチ', '27インチ', '4K対応', 'IPSパネル', '144Hz',
+                            'USB Type-C給電', 'フリッカーフリー']),
+    ('キーボード', 6980, 0.6, ['メカニカル', '静音', 'テンキーレス', 'Bluetooth接続',
+                             '日本語配列', 'バックライト付き']),
+    ('マウス', 3480, 0.6, ['ワイヤレス', '静音クリック', '5ボタン', '充電式',
+                         'Bluetooth対応', 'エルゴノミクス形状']),
+    ('ヘッドホン', 12800, 0.7, ['ノイズキャンセリング', 'ワイヤレス', 'ハイレゾ対応',
+                             '折りたたみ式', '外音取り込み']),
+    ('スピーカー', 8980, 0.7, ['Bluetooth対応', '防水', 'ステレオ', '重低音', 'USB給電']),
+    ('USBメモリ', 1980, 0.5, ['32GB', '64GB', '128GB', 'USB3.2対応', 'キャップレス']),
+    ('外付けSSD', 14800, 0.5, ['500GB', '1TB', '2TB', '耐衝撃', 'USB Type-C接続']),
+    ('ルーター', 11800, 0.5, ['Wi-Fi 6', 'メッシュ対応', 'IPv6対応', '有線LAN4ポート']),
+    ('ウェブカメラ', 5980, 0.5, ['フルHD', 'オートフォーカス', 'マイク内蔵', 'プライバシーシャッター']),
+    ('充電器', 2980, 0.5, ['急速充電', '65W', '2ポート', 'GaN採用', '折りたたみプラグ']),
+    ('ケーブル', 980, 0.5, ['USB Type-C', '1m', '2m', '編み込み', '100W対応']),
+    ('タブレット', 54800, 0.5, ['10.9インチ', '64GB', '256GB', 'ペン対応', 'Wi-Fiモデル']),
+    ('プリンター', 19800, 0.5, ['インクジェット', 'レーザー', '無線LAN対応', '両面印刷',
+                             'スキャナー付き']),
+]
+
+BRANDS = ['アオバ', 'ヒカリ電機', 'ミナト', 'サクラテック', 'ツバサ', 'ホクト', 'カエデ',
+          'シラカバ', 'ユズリハ', 'コスモ工業', 'ナギサ', 'イブキ']
+
+SERIES = ['プロ', 'ライト', 'エアー', 'プラス', 'ミニ', 'マックス', 'スリム', 'ネオ', 'ゼロ', 'エックス']
+
+COLORS = ['ブラック', 'ホワイト', 'シルバー', 'ネイビー', 'グレー', 'レッド', 'ブルー']
+
+PHRASES = ['在宅勤務におすすめ', '初めての方にも使いやすい', 'ビジネスにもプライベートにも',
+           '長く使える丈夫な作り', '省スペース設計', '持ち運びに便利', 'ゲームにも最適',
+           'シンプルなデザイン', '1年保証付き', '人気の定番モデル']
+
+def _price(rng: random.Random, median: int, spread: float) -> int:
+    """対数正規分布の価格を「〜80円」「〜00円」の値付けに丸める"""
+    price = median * math.exp(rng.gauss(0, spread))
+    if price >= 10000:
+        return max(int(round(price, -3)) - 200, 980)
+    return max(int(round(price, -2)) - 20, 180)
+
+def _stock(rng: random.Random) -> int:
+    """在庫数 (品切れ・少量・通常・大量在庫が混ざる分布)"""
+    roll = rng.random()
+    if roll < 0.08:
+        return 0
+    if roll < 0.30:
+        return rng.randint(1, 5)
+    if roll < 0.95:
+        return int(rng.expovariate(1 / 40)) + 1
+    return rng.randint(500, 5000)
+
+def generate_products(count: int, seed: int = DEFAULT_SEED) -> Iterator[Tuple[str, int, str, int]]:
+    """(商品名, 価格, 説明, 在庫) を count 件生成する
+
+    全てを一度にメモリに載せないようジェネレーターとして返す。
+    """
+    rng = random.Random(seed)
+    for number in range(1, count + 1):
+        category, median, spread, features = CATEGORIES[rng.randrange(len(CATEGORIES))]
+        brand = rng.choice(BRANDS)
+        series = rng.choice(SERIES)
+        model = f"{rng.choice('ABCDEFGHKMNRSTXZ')}{rng.randint(100, 9999)}"
+        name = f"{brand} {category} {series} {model}"
+        if rng.random() < 0.4:
+            name += f" {rng.choice(COLORS)}"
+        chosen = rng.sample(features, k=min(len(features), rng.randint(2, 4)))
+        description = f"{'、'.join(chosen)}の{category}。{rng.choice(PHRASES)}。型番 {model}-{number}"
+        yield name, _price(rng, median, spread), description, _stock(rng)
@@ -0,0 +1,231 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .sqlite_profile import apply_profile
+except ImportError:  # スクリプトとして直接実行された場合
+    from sqlite_profile import apply_profile
+
+# 接続ごとに保持するコンパイル済みの文の数 (sqlite3 の既定は128)
+STATEMENT_CACHE_SIZE = 256
+
+class PoolTimeoutError(Exception):
+    """コネクションの貸出待ちがタイムアウトした場合の例外"""
+    pass
+
+class ConnectionPool:
+    """SQLiteコネクションのスレッドセーフなプール
+
+    接続は使い回され、貸出時に接続ごとのPRAGMA設定は再実行されない。
+    プールが上限まで貸し出されている場合は timeout 秒まで返却を待つ。
+    """
+
+    def __init__(self, db_path, max_size: int = 8, timeout: float = 5.0,
+                 pragmas: Optional[Dict[str, Any]] = None,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 health_check_interval: Optional[float] = 30.0):
+        if max_size < 1:
+            raise ValueError("max_size は1以上を指定してください")
+        self.db_path = Path(db_path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(pragmas or {})
+        self.on_connect = on_connect
+        # 最後の返却からこの秒数以上経過した接続は貸出前に疎通確認する (None で無効)
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, 返却時刻, 世代)
+        self._in_use = {}     # conn -> 世代
+        self._size = 0
+        self._generation = 0
+        self._closed = False
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """新しい接続を作成し、接続ごとの初期設定を行う"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        try:
+            apply_profile(conn, self.pragmas)
+            if self.on_connect:
+                self.on_connect(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """接続が利用可能か確認"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """接続を借りる"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("コネクションプールはクローズ済みです")
+                if self._idle:
+                    # 直近に返却された接続を優先してページキャッシュを活かす
+                    conn, last_used, generation = self._idle.pop()
+                    self._stats['hits'] += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._stats['misses'] += 1
+                    conn, last_used, generation = None, None, self._generation
+                    break
+
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + timeout
+                    self._stats['waits'] += 1
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"{timeout}秒以内にコネクションを取得できませんでした")
+                waited_from = now
+                self._cond.wait(remaining)
+                self._stats['wait_time'] += time.monotonic() - waited_from
+
+        if conn is not None and self.health_check_interval is not None \
+                and time.monotonic() - last_used >= self.health_check_interval \
+                and not self._is_healthy(conn):
+            self._close_quietly(conn)
+            with self._cond:
+                self._stats['discarded'] += 1
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            self._in_use[conn] = generation
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """接続をプールに返却"""
+        reusable = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            reusable = False
+
+        with self._cond:
+            generation = self._in_use.pop(conn, None)
+            if generation is None:
+                # このプールから貸し出した接続ではない
+                return
+            if reusable and not self._closed and generation == self._generation:
+                self._idle.append((conn, time.monotonic(), generation))
+                self._cond.notify()
+                return
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+        self._close_quietly(conn)
+
+    def discard(self, conn: sqlite3.Connection) -> None:
+        """壊れた接続をプールに戻さずに破棄"""
+        with self._cond:
+            if self._in_use.pop(conn, None) is None:
+                return
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+        self._close_quietly(conn)
+
+    def reset(self) -> None:
+        """待機中の接続を閉じ、貸出中の接続は返却時に破棄させる
+
+        DBファイルを作り直した後など、既存の接続を使い回せない場合に呼び出す。
+        """
+        with self._cond:
+            self._generation += 1
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def close(self) -> None:
+        """プールを閉じる"""
+        with self._cond:
+            self._closed = True
+        self.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        """プールの利用統計を取得"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+            stats['max_size'] = self.max_size
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+        return stats
+
+    @staticmethod
+    def _close_quietly(conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+# DBファイルごとに共有するプール
+_pools: Dict[Path, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def configure_pool(db_path, **options) -> ConnectionPool:
+    """DBファイルに対応するプールを指定の設定で作り直す"""
+    key = Path(db_path).resolve()
+    with _pools_lock:
+        old = _pools.get(key)
+        _pools[key] = ConnectionPool(key, **options)
+    if old:
+        old.close()
+    return _pools[key]
+
+def get_pool(db_path, **options) -> ConnectionPool:
+    """DBファイルに対応する共有プールを取得 (なければ options の設定で作成)"""
+    key = Path(db_path).resolve()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key, **options)
+        return pool
+
+def reset_pools() -> None:
+    """全ての共有プールの接続を破棄"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.reset()
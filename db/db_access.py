@@ -1,50 +1,268 @@
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Tuple, Any, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .connection_pool import ConnectionPool, get_pool
+    from .index_advisor import IndexAdvisor
+    from .query_builder import SelectQuery
+    from .search import (DESCRIPTION_WEIGHT, MAX_SCAN_ROWS, NAME_WEIGHT,
+                         build_match_query, short_terms, split_terms)
+    from .sqlite_profile import DEFAULT_PROFILE, get_profile
+except ImportError:  # スクリプトとして直接実行された場合
+    from connection_pool import ConnectionPool, get_pool
+    from index_advisor import IndexAdvisor
+    from query_builder import SelectQuery
+    from search import (DESCRIPTION_WEIGHT, MAX_SCAN_ROWS, NAME_WEIGHT,
+                        build_match_query, short_terms, split_terms)
+    from sqlite_profile import DEFAULT_PROFILE, get_profile
+
+DB_PATH = Path(__file__).parent / "shop.db"
+
+# 一括書き込みで1回の executemany に渡す行数
+BULK_CHUNK_SIZE = 500
+
+def shared_pool() -> ConnectionPool:
+    """shop.db の共有プールを取得 (未設定なら既定プロファイルで作成)"""
+    return get_pool(DB_PATH, pragmas=get_profile(DEFAULT_PROFILE))
 
 class DatabaseAccess:
-    def __init__(self):
-        self.db_path = Path(__file__).parent / "shop.db"
+    def __init__(self, pool: Optional[ConnectionPool] = None,
+                 index_advisor: Optional[IndexAdvisor] = None):
+        self.db_path = DB_PATH
+        # 接続は with ブロックごとに共有プールから借りて返す
+        self.pool = pool if pool is not None else shared_pool()
+        # 指定すると実行するクエリの実行計画を記録する
+        self.index_advisor = index_advisor
+        self.conn = None
+        # 直近の操作で発生したエラー (各メソッドはエラー時に空の結果や False を返す)
+        self.last_error: Optional[sqlite3.Error] = None
+        # 直近の search が商品の一部 (先頭 MAX_SCAN_ROWS 件) だけを調べたか
+        self.search_truncated = False
+        # transaction() の入れ子の深さ (0 ならトランザクション外)
+        self._tx_depth = 0
 
     def __enter__(self):
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = self.pool.acquire()
         self.cursor = self.conn.cursor()
+        self.last_error = None
+        self._tx_depth = 0
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.conn:
-            self.conn.close()
+            self.cursor.close()
+            self.pool.release(self.conn)
+            self.conn = None
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """トランザクションのコンテキストマネージャー
+
+        ブロックを正常に抜けるとコミットし、例外が発生するとロールバックして
+        例外を送出し直す。ブロック内の insert / update / delete などは
+        その都度コミットせず、まとめて1回コミットされる。
+        入れ子にすると内側はセーブポイントになり、内側の失敗は内側の変更だけを取り消す。
+        immediate を指定すると開始時に書き込みロックを取得する (読み取り後に
+        書き込む場合に、途中でロックを取れずに失敗するのを防ぐ)。
+        """
+        depth = self._tx_depth
+        savepoint = f"tx_{depth}"
+        if depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        else:
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+        self._tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth = depth
+            if depth == 0:
+                self.conn.rollback()
+            else:
+                self.conn.execute(f"ROLLBACK TO {savepoint}")
+                self.conn.execute(f"RELEASE {savepoint}")
+            raise
+        self._tx_depth = depth
+        if depth == 0:
+            self.conn.commit()
+        else:
+            self.conn.execute(f"RELEASE {savepoint}")
+
+    @property
+    def in_transaction(self) -> bool:
+        """transaction() のブロック内かどうか"""
+        return self._tx_depth > 0
+
+    def _commit(self) -> None:
+        """トランザクション外であればコミット"""
+        if not self._tx_depth:
+            self.conn.commit()
+
+    def _execute(self, query: str, params: Any = ()) -> sqlite3.Cursor:
+        """クエリを実行 (index_advisor があれば実行計画を記録する)"""
+        if self.index_advisor is not None:
+            self.index_advisor.record(self.conn, query, params)
+        return self.cursor.execute(query, params)
+
+    @staticmethod
+    def pool_stats() -> dict:
+        """共有コネクションプールの統計を取得"""
+        return shared_pool().stats()
 
     def select_all(self, table: str) -> List[Tuple]:
         """テーブルの全レコードを取得"""
         try:
-            self.cursor.execute(f"SELECT * FROM {table}")
+            self._execute(f"SELECT * FROM {table}")
             return self.cursor.fetchall()
         except sqlite3.Error as e:
+            self.last_error = e
             print(f"選択エラー: {e}")
             return []
 
+    def select_page(self, table: str, limit: int, after_id: Optional[int] = None,
+                    offset: int = 0) -> Tuple[List[Tuple], Optional[int]]:
+        """1ページ分のレコードを id 順に取得
+
+        after_id を指定するとその id より後ろから読む (キーセット方式)。
+        戻り値は (レコード, 次ページの after_id)。最終ページなら後者は None。
+        """
+        try:
+            # 1件多く読んで次のページがあるかを判定する
+            if after_id is not None:
+                query = f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?"
+                self._execute(query, (after_id, limit + 1))
+            else:
+                query = f"SELECT * FROM {table} ORDER BY id LIMIT ? OFFSET ?"
+                self._execute(query, (limit + 1, offset))
+            rows = self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.last_error = e
+            print(f"選択エラー: {e}")
+            return [], None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1][0]
+        return rows, None
+
+    def iter_batches(self, table: str, batch_size: int = 500, limit: Optional[int] = None,
+                     after_id: Optional[int] = None, offset: int = 0) -> Iterator[List[Tuple]]:
+        """id 順のレコードを fetchmany で batch_size 件ずつ返す
+
+        結果全体をメモリに載せずに送信するためのもの。途中で失敗した場合に
+        呼び出し側で扱えるよう、sqlite3.Error はそのまま送出する。
+        """
+        query = f"SELECT * FROM {table}"
+        params: List[Any] = []
+        if after_id is not None:
+            query += " WHERE id > ?"
+            params.append(after_id)
+        query += " ORDER BY id"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset]
+        if self.index_advisor is not None:
+            self.index_advisor.record(self.conn, query, params)
+        cursor = self.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
     def select(self, table: str, conditions: dict) -> List[Tuple]:
         """条件付きでレコードを取得"""
         try:
             where_clause = " AND ".join([f"{k} = ?" for k in conditions.keys()])
             query = f"SELECT * FROM {table} WHERE {where_clause}"
-            self.cursor.execute(query, tuple(conditions.values()))
+            self._execute(query, tuple(conditions.values()))
             return self.cursor.fetchall()
         except sqlite3.Error as e:
+            self.last_error = e
             print(f"選択エラー: {e}")
             return []
 
+    def query(self, query: SelectQuery) -> List[Tuple]:
+        """query_builder で組み立てた条件で取得 (列の順序は query.fields)"""
+        try:
+            sql, params = query.to_sql()
+            self._execute(sql, params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.last_error = e
+            print(f"選択エラー: {e}")
+            return []
+
+    def search(self, text: str, limit: int,
+               offset: int = 0) -> Tuple[List[Tuple], Optional[int]]:
+        """商品名・説明を全文検索し、関連度の高い順に取得
+
+        空白で区切った全ての語を含む商品を返す。戻り値は (レコード, 次ページの offset)。
+        最終ページなら後者は None。一致した全ての商品を関連度で並べ替える
+        (FTS5 の rank で並べ、LIMIT / OFFSET の分だけ products と結合する)。
+        3文字未満の語は全文検索索引を使えないため、他の語で一致した商品を
+        LIKE による部分一致で絞り込む。全ての語が3文字未満の場合は、先頭
+        MAX_SCAN_ROWS 件の商品だけを LIKE で調べて id 順に返し、それより商品が
+        多ければ search_truncated を True にする。
+        """
+        self.search_truncated = False
+        terms = split_terms(text)
+        if not terms:
+            return [], None
+        match = build_match_query(terms)
+        like_terms = short_terms(terms)
+        condition = "(products.name LIKE ? ESCAPE '\\' OR products.description LIKE ? ESCAPE '\\')"
+        like_params: List[Any] = []
+        for term in like_terms:
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            like_params += [f"%{escaped}%"] * 2
+        like_clause = ' AND '.join([condition] * len(like_terms))
+        ranked = ("SELECT rowid, rank AS score FROM products_fts WHERE products_fts MATCH ? "
+                  f"AND rank MATCH 'bm25({NAME_WEIGHT}, {DESCRIPTION_WEIGHT})' ORDER BY rank")
+        try:
+            # 1件多く読んで次のページがあるかを判定する
+            if match is not None and not like_terms:
+                query = (f"SELECT products.* FROM ({ranked} LIMIT ? OFFSET ?) AS matches "
+                         "JOIN products ON products.id = matches.rowid "
+                         "ORDER BY matches.score, products.id")
+                params = [match, limit + 1, offset]
+            elif match is not None:
+                query = (f"SELECT products.* FROM ({ranked}) AS matches "
+                         f"JOIN products ON products.id = matches.rowid WHERE {like_clause} "
+                         "ORDER BY matches.score, products.id LIMIT ? OFFSET ?")
+                params = [match, *like_params, limit + 1, offset]
+            else:
+                query = ("SELECT * FROM (SELECT * FROM products ORDER BY id LIMIT ?) AS products "
+                         f"WHERE {like_clause} ORDER BY id LIMIT ? OFFSET ?")
+                params = [MAX_SCAN_ROWS, *like_params, limit + 1, offset]
+                self._execute("SELECT 1 FROM products ORDER BY id LIMIT 1 OFFSET ?",
+                              (MAX_SCAN_ROWS,))
+                self.search_truncated = self.cursor.fetchone() is not None
+            self._execute(query, params)
+            rows = self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.last_error = e
+            print(f"検索エラー: {e}")
+            return [], None
+        if len(rows) > limit:
+            return rows[:limit], offset + limit
+        return rows, None
+
     def insert(self, table: str, data: dict) -> bool:
         """新規レコードを挿入"""
         try:
             columns = ", ".join(data.keys())
             placeholders = ", ".join(["?" for _ in data])
             query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-            self.cursor.execute(query, tuple(data.values()))
-            self.conn.commit()
+            self._execute(query, tuple(data.values()))
+            self._commit()
             return True
         except sqlite3.Error as e:
+            self.last_error = e
             print(f"挿入エラー: {e}")
             return False
 
@@ -55,10 +273,11 @@ class DatabaseAccess:
             where_clause = " AND ".join([f"{k} = ?" for k in conditions.keys()])
             query = f"UPDATE {table} SET {set_clause} WHERE {where_clause}"
             values = tuple(data.values()) + tuple(conditions.values())
-            self.cursor.execute(query, values)
-            self.conn.commit()
+            self._execute(query, values)
+            self._commit()
             return True
         except sqlite3.Error as e:
+            self.last_error = e
             print(f"更新エラー: {e}")
             return False
 
@@ -67,13 +286,131 @@ class DatabaseAccess:
         try:
             where_clause = " AND ".join([f"{k} = ?" for k in conditions.keys()])
             query = f"DELETE FROM {table} WHERE {where_clause}"
-            self.cursor.execute(query, tuple(conditions.values()))
-            self.conn.commit()
+            self._execute(query, tuple(conditions.values()))
+            self._commit()
             return True
         except sqlite3.Error as e:
+            self.last_error = e
             print(f"削除エラー: {e}")
             return False
 
+    def insert_many(self, table: str, rows: List[dict],
+                    chunk_size: int = BULK_CHUNK_SIZE) -> List[Optional[str]]:
+        """複数のレコードを1トランザクションで挿入
+
+        戻り値は各行のエラーメッセージのリスト (成功した行は None)。
+        """
+        def build(columns):
+            placeholders = ", ".join(["?" for _ in columns])
+            return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+        return self._write_many(rows, build, None, chunk_size, "挿入")
+
+    def update_many(self, table: str, rows: List[dict], key: str = "id",
+                    chunk_size: int = BULK_CHUNK_SIZE) -> List[Optional[str]]:
+        """複数のレコードを1トランザクションで更新
+
+        各行の key 列でレコードを特定し、それ以外の列を更新する。
+        戻り値は各行のエラーメッセージのリスト (成功した行は None)。
+        一致するレコードがない行もエラーにはならない。
+        """
+        def build(columns):
+            set_clause = ", ".join([f"{c} = ?" for c in columns if c != key])
+            return f"UPDATE {table} SET {set_clause} WHERE {key} = ?"
+
+        def params(row):
+            return tuple(v for c, v in row.items() if c != key) + (row[key],)
+
+        return self._write_many(rows, build, params, chunk_size, "更新", key=key)
+
+    def upsert_many(self, table: str, rows: List[dict], key: str = "id",
+                    chunk_size: int = BULK_CHUNK_SIZE) -> List[Optional[str]]:
+        """複数のレコードを1トランザクションで挿入または更新
+
+        key 列が一致するレコードがあれば更新し、なければ挿入する
+        (key 列には主キーか一意制約が必要)。key 列のない行はそのまま挿入する。
+        戻り値は各行のエラーメッセージのリスト (成功した行は None)。
+        """
+        def build(columns):
+            placeholders = ", ".join(["?" for _ in columns])
+            updates = ", ".join([f"{c} = excluded.{c}" for c in columns if c != key])
+            action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                    f"ON CONFLICT({key}) {action}")
+
+        return self._write_many(rows, build, None, chunk_size, "挿入・更新")
+
+    def _write_many(self, rows: List[dict], build: Callable[[Tuple[str, ...]], str],
+                    params: Optional[Callable[[dict], tuple]], chunk_size: int, label: str,
+                    key: Optional[str] = None) -> List[Optional[str]]:
+        """行ごとの SQL を組み立て、同じ SQL が続く行を chunk_size 件ずつ executemany で実行
+
+        全体を1トランザクション (transaction() のブロック内ならセーブポイント) にまとめ、
+        チャンクごとにセーブポイントを置く。
+        失敗したチャンクはセーブポイントまで戻して1行ずつ実行し直し、
+        失敗した行だけをエラーとして記録する (他の行はコミットされる)。
+        key を指定すると、その列を含まない行は実行せずにエラーにする。
+        """
+        errors: List[Optional[str]] = [None] * len(rows)
+        statements: List[Optional[Tuple[str, tuple]]] = []
+        sql_cache: Dict[Tuple[str, ...], str] = {}
+        for i, row in enumerate(rows):
+            columns = tuple(row.keys())
+            if not columns:
+                errors[i] = "列が指定されていません"
+            elif key is not None and key not in row:
+                errors[i] = f"キー列 {key} が指定されていません"
+            elif params is not None and len(columns) == 1:
+                # 更新では key 以外の列が必要
+                errors[i] = "更新する列が指定されていません"
+            if errors[i] is not None:
+                statements.append(None)
+                continue
+            sql = sql_cache.get(columns)
+            if sql is None:
+                sql = sql_cache[columns] = build(columns)
+            statements.append((sql, params(row) if params else tuple(row.values())))
+
+        try:
+            with self.transaction():
+                run_sql, run = None, []
+                for i, statement in enumerate(statements):
+                    if statement is None:
+                        continue
+                    if run and (statement[0] != run_sql or len(run) >= chunk_size):
+                        self._execute_run(run_sql, run, statements, errors)
+                        run = []
+                    run_sql = statement[0]
+                    run.append(i)
+                if run:
+                    self._execute_run(run_sql, run, statements, errors)
+        except sqlite3.Error as e:
+            self.last_error = e
+            print(f"{label}エラー: {e}")
+            return [str(e)] * len(rows)
+
+        failed = [error for error in errors if error is not None]
+        if failed:
+            print(f"{label}エラー: {len(failed)} 件の行が失敗しました ({failed[0]} など)")
+        return errors
+
+    def _execute_run(self, sql: str, run: List[int], statements: list,
+                     errors: List[Optional[str]]) -> None:
+        """同じ SQL の行をまとめて実行し、失敗したら1行ずつ実行し直す"""
+        self.conn.execute("SAVEPOINT bulk_chunk")
+        try:
+            self.conn.executemany(sql, [statements[i][1] for i in run])
+        except sqlite3.Error:
+            self.conn.execute("ROLLBACK TO bulk_chunk")
+            # 失敗した文はその文の変更だけが取り消されるため、行ごとのセーブポイントは不要
+            for i in run:
+                try:
+                    self.conn.execute(sql, statements[i][1])
+                except sqlite3.Error as e:
+                    self.last_error = e
+                    errors[i] = str(e)
+        self.conn.execute("RELEASE bulk_chunk")
+
 # 使用例
 if __name__ == "__main__":
     # select_all の例
@@ -107,3 +444,17 @@ if __name__ == "__main__":
     with DatabaseAccess() as db:
         conditions = {"id": 5}
         db.delete("products", conditions)
+
+    # transaction の例 (複数の更新をまとめてコミット、失敗したら全て取り消す)
+    with DatabaseAccess() as db:
+        with db.transaction(immediate=True):
+            db.update("products", {"stock": 9}, {"id": 1})
+            db.update("products", {"stock": 4}, {"id": 2})
+
+    # insert_many の例 (1トランザクションでまとめて挿入)
+    with DatabaseAccess() as db:
+        errors = db.insert_many("products", [
+            {"name": "まとめ商品1", "price": 100, "description": "説明1", "stock": 1},
+            {"name": "まとめ商品2", "price": 200, "description": "説明2", "stock": 2},
+        ])
+        print("一括挿入の結果:", errors)
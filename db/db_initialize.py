@@ -1,21 +1,105 @@
+import argparse
 import sqlite3
+import time
+from itertools import islice
 from pathlib import Path
 import os
 
-def initialize_database():
+try:
+    from .catalog_generator import DEFAULT_SEED, generate_products
+    from .connection_pool import reset_pools
+    from .reservation import ensure_schema as ensure_reservation_schema
+    from .search import ensure_schema as ensure_search_schema
+except ImportError:  # スクリプトとして直接実行された場合
+    from catalog_generator import DEFAULT_SEED, generate_products
+    from connection_pool import reset_pools
+    from reservation import ensure_schema as ensure_reservation_schema
+    from search import ensure_schema as ensure_search_schema
+
+# よく使う検索条件の索引 (商品名での検索、価格・在庫での絞り込みと並べ替え)
+PRODUCT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)",
+    "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)",
+    "CREATE INDEX IF NOT EXISTS idx_products_stock ON products (stock)",
+]
+
+# 大量投入時に1トランザクションで挿入する行数
+LOAD_BATCH_SIZE = 50000
+
+# 大量投入中だけ使う設定 (途中で失敗した場合は作り直す前提で、安全性より速度を優先する)
+LOAD_PRAGMAS = {
+    'journal_mode': 'OFF',
+    'synchronous': 'OFF',
+    'cache_size': -262144,
+    'temp_store': 'MEMORY',
+}
+
+# サンプルデータ (商品数を指定しない場合に投入する)
+SAMPLE_PRODUCTS = [
+    ('ノートパソコン', 89800, 'Core i5搭載の高性能ノートPC', 10),
+    ('ワイヤレスマウス', 2980, 'Bluetooth対応ワイヤレスマウス', 50),
+    ('キーボード', 4980, 'メカニカルキーボード', 30),
+    ('モニター', 19800, '23.8インチフルHDディスプレイ', 15),
+    ('USBメモリ', 1980, '32GB USB3.0対応', 100)
+]
+
+def create_indexes(conn):
+    """商品テーブルの索引を作成"""
+    for statement in PRODUCT_INDEXES:
+        conn.execute(statement)
+    # 索引の選択に使う統計情報を更新
+    conn.execute("ANALYZE")
+
+def load_products(conn, products, batch_size=LOAD_BATCH_SIZE):
+    """商品を batch_size 件ずつ1トランザクションで挿入し、件数を返す"""
+    products = iter(products)
+    total = 0
+    while True:
+        batch = list(islice(products, batch_size))
+        if not batch:
+            break
+        conn.executemany('''
+        INSERT INTO products (name, price, description, stock)
+        VALUES (?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+        total += len(batch)
+        if total % (batch_size * 10) == 0:
+            print(f"{total:,} 件を投入しました...")
+    return total
+
+def initialize_database(product_count=None, seed=DEFAULT_SEED, batch_size=LOAD_BATCH_SIZE):
+    """データベースを作り直す
+
+    product_count を省略するとサンプルの5商品を投入する。指定すると seed から
+    決まる商品を product_count 件生成して投入する (同じ seed なら同じ内容になる)。
+    投入中は PRAGMA を緩め、索引と全文検索索引はデータの投入後にまとめて作成する。
+    戻り値は投入件数と所要時間の辞書 (失敗した場合は None)。
+    """
     # データベースファイルのパスを設定
     db_path = Path(__file__).parent / "shop.db"
     
-    # 既存のDBファイルがあれば削除
+    # プールに残っている接続は古いファイルを指したままになるため破棄
+    reset_pools()
+
+    # 既存のDBファイルがあれば削除 (WAL モードの付随ファイルも含む)
     if db_path.exists():
         os.remove(db_path)
         print("既存のデータベースファイルを削除しました。")
+    for suffix in ("-wal", "-shm"):
+        side_path = Path(str(db_path) + suffix)
+        if side_path.exists():
+            os.remove(side_path)
 
+    conn = None
     try:
         # データベースに接続
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
 
+        for name, value in LOAD_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
         # 商品テーブルの作成
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS products (
@@ -27,27 +111,44 @@ def initialize_database():
         )
         ''')
 
-        # サンプルデータの準備
-        sample_products = [
-            ('ノートパソコン', 89800, 'Core i5搭載の高性能ノートPC', 10),
-            ('ワイヤレスマウス', 2980, 'Bluetooth対応ワイヤレスマウス', 50),
-            ('キーボード', 4980, 'メカニカルキーボード', 30),
-            ('モニター', 19800, '23.8インチフルHDディスプレイ', 15),
-            ('USBメモリ', 1980, '32GB USB3.0対応', 100)
-        ]
-
-        # サンプルデータの挿入
-        cursor.executemany('''
-        INSERT INTO products (name, price, description, stock)
-        VALUES (?, ?, ?, ?)
-        ''', sample_products)
+        # 商品データの挿入 (索引がない状態で挿入する方が速い)
+        products = SAMPLE_PRODUCTS if product_count is None \
+            else generate_products(product_count, seed)
+        started = time.perf_counter()
+        total = load_products(conn, products, batch_size)
+        load_seconds = time.perf_counter() - started
+
+        # 索引と全文検索索引の作成 (以降の挿入・更新はトリガーで反映される)
+        started = time.perf_counter()
+        create_indexes(conn)
+        ensure_search_schema(conn)
+        index_seconds = time.perf_counter() - started
+
+        # 在庫の予約テーブルの作成
+        ensure_reservation_schema(conn)
 
         # 変更を確定
         conn.commit()
+
+        # WAL モードはDBファイルに記録され、以降の接続にも引き継がれる
+        cursor.execute("PRAGMA journal_mode = WAL")
         print("データベースの初期化が完了しました。")
 
+        result = {
+            'products': total,
+            'load_seconds': load_seconds,
+            'index_seconds': index_seconds,
+            'rows_per_sec': total / load_seconds if load_seconds > 0 else 0.0,
+        }
+        if product_count is not None:
+            print(f"{total:,} 件を {load_seconds:.1f} 秒で投入しました "
+                  f"({result['rows_per_sec']:,.0f} 件/秒)。"
+                  f"索引の作成: {index_seconds:.1f} 秒")
+        return result
+
     except sqlite3.Error as e:
         print(f"エラーが発生しました: {e}")
+        return None
     
     finally:
         # 接続を閉じる
@@ -55,4 +156,12 @@ def initialize_database():
             conn.close()
 
 if __name__ == "__main__":
-    initialize_database()
+    parser = argparse.ArgumentParser(description='データベースの初期化')
+    parser.add_argument('--products', type=int, default=None,
+                        help='生成する商品数 (省略時はサンプルの5商品)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help='商品を生成する乱数のシード')
+    parser.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE,
+                        help='1トランザクションで挿入する行数')
+    args = parser.parse_args()
+    initialize_database(args.products, args.seed, args.batch_size)
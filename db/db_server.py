@@ -1,109 +1,897 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler
+import argparse
 import json
+import sqlite3
+import sys
+from pathlib import Path
 from urllib.parse import urlparse, parse_qs
-from db_access import DatabaseAccess  # 相対インポートに変更
 
-class DBHandler(BaseHTTPRequestHandler):
+# プロジェクトルートへのパスを追加 (スクリプト実行・テストの両方で db パッケージとして読み込む)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.http_cache import (applied_encoding, compress, encoding_etag, etag_matches,
+                               make_etag, negotiate_encoding)
+from common.access_log import AccessLog
+from common.http_servers import SERVER_MODES, make_server
+from common.prefork import DRAIN_TIMEOUT, PreforkSupervisor
+from common.http_streaming import StreamingResponseMixin
+from common.metrics import MetricsMixin, MetricsRegistry
+from common.row_formats import FORMATS, encode_result, negotiate_format
+from db.connection_pool import configure_pool
+from db.db_access import DB_PATH, DatabaseAccess, shared_pool
+from db.index_advisor import IndexAdvisor
+from db.pagination import encode_cursor, parse_page_params
+from db.query_builder import TABLE_COLUMNS, QueryError, parse_select_params
+from db.query_cache import QueryCache, SharedTableVersions, TableVersions
+from db.replica import MAX_STALENESS, MIN_REFRESH_INTERVAL, ReadReplica
+from db.reservation import DEFAULT_TTL, OutOfStockError, ReservationStore
+from db.search import ensure_schema as ensure_search_schema
+from db.sqlite_profile import DEFAULT_PROFILE, PROFILES, WalCheckpointer, get_profile
+
+class BatchError(Exception):
+    """/batch の操作が失敗し、バッチ全体を取り消す場合の例外"""
+
+    def __init__(self, status, message, index):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.index = index
+
+class DBHandler(MetricsMixin, StreamingResponseMixin, BaseHTTPRequestHandler):
+    # 持続的接続とチャンク転送でのストリーミング応答に必要
+    protocol_version = 'HTTP/1.1'
+    # 送受信のタイムアウト (threaded モードで次のリクエストを待つ秒数は
+    # サーバーの keep_alive_timeout)
+    timeout = 15
+    # ヘッダーと本文を別々に書き込むため、Nagle アルゴリズムと遅延 ACK が重なると
+    # 小さな応答が約40ミリ秒待たされる (TCP_NODELAY を設定する)
+    disable_nagle_algorithm = True
+    # ストリーミング時に1回で読み出し・送信する行数
+    stream_batch_size = 500
+    _stream_encoder = json.JSONEncoder(ensure_ascii=False)
+    # /batch で使える操作
+    batch_operations = ('select', 'insert', 'update', 'delete')
+    # /bulk の op -> DatabaseAccess のメソッド名
+    bulk_operations = {'insert': 'insert_many', 'update': 'update_many', 'upsert': 'upsert_many'}
+    # メトリクスでルートごとに数えるパス (それ以外は other にまとめる)
+    metrics_routes = frozenset(['select_all', 'select', 'search', 'reservations', 'index_advisor',
+                                'stats', 'metrics', 'insert', 'bulk', 'batch', 'reserve',
+                                'release', 'confirm', 'update', 'delete'])
+
     def do_GET(self):
-        """GET リクエストの処理 (select_all, select)"""
+        """GET リクエストの処理 (select_all, select, search, reservations, index_advisor, stats,
+        metrics)"""
         parsed_path = urlparse(self.path)
         path = parsed_path.path.strip('/')
         
         if path == 'select_all':
-            self._handle_select_all()
+            params = {k: v[0] for k, v in parse_qs(parsed_path.query).items()}
+            if self._wants_stream(params):
+                self._handle_select_all_stream(params)
+            else:
+                self._handle_select_all(params)
         elif path == 'select':
-            params = parse_qs(parsed_path.query)
-            conditions = {k: v[0] for k, v in params.items()}
-            self._handle_select(conditions)
+            params = {k: v[0] for k, v in parse_qs(parsed_path.query).items()}
+            self._handle_select(params)
+        elif path == 'search':
+            params = {k: v[0] for k, v in parse_qs(parsed_path.query).items()}
+            self._handle_search(params)
+        elif path == 'reservations':
+            params = {k: v[0] for k, v in parse_qs(parsed_path.query).items()}
+            self._handle_list_reservations(params)
+        elif path == 'index_advisor':
+            self._handle_index_advisor()
+        elif path == 'stats':
+            self._handle_stats()
+        elif path == 'metrics':
+            self._send_metrics()
         else:
             self._send_error(404, "Not Found")
 
     def do_POST(self):
-        """POST リクエストの処理 (insert)"""
-        if self.path.strip('/') == 'insert':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            self._handle_insert(data)
+        """POST リクエストの処理 (insert, bulk, batch, reserve, release, confirm)"""
+        body = self._read_body()
+        parsed_path = urlparse(self.path)
+        path = parsed_path.path.strip('/')
+        if path == 'insert':
+            data = self._parse_json(body)
+            if data is not None:
+                self._handle_insert(data)
+        elif path == 'bulk':
+            params = {k: v[0] for k, v in parse_qs(parsed_path.query).items()}
+            self._handle_bulk(params, body)
+        elif path == 'batch':
+            data = self._parse_json(body)
+            if data is not None:
+                self._handle_batch(data)
+        elif path in ('reserve', 'release', 'confirm'):
+            data = self._parse_json(body)
+            if data is not None:
+                self._handle_reservation(path, data)
         else:
             self._send_error(404, "Not Found")
 
     def do_PUT(self):
         """PUT リクエストの処理 (update)"""
+        body = self._read_body()
         if self.path.strip('/') == 'update':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            self._handle_update(data)
+            data = self._parse_json(body)
+            if data is not None:
+                self._handle_update(data)
         else:
             self._send_error(404, "Not Found")
 
     def do_DELETE(self):
         """DELETE リクエストの処理 (delete)"""
+        body = self._read_body()
         if self.path.strip('/') == 'delete':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            self._handle_delete(data)
+            data = self._parse_json(body)
+            if data is not None:
+                self._handle_delete(data)
         else:
             self._send_error(404, "Not Found")
 
+    def _metrics_route(self, path):
+        route = path.strip('/')
+        return route if route in self.metrics_routes else 'other'
+
+    def _read_body(self) -> bytes:
+        """リクエスト本文を読み込む
+
+        持続的接続では読み残しが次のリクエストとして解釈されてしまうため、
+        宛先が存在しない場合も含めて必ず Content-Length 分を読み切る。
+        """
+        content_length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(content_length) if content_length > 0 else b''
+
+    def _parse_json(self, body: bytes):
+        """JSON オブジェクトの本文を解析 (不正な場合は400を返して None)"""
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            self._send_error(400, '不正なJSONです')
+            return None
+        if not isinstance(data, dict):
+            self._send_error(400, 'JSONオブジェクトを指定してください')
+            return None
+        return data
+
     def _send_response_json(self, data, status=200):
         """JSON形式でレスポンスを返す"""
-        self.send_response(status)
-        self.send_header('Content-type', 'application/json')
+        with self._phase('serialize'):
+            body = self._encode_json(data)
+        self._send_response_body(body, status)
+
+    @staticmethod
+    def _encode_json(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def _send_response_body(self, body: bytes, status=200, headers=None,
+                            encoding=None, cache_key=None, content_type='application/json'):
+        """エンコード済みの本文をレスポンスとして返す
+
+        encoding を指定すると圧縮して返す。cache_key があれば圧縮結果を
+        検索結果キャッシュに添えて次回以降に使い回す。
+        """
+        headers = dict(headers or {})
+        encoding = applied_encoding(encoding, len(body))
+        if encoding:
+            cache = getattr(self.server, 'query_cache', None) if cache_key else None
+            encoded = cache.get_encoded(cache_key, encoding) if cache else None
+            if encoded is None:
+                with self._phase('compress'):
+                    encoded = compress(body, encoding)
+                if cache:
+                    cache.put_encoded(cache_key, encoding, encoded)
+            body = encoded
+            headers['Content-Encoding'] = encoding
+        with self._phase('write'):
+            self.send_response(status)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if not self._keep_alive():
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _send_not_modified(self, etag):
+        """304 Not Modified を返す"""
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        if not self._keep_alive():
+            self.send_header('Connection', 'close')
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def _db(self, read_only=False):
+        """このリクエストで使う DatabaseAccess (索引アドバイザーが有効なら記録する)
+
+        read_only を指定し、サーバーに読み取りレプリカ (replica) があればそこから読む。
+        """
+        replica = getattr(self.server, 'replica', None) if read_only else None
+        return DatabaseAccess(pool=replica,
+                              index_advisor=getattr(self.server, 'index_advisor', None))
+
+    def _table_versions(self):
+        """ETag の計算に使うテーブルのバージョン (なければ None)"""
+        versions = getattr(self.server, 'table_versions', None)
+        if versions is None:
+            cache = getattr(self.server, 'query_cache', None)
+            versions = cache.versions if cache is not None else None
+        return versions
+
+    def _query_cache(self):
+        """このリクエストで使う検索結果キャッシュ (使わない場合は None)
+
+        Cache-Control: no-cache または X-Cache-Bypass: 1 でキャッシュを迂回できる。
+        """
+        cache = getattr(self.server, 'query_cache', None)
+        if cache is None:
+            return None
+        cache_control = self.headers.get('Cache-Control', '')
+        if 'no-cache' in cache_control or 'no-store' in cache_control \
+                or self.headers.get('X-Cache-Bypass') == '1':
+            cache.record_bypass()
+            return None
+        return cache
+
+    def _send_cached_query(self, table, kind, params, run_query, columns=None):
+        """検索結果をキャッシュ経由で返す
+
+        run_query は DatabaseAccess を受け取り、(応答データ, 成功したか) を返す関数。
+        失敗した結果はキャッシュしない。テーブルのバージョンから ETag を計算し、
+        If-None-Match が一致すればDBを読まずに 304 を返す。
+        応答データの products の各行の列名を columns に渡すと、Accept ヘッダーで
+        列形式の JSON やバイナリ形式 (common.row_formats) を選べる。
+        """
+        cache = self._query_cache()
+        versions = self._table_versions()
+        replica = getattr(self.server, 'replica', None)
+        # 反映前の変更があるレプリカから読んだ結果は、新しいバージョンで保存すると
+        # 古い内容を返し続けるため、キャッシュせず ETag も付けない
+        current = replica is None or not replica.serves_stale()
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'))
+        fmt = negotiate_format(self.headers.get('Accept')) if columns else 'json'
+        # 形式ごとに別のエントリ・ETag にする
+        key = QueryCache.make_key(table, kind if fmt == 'json' else f'{kind}.{fmt}', params)
+        headers = {'Vary': 'Accept, Accept-Encoding'}
+
+        # 読み取り前のバージョンで ETag を決める (読み取り中に書き込みがあっても
+        # 次回の条件付きリクエストで不一致になるだけで、古い内容を返すことはない)
+        version = versions.get(table) if versions is not None else None
+        etag = None
+        if versions is not None:
+            etag = make_etag(versions.token, table, version, key)
+            # 圧縮するかは本文の大きさで決まり、本文を読む前には分からない。同じ ETag の
+            # 本文は同じ内容・同じ大きさのため、クライアントが持つ表現 (圧縮なしか、
+            # 今回の圧縮形式) の ETag と一致すれば、その ETag で 304 を返す
+            if_none_match = self.headers.get('If-None-Match')
+            for candidate in dict.fromkeys([etag, encoding_etag(etag, encoding)]):
+                if etag_matches(if_none_match, candidate):
+                    self._send_not_modified(candidate)
+                    return
+
+        body = cache.get(key) if cache is not None else None
+        if body is not None:
+            headers['X-Cache'] = 'HIT'
+        else:
+            with self._phase('sql'), self._db(read_only=True) as db:
+                data, ok = run_query(db)
+            with self._phase('serialize'):
+                body = encode_result(data, columns, fmt) if fmt != 'json' \
+                    else self._encode_json(data)
+            if cache is not None:
+                headers['X-Cache'] = 'MISS'
+                if ok and current:
+                    cache.put(key, body, version)
+            if not ok or not current:
+                etag = None
+        if etag:
+            headers['ETag'] = encoding_etag(etag, applied_encoding(encoding, len(body)))
+        self._send_response_body(body, headers=headers, encoding=encoding,
+                                 cache_key=key if cache is not None else None,
+                                 content_type=FORMATS[fmt])
+
+    def _invalidate(self, table):
+        """書き込みのあったテーブルのキャッシュを破棄し、バージョンを進める"""
+        cache = getattr(self.server, 'query_cache', None)
+        if cache is not None:
+            cache.invalidate(table)
+            return
+        versions = self._table_versions()
+        if versions is not None:
+            versions.bump(table)
+
+    def _wants_stream(self, params):
+        """ストリーミング応答を求められているか (stream=1 または NDJSON 指定)"""
+        return params.get('stream') == '1' or self._wants_ndjson()
+
+    def _wants_ndjson(self):
+        return 'application/x-ndjson' in self.headers.get('Accept', '')
 
     def _send_error(self, status, message):
         """エラーレスポンスを返す"""
         self._send_response_json({'error': message}, status)
 
-    def _handle_select_all(self):
-        """全件取得の処理"""
-        with DatabaseAccess() as db:
-            results = db.select_all('products')
-            self._send_response_json({'products': results})
+    def _handle_stats(self):
+        """統計情報の処理"""
+        stats = {'pool': DatabaseAccess.pool_stats()}
+        cache = getattr(self.server, 'query_cache', None)
+        if cache is not None:
+            stats['cache'] = cache.stats()
+        checkpointer = getattr(self.server, 'checkpointer', None)
+        if checkpointer:
+            stats['checkpoint'] = checkpointer.stats()
+        reservations = getattr(self.server, 'reservations', None)
+        if reservations:
+            stats['reservations'] = reservations.stats()
+        replica = getattr(self.server, 'replica', None)
+        if replica is not None:
+            stats['replica'] = replica.stats()
+        self._send_response_json(stats)
+
+    def _handle_index_advisor(self):
+        """索引アドバイザーの記録の処理 (実行回数の多い順のクエリと推奨する索引)"""
+        advisor = getattr(self.server, 'index_advisor', None)
+        if advisor is None:
+            self._send_error(503, '索引アドバイザーは無効です (--index-advisor で起動してください)')
+            return
+        self._send_response_json({'stats': advisor.stats(), 'queries': advisor.report(),
+                                  'recommendations': advisor.recommendations()})
+
+    def _handle_select_all(self, params):
+        """一覧取得の処理 (limit / offset / after_id / cursor でページ単位に返す)"""
+        try:
+            page = parse_page_params(params)
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+
+        def run_query(db):
+            results, next_after_id = db.select_page('products', **page)
+            next_cursor = encode_cursor(next_after_id) if next_after_id is not None else None
+            return {'products': results, 'next_cursor': next_cursor}, db.last_error is None
+
+        self._send_cached_query('products', 'select_all', page, run_query,
+                                TABLE_COLUMNS['products'])
+
+    def _handle_select_all_stream(self, params):
+        """一覧取得の処理 (fetchmany で読みながらチャンク単位で送信)
+
+        limit を省略すると全件を送る。NDJSON の場合は1行1レコードで、
+        続きは最後の行の id を after_id に指定して取得する。
+        """
+        try:
+            page = parse_page_params(params, default_limit=None, max_limit=None)
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+        ndjson = self._wants_ndjson()
+        limit = page['limit']
+        with self._db(read_only=True) as db:
+            # 次ページの有無を判定するため1件多く読む
+            batches = db.iter_batches('products', batch_size=self.stream_batch_size,
+                                      limit=None if limit is None else limit + 1,
+                                      after_id=page['after_id'], offset=page['offset'])
+            try:
+                first_batch = next(batches, [])
+            except sqlite3.Error as e:
+                print(f"選択エラー: {e}")
+                self._send_error(500, '商品の取得に失敗しました')
+                return
+
+            self._start_stream('application/x-ndjson' if ndjson else 'application/json')
+            if not ndjson:
+                self._write_chunk(b'{"products": [')
+            encode = self._stream_encoder.encode
+            sent = 0
+            # 最後に送った行の id と、limit を超える先読みの行があったか
+            # (先読みの行だけが次のバッチに来る場合もあるため、送った行の id を覚えておく)
+            last_id = None
+            has_more = False
+            try:
+                for batch in self._chain_batches(first_batch, batches):
+                    if limit is not None and sent + len(batch) > limit:
+                        batch = batch[:limit - sent]
+                        has_more = True
+                    if batch:
+                        last_id = batch[-1][0]
+                    if ndjson:
+                        text = ''.join([encode(row) + '\n' for row in batch])
+                    else:
+                        text = ', '.join([encode(row) for row in batch])
+                        if sent and batch:
+                            text = ', ' + text
+                    sent += len(batch)
+                    self._write_chunk(text.encode('utf-8'))
+            except sqlite3.Error as e:
+                # ヘッダー送信後は終端を送らずに切断してクライアントに失敗を伝える
+                print(f"選択エラー: {e}")
+                self.close_connection = True
+                return
+
+        if not ndjson:
+            next_cursor = encode_cursor(last_id) if has_more and last_id is not None else None
+            self._write_chunk(('], "next_cursor": %s}' % json.dumps(next_cursor)).encode('utf-8'))
+        self._end_stream()
+
+    @staticmethod
+    def _chain_batches(first_batch, batches):
+        if first_batch:
+            yield first_batch
+            yield from batches
+
+    def _handle_search(self, params):
+        """全文検索の処理 (q で検索語、limit / offset でページを指定)
 
-    def _handle_select(self, conditions):
-        """条件付き取得の処理"""
-        with DatabaseAccess() as db:
-            results = db.select('products', conditions)
-            self._send_response_json({'products': results})
+        結果は関連度順で、続きがあれば next_offset を返す。索引を使えない短い語だけの
+        検索で商品の一部だけを調べた場合は truncated が true になる。
+        """
+        text = params.get('q', '').strip()
+        if not text:
+            self._send_error(400, 'q に検索語を指定してください')
+            return
+        try:
+            page = parse_page_params(params)
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+        if page['after_id'] is not None:
+            self._send_error(400, '検索では cursor / after_id は使えません (offset を指定してください)')
+            return
+
+        def run_query(db):
+            results, next_offset = db.search(text, page['limit'], page['offset'])
+            return {'products': results, 'next_offset': next_offset,
+                    'truncated': db.search_truncated}, db.last_error is None
+
+        self._send_cached_query('products', 'search',
+                                {'q': text, 'limit': page['limit'], 'offset': page['offset']},
+                                run_query, TABLE_COLUMNS['products'])
+
+    def _handle_select(self, params):
+        """条件付き取得の処理
+
+        列=値 の等価条件のほか、列__lt=値 などの比較 (ne, lt, le, gt, ge)、
+        列__in=a,b,c、列__between=下限,上限、fields (取得する列)、
+        order (並べ替え、- を付けると降順)、limit / offset を指定できる。
+        """
+        try:
+            query = parse_select_params('products', params)
+        except QueryError as e:
+            self._send_error(400, str(e))
+            return
+        if not query.conditions and query.limit is None:
+            self._send_error(400, '条件または limit を指定してください (全件は /select_all)')
+            return
+
+        def run_query(db):
+            results = db.query(query)
+            return {'columns': list(query.fields), 'products': results}, db.last_error is None
+
+        self._send_cached_query('products', 'select', params, run_query, query.fields)
 
     def _handle_insert(self, data):
         """データ挿入の処理"""
-        with DatabaseAccess() as db:
+        with self._db() as db:
             success = db.insert('products', data)
             if success:
+                self._invalidate('products')
                 self._send_response_json({'message': '商品を追加しました'})
             else:
                 self._send_error(500, '商品の追加に失敗しました')
 
+    def _parse_rows(self, body: bytes):
+        """一括書き込みの本文 (JSON配列または NDJSON) を行のリストにする
+
+        戻り値は (行のリスト, 行ごとのエラー)。解析できない行やオブジェクトでない行は
+        None にしてエラーを記録する。本文全体が不正な場合は400を返して None。
+        """
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            self._send_error(400, '不正な文字コードです')
+            return None
+        if 'application/x-ndjson' in self.headers.get('Content-Type', ''):
+            items = []
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(ValueError('不正なJSONです'))
+        else:
+            try:
+                items = json.loads(text)
+            except ValueError:
+                self._send_error(400, '不正なJSONです')
+                return None
+            if not isinstance(items, list):
+                self._send_error(400, 'JSON配列を指定してください')
+                return None
+
+        rows, errors = [], []
+        for item in items:
+            if isinstance(item, dict):
+                rows.append(item)
+                errors.append(None)
+            else:
+                rows.append(None)
+                errors.append(str(item) if isinstance(item, ValueError)
+                              else 'JSONオブジェクトを指定してください')
+        return rows, errors
+
+    def _handle_bulk(self, params, body):
+        """一括書き込みの処理 (op=insert / update / upsert, key で照合する列を指定)
+
+        全ての行を1トランザクションで書き込み、行ごとの結果を本文と同じ順で返す。
+        """
+        op = params.get('op', 'insert')
+        if op not in self.bulk_operations:
+            self._send_error(400, f'op には {", ".join(self.bulk_operations)} を指定してください')
+            return
+        parsed = self._parse_rows(body)
+        if parsed is None:
+            return
+        rows, errors = parsed
+        valid = [i for i, row in enumerate(rows) if row is not None]
+        options = {'key': params['key']} if op != 'insert' and 'key' in params else {}
+        if valid:
+            with self._db() as db:
+                write_many = getattr(db, self.bulk_operations[op])
+                for i, error in zip(valid, write_many('products', [rows[i] for i in valid],
+                                                      **options)):
+                    errors[i] = error
+
+        succeeded = errors.count(None)
+        if succeeded:
+            self._invalidate('products')
+        results = [{'ok': True} if error is None else {'ok': False, 'error': error}
+                   for error in errors]
+        self._send_response_json({'results': results, 'succeeded': succeeded,
+                                  'failed': len(errors) - succeeded})
+
+    def _handle_batch(self, data):
+        """複数操作の一括実行の処理
+
+        operations の各要素は {"op": "select" | "insert" | "update" | "delete",
+        "data": {...}, "conditions": {...}, "expect_rows": n} の形式。
+        全ての操作を1トランザクションで順に実行し、1つでも失敗すれば全て取り消す。
+        expect_rows を指定した update / delete は、変更した行数が一致しなければ
+        失敗として扱う (在庫の比較更新などに使う)。
+        """
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            self._send_error(400, 'operations に操作のリストを指定してください')
+            return
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict) or operation.get('op') not in self.batch_operations:
+                self._send_response_json(
+                    {'error': f'op には {", ".join(self.batch_operations)} を指定してください',
+                     'index': index}, 400)
+                return
+
+        writes = any(operation['op'] != 'select' for operation in operations)
+        results = []
+        try:
+            with self._db() as db:
+                # 読み取り後の書き込みでロックの昇格に失敗しないよう、書き込みがあれば先にロックを取る
+                with db.transaction(immediate=writes):
+                    for index, operation in enumerate(operations):
+                        results.append(self._run_batch_operation(db, index, operation))
+        except BatchError as e:
+            self._send_response_json({'error': e.message, 'index': e.index}, e.status)
+            return
+        except sqlite3.Error as e:
+            print(f"トランザクションエラー: {e}")
+            self._send_error(500, 'トランザクションの実行に失敗しました')
+            return
+
+        if writes:
+            self._invalidate('products')
+        self._send_response_json({'results': results})
+
+    @staticmethod
+    def _run_batch_operation(db, index, operation):
+        """バッチ内の1操作を実行し、結果を返す (失敗時は BatchError)"""
+        kind = operation['op']
+        conditions = operation.get('conditions') or {}
+        values = operation.get('data') or {}
+        if not isinstance(conditions, dict) or not isinstance(values, dict):
+            raise BatchError(400, 'data と conditions はJSONオブジェクトで指定してください', index)
+        if kind in ('update', 'delete') and not conditions:
+            raise BatchError(400, f'{kind} には conditions を指定してください', index)
+
+        if kind == 'select':
+            rows = db.select('products', conditions) if conditions else db.select_all('products')
+        elif kind == 'insert':
+            db.insert('products', values)
+        elif kind == 'update':
+            db.update('products', values, conditions)
+        else:
+            db.delete('products', conditions)
+        if db.last_error is not None:
+            raise BatchError(500, f'{kind} に失敗しました: {db.last_error}', index)
+
+        if kind == 'select':
+            return {'products': rows}
+        rowcount = db.cursor.rowcount
+        expected = operation.get('expect_rows')
+        if expected is not None and rowcount != expected:
+            raise BatchError(409, f'{kind} の対象が {expected} 件ではありません ({rowcount} 件)',
+                             index)
+        result = {'rowcount': rowcount}
+        if kind == 'insert':
+            result['id'] = db.cursor.lastrowid
+        return result
+
+    def _reservation_store(self):
+        """在庫予約の管理 (なければ503を返して None)"""
+        store = getattr(self.server, 'reservations', None)
+        if store is None:
+            self._send_error(503, '在庫の予約は利用できません')
+        return store
+
+    def _handle_reservation(self, action, data):
+        """在庫予約の処理
+
+        reserve: {"product_id", "quantity", "owner", "ttl"} で在庫を引き当てる
+        (在庫不足は409)。release / confirm: {"reservation_id", "owner"} で
+        予約を取り消す・確定する (該当する予約がなければ404)。
+        """
+        store = self._reservation_store()
+        if store is None:
+            return
+        owner = data.get('owner')
+        try:
+            if action == 'reserve':
+                if not owner:
+                    self._send_error(400, 'owner を指定してください')
+                    return
+                ttl = data.get('ttl')
+                with self._phase('sql'):
+                    reservation = store.reserve(int(data['product_id']),
+                                                int(data.get('quantity', 1)), str(owner),
+                                                ttl=float(ttl) if ttl is not None else None)
+                self._invalidate('products')
+                self._send_response_json({'reservation': reservation})
+                return
+            reservation_id = str(data['reservation_id'])
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_error(400, f'不正な指定です: {e}')
+            return
+        except OutOfStockError as e:
+            status = 404 if e.available is None else 409
+            self._send_response_json({'error': str(e), 'available': e.available}, status)
+            return
+        except sqlite3.Error as e:
+            print(f"予約エラー: {e}")
+            self._send_error(500, '在庫の予約に失敗しました')
+            return
+
+        try:
+            with self._phase('sql'):
+                if action == 'release':
+                    done = store.release(reservation_id, owner)
+                else:
+                    done = store.confirm(reservation_id, owner)
+        except sqlite3.Error as e:
+            print(f"予約エラー: {e}")
+            self._send_error(500, '予約の処理に失敗しました')
+            return
+        if not done:
+            self._send_error(404, '予約が見つかりません')
+            return
+        if action == 'release':
+            self._invalidate('products')
+        self._send_response_json({'message': '予約を取り消しました' if action == 'release'
+                                  else '予約を確定しました'})
+
+    def _handle_list_reservations(self, params):
+        """持ち主の有効な予約一覧の処理"""
+        store = self._reservation_store()
+        if store is None:
+            return
+        if not params.get('owner'):
+            self._send_error(400, 'owner を指定してください')
+            return
+        self._send_response_json({'reservations': store.list_reservations(params['owner'])})
+
     def _handle_update(self, data):
         """データ更新の処理"""
         conditions = data.pop('conditions', {})
-        with DatabaseAccess() as db:
+        with self._db() as db:
             success = db.update('products', data, conditions)
             if success:
+                self._invalidate('products')
                 self._send_response_json({'message': '商品を更新しました'})
             else:
                 self._send_error(500, '商品の更新に失敗しました')
 
     def _handle_delete(self, conditions):
         """データ削除の処理"""
-        with DatabaseAccess() as db:
+        with self._db() as db:
             success = db.delete('products', conditions)
             if success:
+                self._invalidate('products')
                 self._send_response_json({'message': '商品を削除しました'})
             else:
                 self._send_error(500, '商品の削除に失敗しました')
 
-def run_server(port=8000):
+def run_server(port=8000, mode='threaded', workers=8, queue_size=64,
+               profile=DEFAULT_PROFILE, checkpoint_interval=10.0,
+               cache_entries=1024, cache_bytes=64 * 1024 * 1024, cache_ttl=30.0,
+               reservation_ttl=DEFAULT_TTL, sweep_interval=5.0, index_advisor=False,
+               access_log_sample=0.01, processes=1, reuse_port=False,
+               drain_timeout=DRAIN_TIMEOUT, replicas=0, replica_max_staleness=MAX_STALENESS,
+               replica_refresh_interval=MIN_REFRESH_INTERVAL):
+    """DBサーバーを起動
+
+    mode は single (従来の1スレッド処理), threaded (スレッドプール),
+    async (asyncio + executor) から選ぶ。
+    profile は接続ごとに適用する SQLite の設定 (sqlite_profile.PROFILES)。
+    cache_entries に0を指定すると検索結果のキャッシュを使わない。
+    reservation_ttl は在庫の予約の有効期間、sweep_interval は期限切れを確認する間隔 (秒)。
+    index_advisor を指定すると実行したクエリの実行計画を記録し、/index_advisor で
+    全件走査の多いクエリと推奨する索引を返す。
+    /metrics でルートごとの件数・応答時間などを Prometheus の形式で返す。
+    アクセスログは access_log_sample の割合だけ記録する (ステータス500以上は全て)。
+    processes に2以上を指定すると、待ち受けソケットを共有するワーカープロセスを
+    その数だけ起動する (common.prefork.PreforkSupervisor。reuse_port を指定すると
+    各ワーカーが SO_REUSEPORT でそれぞれ待ち受ける)。SIGTERM を受けると各ワーカーは
+    処理中のリクエストを最大 drain_timeout 秒待ってから終了する。
+    テーブルのバージョンはワーカー間で共有するため、どのワーカーで書き込んでも
+    全ワーカーの検索結果キャッシュと ETag に反映される (キャッシュの内容と
+    /metrics の値はワーカーごと。ワーカーごとの件数は db_workers_* で返す)。
+    WAL チェックポイントは0番のワーカーだけが行う。
+    replicas に1以上を指定すると、/select_all・/select・/search の読み取りを
+    DBファイルをメモリ上に複製した読み取りレプリカ (db.replica.ReadReplica、
+    同時に最大 replicas 個のコピー) で行い、書き込みは従来どおりDBファイルに行う。
+    変更は replica_refresh_interval 秒以上の間隔でまとめて複製し直し、変更の検知から
+    replica_max_staleness 秒を過ぎても反映されていない間の読み取りはDBファイルから行う
+    (既定の0では書き込みの直後の読み取りも書き込みの結果を返す)。
+    """
     server_address = ('', port)
-    httpd = HTTPServer(server_address, DBHandler)
-    print(f'Starting server on port {port}...')
-    httpd.serve_forever()
+    pragmas = get_profile(profile)
+    # 既存のDBにも全文検索索引を用意する (ワーカーを fork する前に1回だけ行う)
+    ensure_search_index()
+
+    def serve(worker=None, table_versions=None):
+        # 同時に処理するリクエスト数だけ接続を用意する
+        configure_pool(DB_PATH, max_size=1 if mode == 'single' else workers,
+                       pragmas=pragmas)
+        httpd = make_server(server_address, DBHandler, mode=mode, workers=workers,
+                            queue_size=queue_size, sock=worker.socket if worker else None)
+        httpd.table_versions = table_versions or TableVersions()
+        httpd.query_cache = None
+        if cache_entries > 0:
+            httpd.query_cache = QueryCache(max_entries=cache_entries, max_bytes=cache_bytes,
+                                           ttl=cache_ttl, versions=httpd.table_versions)
+        httpd.index_advisor = IndexAdvisor() if index_advisor else None
+        httpd.checkpointer = None
+        if str(pragmas.get('journal_mode', '')).upper() == 'WAL' and \
+                (worker is None or worker.index == 0):
+            httpd.checkpointer = WalCheckpointer(DB_PATH, interval=checkpoint_interval)
+            httpd.checkpointer.start()
+
+        def on_expire(count):
+            # 期限切れで在庫が戻ったため、在庫を含む検索結果を無効にする
+            if httpd.query_cache is not None:
+                httpd.query_cache.invalidate('products')
+            else:
+                httpd.table_versions.bump('products')
+
+        httpd.reservations = ReservationStore(shared_pool(), ttl=reservation_ttl,
+                                              sweep_interval=sweep_interval,
+                                              on_expire=on_expire)
+        httpd.reservations.start()
+
+        httpd.replica = None
+        if replicas > 0:
+            httpd.replica = ReadReplica(DB_PATH, shared_pool(), max_size=replicas,
+                                        versions=httpd.table_versions, tables=TABLE_COLUMNS,
+                                        min_refresh_interval=replica_refresh_interval,
+                                        max_staleness=replica_max_staleness)
+            httpd.replica.start()
+
+        httpd.access_log = AccessLog(sample_rate=access_log_sample)
+        httpd.metrics = MetricsRegistry('db')
+        httpd.metrics.add_stats('pool', '接続プール', DatabaseAccess.pool_stats)
+        httpd.metrics.add_stats('reservations', '在庫の予約', httpd.reservations.stats)
+        httpd.metrics.add_stats('access_log', 'アクセスログ', httpd.access_log.stats)
+        if httpd.query_cache is not None:
+            httpd.metrics.add_stats('cache', '検索結果キャッシュ', httpd.query_cache.stats)
+        if httpd.checkpointer:
+            httpd.metrics.add_stats('checkpoint', 'WAL チェックポイント',
+                                    httpd.checkpointer.stats)
+        if httpd.index_advisor is not None:
+            httpd.metrics.add_stats('index_advisor', '索引アドバイザー',
+                                    httpd.index_advisor.stats)
+        if httpd.replica is not None:
+            httpd.metrics.add_stats('replica', '読み取りレプリカ', httpd.replica.stats)
+
+        try:
+            if worker is not None:
+                worker.serve(httpd)
+            else:
+                httpd.serve_forever()
+        finally:
+            httpd.reservations.stop()
+            if httpd.replica is not None:
+                httpd.replica.stop()
+            if httpd.checkpointer:
+                httpd.checkpointer.stop()
+            httpd.access_log.flush()
+
+    if processes > 1:
+        # テーブルのバージョンは fork する前に共有メモリに用意する
+        table_versions = SharedTableVersions(TABLE_COLUMNS)
+        supervisor = PreforkSupervisor(server_address, processes,
+                                       lambda worker: serve(worker, table_versions),
+                                       queue_size=queue_size, reuse_port=reuse_port,
+                                       drain_timeout=drain_timeout, name='db')
+        print(f'Starting server on port {port} ({mode} x {processes} processes, '
+              f'profile={profile})...')
+        supervisor.run()
+        return
+    print(f'Starting server on port {port} ({mode}, profile={profile})...')
+    serve()
+
+def ensure_search_index():
+    """全文検索索引がなければ作成 (プールを使わない一時的な接続で行う)"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if ensure_search_schema(conn):
+            print('全文検索索引を作成しました。')
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
-    run_server()
+    parser = argparse.ArgumentParser(description='DBサーバー')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=SERVER_MODES, default='threaded',
+                        help='並行処理モード')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='ワーカースレッド数 (threaded / async)')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help='受付キューの長さ')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help='SQLite の設定プロファイル')
+    parser.add_argument('--checkpoint-interval', type=float, default=10.0,
+                        help='WAL チェックポイントの間隔 (秒)')
+    parser.add_argument('--cache-entries', type=int, default=1024,
+                        help='検索結果キャッシュの最大件数 (0で無効)')
+    parser.add_argument('--cache-bytes', type=int, default=64 * 1024 * 1024,
+                        help='検索結果キャッシュの最大バイト数')
+    parser.add_argument('--cache-ttl', type=float, default=30.0,
+                        help='検索結果キャッシュの有効期間 (秒)')
+    parser.add_argument('--reservation-ttl', type=float, default=DEFAULT_TTL,
+                        help='在庫の予約の有効期間 (秒)')
+    parser.add_argument('--sweep-interval', type=float, default=5.0,
+                        help='期限切れの予約を在庫に戻す間隔 (秒)')
+    parser.add_argument('--index-advisor', action='store_true',
+                        help='クエリの実行計画を記録し /index_advisor で索引を提案する')
+    parser.add_argument('--access-log-sample', type=float, default=0.01,
+                        help='アクセスログに記録するリクエストの割合 (0〜1)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='ワーカープロセス数 (2以上で待ち受けソケットを共有して fork する)')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='各ワーカーが SO_REUSEPORT でそれぞれ待ち受ける (--processes と併用)')
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help='停止時に処理中のリクエストを待つ秒数 (--processes と併用)')
+    parser.add_argument('--replicas', type=int, default=0,
+                        help='読み取りに使うメモリ上のDBのコピーの最大数 (0で使わない)')
+    parser.add_argument('--replica-max-staleness', type=float, default=MAX_STALENESS,
+                        help='変更を反映する前のコピーから読んでよい秒数 (超えるとDBファイルから読む)')
+    parser.add_argument('--replica-refresh-interval', type=float, default=MIN_REFRESH_INTERVAL,
+                        help='コピーを作り直す最短の間隔 (秒)')
+    args = parser.parse_args()
+    run_server(args.port, args.mode, args.workers, args.queue_size,
+               args.profile, args.checkpoint_interval,
+               args.cache_entries, args.cache_bytes, args.cache_ttl,
+               args.reservation_ttl, args.sweep_interval, args.index_advisor,
+               args.access_log_sample, args.processes, args.reuse_port, args.drain_timeout,
+               args.replicas, args.replica_max_staleness, args.replica_refresh_interval)
@@ -0,0 +1,140 @@
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+# WHERE 句の「列 演算子」を取り出す (DatabaseAccess が組み立てる形の SQL を想定)
+CONDITION_PATTERN = re.compile(
+    r'\b(\w+)\s*(==|<=|>=|<>|!=|=|<|>|\bIS\b|\bIN\b|\bBETWEEN\b|\bLIKE\b)', re.IGNORECASE)
+TABLE_PATTERN = re.compile(r'\b(?:FROM|UPDATE)\s+(\w+)', re.IGNORECASE)
+ORDER_PATTERN = re.compile(r'\bORDER\s+BY\s+(.+?)(?:\bLIMIT\b|$)', re.IGNORECASE | re.DOTALL)
+# 索引で絞り込める等価条件
+EQUALITY_OPERATORS = frozenset(['=', '==', 'IS', 'IN'])
+# 索引の末尾の列として範囲で絞り込める条件
+RANGE_OPERATORS = frozenset(['<', '>', '<=', '>=', 'BETWEEN'])
+
+def is_full_scan(detail: str) -> bool:
+    """EXPLAIN QUERY PLAN の行がテーブルの全件走査か (索引を使う走査は除く)"""
+    detail = detail.upper()
+    return (detail.startswith('SCAN ') and 'USING' not in detail
+            and 'VIRTUAL TABLE' not in detail and 'CONSTANT ROW' not in detail)
+
+def suggest_index(sql: str) -> Optional[str]:
+    """WHERE / ORDER BY の列から索引の作成文を組み立てる (候補がなければ None)
+
+    等価条件の列を先に並べ、範囲条件の列 (なければ ORDER BY の列) を後ろに付ける。
+    主キーの id は索引がなくても絞り込めるため除く。
+    """
+    table_match = TABLE_PATTERN.search(sql)
+    if not table_match:
+        return None
+    table = table_match.group(1)
+    upper = sql.upper()
+    where_start = upper.find(' WHERE ')
+    equality: List[str] = []
+    ranges: List[str] = []
+    if where_start >= 0:
+        where_end = min([i for i in (upper.find(' ORDER BY ', where_start),
+                                     upper.find(' LIMIT ', where_start)) if i >= 0],
+                        default=len(sql))
+        for column, operator in CONDITION_PATTERN.findall(sql[where_start + 7:where_end]):
+            operator = operator.upper()
+            if column.lower() == 'id' or column.upper() in ('AND', 'OR', 'NOT'):
+                continue
+            target = equality if operator in EQUALITY_OPERATORS else \
+                ranges if operator in RANGE_OPERATORS else None
+            if target is not None and column not in equality and column not in ranges:
+                target.append(column)
+    columns = equality + ranges[:1]
+    if not ranges:
+        order_match = ORDER_PATTERN.search(sql)
+        if order_match:
+            for item in order_match.group(1).split(','):
+                column = item.split()[0] if item.split() else ''
+                if re.fullmatch(r'\w+', column) and column.lower() != 'id' \
+                        and column not in columns:
+                    columns.append(column)
+    if not columns:
+        return None
+    name = f"idx_{table}_{'_'.join(columns)}"
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+
+class IndexAdvisor:
+    """実際に実行されたクエリの実行計画を記録し、全件走査に索引を提案する
+
+    クエリは SQL 文 (プレースホルダーのままの形) ごとに回数を数え、
+    初めて見た形のときだけ EXPLAIN QUERY PLAN を実行して計画を保持する。
+    索引を追加した後は reset() で計画を取り直す。
+    """
+
+    def __init__(self, max_shapes: int = 1000):
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        # SQL -> {'count', 'plan', 'full_scan', 'temp_sort'}
+        self._queries: Dict[str, Dict[str, Any]] = {}
+        self._dropped = 0
+
+    def record(self, conn: sqlite3.Connection, sql: str, params: Sequence = ()) -> None:
+        """実行するクエリを記録 (DatabaseAccess から実行前に呼ばれる)"""
+        with self._lock:
+            entry = self._queries.get(sql)
+            if entry is not None:
+                entry['count'] += 1
+                return
+            if len(self._queries) >= self.max_shapes:
+                self._dropped += 1
+                return
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error as e:
+            print(f"実行計画の取得エラー: {e}")
+            return
+        plan = [row[3] for row in rows]
+        entry = {
+            'count': 1,
+            'plan': plan,
+            'full_scan': any(is_full_scan(detail) for detail in plan),
+            'temp_sort': any('USE TEMP B-TREE' in detail.upper() for detail in plan),
+        }
+        with self._lock:
+            current = self._queries.setdefault(sql, entry)
+            if current is not entry:
+                current['count'] += 1
+
+    def report(self) -> List[Dict[str, Any]]:
+        """記録したクエリを実行回数の多い順に返す (全件走査には索引の提案を付ける)"""
+        with self._lock:
+            items = [(sql, dict(entry)) for sql, entry in self._queries.items()]
+        report = []
+        for sql, entry in sorted(items, key=lambda item: item[1]['count'], reverse=True):
+            entry['sql'] = sql
+            entry['suggestion'] = suggest_index(sql) \
+                if entry['full_scan'] or entry['temp_sort'] else None
+            report.append(entry)
+        return report
+
+    def recommendations(self) -> List[str]:
+        """推奨する CREATE INDEX 文を、対象のクエリの実行回数の多い順に返す"""
+        statements: List[str] = []
+        for entry in self.report():
+            suggestion = entry['suggestion']
+            if suggestion and suggestion not in statements:
+                statements.append(suggestion)
+        return statements
+
+    def stats(self) -> Dict[str, Any]:
+        """記録の件数を取得"""
+        with self._lock:
+            return {
+                'shapes': len(self._queries),
+                'queries': sum(entry['count'] for entry in self._queries.values()),
+                'full_scan_queries': sum(entry['count'] for entry in self._queries.values()
+                                         if entry['full_scan']),
+                'dropped': self._dropped,
+            }
+
+    def reset(self) -> None:
+        """記録を消去 (索引を追加した後に計画を取り直す)"""
+        with self._lock:
+            self._queries.clear()
+            self._dropped = 0
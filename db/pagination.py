@@ -0,0 +1,52 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+# 1ページの既定件数と上限
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(after_id: int) -> str:
+    """次ページの開始位置を不透明なカーソル文字列にする"""
+    payload = json.dumps({'after_id': after_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> int:
+    """カーソル文字列から開始位置を取り出す (不正な場合は ValueError)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        after_id = payload['after_id']
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"不正なカーソルです: {cursor}") from e
+    if not isinstance(after_id, int):
+        raise ValueError(f"不正なカーソルです: {cursor}")
+    return after_id
+
+def parse_page_params(params: dict, default_limit: Optional[int] = DEFAULT_PAGE_SIZE,
+                      max_limit: Optional[int] = MAX_PAGE_SIZE) -> dict:
+    """クエリパラメータ (limit, offset, after_id, cursor) を検証して取り出す
+
+    不正な値の場合は ValueError。limit は max_limit までに丸める。
+    default_limit / max_limit に None を渡すと件数を制限しない (ストリーミング用)。
+    """
+    limit = int(params['limit']) if 'limit' in params else default_limit
+    if limit is not None:
+        if limit < 1:
+            raise ValueError("limit は1以上を指定してください")
+        if max_limit is not None:
+            limit = min(limit, max_limit)
+
+    after_id: Optional[int] = None
+    if params.get('cursor'):
+        after_id = decode_cursor(params['cursor'])
+    elif params.get('after_id') is not None:
+        after_id = int(params['after_id'])
+
+    offset = int(params.get('offset', 0))
+    if offset < 0:
+        raise ValueError("offset は0以上を指定してください")
+    if after_id is not None and offset:
+        raise ValueError("offset と after_id / cursor は同時に指定できません")
+    return {'limit': limit, 'after_id': after_id, 'offset': offset}
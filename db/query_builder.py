@@ -0,0 +1,146 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# 検索・射影・並べ替えに使える列 (SQL に埋め込む名前はここにあるものだけ)
+TABLE_COLUMNS = {
+    'products': ('id', 'name', 'price', 'description', 'stock'),
+}
+
+# 条件の演算子 (クエリパラメータでは 列__演算子=値 と書く)
+OPERATORS = {
+    'eq': '=',
+    'ne': '!=',
+    'lt': '<',
+    'le': '<=',
+    'gt': '>',
+    'ge': '>=',
+    'in': 'IN',
+    'between': 'BETWEEN',
+}
+
+# IN に指定できる値の数の上限
+MAX_IN_VALUES = 100
+
+# 条件以外の意味を持つパラメータ
+RESERVED_PARAMS = frozenset(['fields', 'order', 'limit', 'offset'])
+
+class QueryError(ValueError):
+    """検索条件の指定が不正な場合の例外"""
+
+class SelectQuery:
+    """検証済みの検索条件
+
+    fields は取得する列、conditions は (列, 演算子, 値のタプル) のリスト、
+    order は (列, 降順か) のタプル。limit が None なら件数を制限しない。
+    """
+
+    def __init__(self, table: str, fields: Tuple[str, ...] = (),
+                 conditions: Optional[List[Tuple[str, str, tuple]]] = None,
+                 order: Tuple[Tuple[str, bool], ...] = (), limit: Optional[int] = None,
+                 offset: int = 0):
+        columns = TABLE_COLUMNS.get(table)
+        if columns is None:
+            raise QueryError(f"検索できないテーブルです: {table}")
+        for column in list(fields) + [c[0] for c in conditions or []] + [o[0] for o in order]:
+            if column not in columns:
+                raise QueryError(f"使用できない列です: {column}")
+        self.table = table
+        self.fields = tuple(fields) or columns
+        self.conditions = list(conditions or [])
+        self.order = tuple(order)
+        self.limit = limit
+        self.offset = offset
+
+    def shape(self) -> tuple:
+        """SQL 文の形 (値を除いた部分) を表すキー"""
+        condition_shape = tuple((column, op, len(values)) for column, op, values in self.conditions)
+        return (self.table, self.fields, condition_shape, self.order,
+                self.limit is not None, bool(self.offset))
+
+    def to_sql(self) -> Tuple[str, List[Any]]:
+        """(SQL 文, パラメータ) を返す (SQL 文は同じ形の検索で同じ文字列になる)"""
+        params: List[Any] = [value for _, _, values in self.conditions for value in values]
+        if self.limit is not None:
+            params.append(self.limit)
+        if self.offset:
+            if self.limit is None:
+                params.append(-1)
+            params.append(self.offset)
+        return build_select_sql(*self.shape()), params
+
+@lru_cache(maxsize=256)
+def build_select_sql(table: str, fields: Tuple[str, ...], conditions: tuple,
+                     order: tuple, has_limit: bool, has_offset: bool) -> str:
+    """形ごとに SQL 文を組み立てる
+
+    同じ形の検索には同じ文字列を返すため、sqlite3 の文キャッシュ
+    (接続ごとのコンパイル済みの文) がそのまま使い回される。
+    """
+    sql = f"SELECT {', '.join(fields)} FROM {table}"
+    clauses = []
+    for column, op, count in conditions:
+        operator = OPERATORS[op]
+        if op == 'in':
+            clauses.append(f"{column} IN ({', '.join(['?'] * count)})")
+        elif op == 'between':
+            clauses.append(f"{column} BETWEEN ? AND ?")
+        else:
+            clauses.append(f"{column} {operator} ?")
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if order:
+        sql += " ORDER BY " + ", ".join(f"{column} DESC" if desc else column
+                                         for column, desc in order)
+    if has_limit or has_offset:
+        sql += " LIMIT ?"
+    if has_offset:
+        sql += " OFFSET ?"
+    return sql
+
+def parse_select_params(table: str, params: Dict[str, str],
+                        max_limit: Optional[int] = None) -> SelectQuery:
+    """クエリパラメータから検索条件を作る (不正な場合は QueryError)
+
+    - 列=値 / 列__演算子=値: 条件 (演算子は OPERATORS、in は カンマ区切り、
+      between は 下限,上限)
+    - fields=列,列: 取得する列
+    - order=列,-列: 並べ替え (- を付けると降順)
+    - limit / offset: 件数と開始位置
+    """
+    conditions = []
+    for key, value in params.items():
+        if key in RESERVED_PARAMS:
+            continue
+        column, _, op = key.partition('__')
+        op = op or 'eq'
+        if op not in OPERATORS:
+            raise QueryError(f"使用できない演算子です: {op}")
+        if op == 'in':
+            values = tuple(v for v in value.split(',') if v != '')
+            if not values or len(values) > MAX_IN_VALUES:
+                raise QueryError(f"in には1～{MAX_IN_VALUES}個の値を指定してください")
+        elif op == 'between':
+            values = tuple(value.split(','))
+            if len(values) != 2:
+                raise QueryError("between には 下限,上限 を指定してください")
+        else:
+            values = (value,)
+        conditions.append((column, op, values))
+    # パラメータの順序が違っても同じ SQL 文になるようにする
+    conditions.sort(key=lambda condition: condition[:2])
+
+    fields = tuple(f for f in params.get('fields', '').split(',') if f)
+    order = tuple((item.lstrip('-'), item.startswith('-'))
+                  for item in params.get('order', '').split(',') if item.lstrip('-'))
+    try:
+        limit = int(params['limit']) if 'limit' in params else None
+        offset = int(params.get('offset', 0))
+    except ValueError:
+        raise QueryError("limit と offset には整数を指定してください")
+    if limit is not None and limit < 1:
+        raise QueryError("limit は1以上を指定してください")
+    if offset < 0:
+        raise QueryError("offset は0以上を指定してください")
+    if max_limit is not None:
+        limit = max_limit if limit is None else min(limit, max_limit)
+    return SelectQuery(table, fields, conditions, order, limit, offset)
@@ -0,0 +1,225 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+class TableVersions:
+    """テーブルごとの書き込み回数
+
+    キャッシュの無効化と ETag の計算に使う。token はプロセスの起動ごとに
+    変わるため、再起動をまたいで古い ETag が一致することはない。
+    """
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+
+    def get(self, table: str) -> int:
+        """テーブルの現在のバージョン"""
+        with self._lock:
+            return self._versions.get(table, 0)
+
+    def bump(self, table: str) -> int:
+        """テーブルへの書き込みを記録"""
+        with self._lock:
+            version = self._versions[table] = self._versions.get(table, 0) + 1
+            return version
+
+class SharedTableVersions(TableVersions):
+    """複数のプロセスで共有するテーブルごとの書き込み回数
+
+    プリフォーク (common.prefork) で fork する前に作る。どのワーカーで書き込んでも
+    全ワーカーのキャッシュの該当エントリが使われなくなり、token も共通のため
+    ETag もワーカー間で一致する。tables 以外のテーブルはプロセスごとに数える。
+    """
+
+    def __init__(self, tables: Iterable[str]):
+        super().__init__()
+        self._index = {table: index for index, table in enumerate(tables)}
+        # fork した子プロセスと同じ領域を指す共有メモリとプロセス間のロック
+        self._counts = multiprocessing.RawArray('q', len(self._index))
+        self._shared_lock = multiprocessing.Lock()
+
+    def get(self, table: str) -> int:
+        index = self._index.get(table)
+        if index is None:
+            return super().get(table)
+        with self._shared_lock:
+            return self._counts[index]
+
+    def bump(self, table: str) -> int:
+        index = self._index.get(table)
+        if index is None:
+            return super().bump(table)
+        with self._shared_lock:
+            self._counts[index] += 1
+            return self._counts[index]
+
+class _Entry:
+    __slots__ = ('table', 'body', 'stored_at', 'encoded', 'version')
+
+    def __init__(self, table: str, body: bytes, version: int):
+        self.table = table
+        self.body = body
+        # 保存時のテーブルのバージョン (別のプロセスで書き込まれると一致しなくなる)
+        self.version = version
+        self.stored_at = time.monotonic()
+        # 圧縮形式 -> 圧縮済みの本文
+        self.encoded: Dict[str, bytes] = {}
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+class QueryCache:
+    """検索結果のエンコード済み応答を保持する LRU/TTL キャッシュ
+
+    キーはテーブル名・検索の種類・正規化した条件の組。テーブルへの書き込みが
+    あると、そのテーブルのエントリを全て破棄してバージョンを進める。
+    読み取り開始時のバージョンを put に渡すことで、読み取り中に書き込みが
+    あった場合の古い結果を保存しないようにする。versions が SharedTableVersions の
+    場合は、他のプロセスでの書き込みも get の時点でバージョンの不一致として検出する。
+    圧縮済みの本文もエントリに添えて保持できる。
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: Optional[float] = 30.0, versions: Optional[TableVersions] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.versions = versions if versions is not None else TableVersions()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._table_keys: Dict[str, set] = {}
+        self._bytes = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'bypasses': 0,
+            'stores': 0,
+            'stale_stores': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'version_misses': 0,
+        }
+
+    @staticmethod
+    def make_key(table: str, kind: str, params: Dict[str, Any]) -> Hashable:
+        """テーブル名・検索の種類・条件からキーを作る (条件の順序は問わない)"""
+        return (table, kind, tuple(sorted((str(k), str(v)) for k, v in params.items())))
+
+    def version(self, table: str) -> int:
+        """テーブルの現在のバージョン"""
+        return self.versions.get(table)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """キャッシュ済みの応答を取得 (なければ None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if self.ttl is not None and time.monotonic() - entry.stored_at > self.ttl:
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            if entry.version != self.versions.get(entry.table):
+                # 他のプロセスで書き込まれた
+                self._remove(key)
+                self._stats['version_misses'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry.body
+
+    def get_encoded(self, key: Hashable, encoding: str) -> Optional[bytes]:
+        """キャッシュ済みの圧縮済み本文を取得 (なければ None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.encoded.get(encoding) if entry is not None else None
+
+    def put_encoded(self, key: Hashable, encoding: str, data: bytes) -> None:
+        """圧縮済みの本文をエントリに添える (エントリがなければ何もしない)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or encoding in entry.encoded:
+                return
+            entry.encoded[encoding] = data
+            self._bytes += len(data)
+            self._evict()
+
+    def put(self, key: Hashable, body: bytes, version: int) -> bool:
+        """応答を保存 (version は読み取り開始前に version() で取得した値)"""
+        table = key[0]
+        size = len(body)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if self.versions.get(table) != version:
+                # 読み取り中に書き込みがあった
+                self._stats['stale_stores'] += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(table, body, version)
+            self._table_keys.setdefault(table, set()).add(key)
+            self._bytes += size
+            self._stats['stores'] += 1
+            self._evict()
+            return True
+
+    def invalidate(self, table: str) -> None:
+        """テーブルへの書き込み後に呼び出し、そのテーブルのエントリを破棄"""
+        # バージョンを先に進めることで、この後に put される古い結果も拒否される
+        self.versions.bump(table)
+        with self._lock:
+            for key in list(self._table_keys.get(table, ())):
+                self._remove(key)
+            self._stats['invalidations'] += 1
+
+    def record_bypass(self) -> None:
+        """キャッシュを使わなかったリクエストを記録"""
+        with self._lock:
+            self._stats['bypasses'] += 1
+
+    def clear(self) -> None:
+        """全てのエントリを破棄"""
+        with self._lock:
+            for table in list(self._table_keys):
+                self.versions.bump(table)
+            self._entries.clear()
+            self._table_keys.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの利用統計を取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _evict(self) -> None:
+        """上限を超えた分を古いエントリから追い出す (ロックを取得した状態で呼ぶ)"""
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _remove(self, key: Hashable) -> None:
+        """エントリを削除 (ロックを取得した状態で呼ぶ)"""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size()
+        keys = self._table_keys.get(entry.table)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._table_keys[entry.table]
@@ -0,0 +1,321 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from db.connection_pool import STATEMENT_CACHE_SIZE, ConnectionPool, PoolTimeoutError
+from db.query_cache import TableVersions
+
+# PRAGMA data_version とテーブルのバージョンを確認する間隔 (秒)
+CHECK_INTERVAL = 0.05
+# 変更を検知してから次に作り直すまでの最短の間隔 (秒、連続する書き込みをまとめて反映する)
+MIN_REFRESH_INTERVAL = 0.1
+# 反映前の変更を含まないコピーから読んでよい秒数 (0 なら変更を検知した時点で主DBから読む)
+MAX_STALENESS = 0.0
+
+class ReadReplica:
+    """DBファイルの内容をメモリ上に複製した読み取り専用の接続 (SQLite のバックアップ API で作る)
+
+    ConnectionPool と同じく acquire / release で接続を貸し出すため、
+    DatabaseAccess(pool=replica) でそのまま読み取りに使える。接続ごとに別々の
+    :memory: のコピーを持ち、貸し出し用のコピーは作り直しの前後の世代を合わせて
+    max_size 個まで (ほかに作り直しの元になるマスターを1つ持つ)。
+    読み取りはディスクの I/O や書き込み中のロックの影響を受けない。
+
+    バックグラウンドのスレッドが check_interval 秒ごとに PRAGMA data_version
+    (他の接続・プロセスのコミットで変わる) と versions (このサーバーでの書き込みで
+    進むテーブルのバージョン) を確認し、変更があればコピーを作り直す。作り直しは
+    DBファイル -> 新しいマスター -> 貸し出し用のコピーの順にバックアップし、
+    出来上がってから世代を切り替えるため、読み取りの途中でコピーが書き換わることはない
+    (貸し出し中の古い世代のコピーは返却時に閉じる)。
+
+    変更を検知してから max_staleness 秒を過ぎてもコピーに反映されていない場合は、
+    主DBのプール (primary) から接続を貸し出す。max_staleness が0 (既定) なら、
+    このサーバーで書き込んだ直後の読み取りは必ず書き込みの結果を返す。
+    他のプロセスからの書き込みは検知までに最大 check_interval 秒かかる。
+    """
+
+    def __init__(self, db_path, primary: ConnectionPool, max_size: int = 8,
+                 timeout: float = 5.0, versions: Optional[TableVersions] = None,
+                 tables: Iterable[str] = (), check_interval: float = CHECK_INTERVAL,
+                 min_refresh_interval: float = MIN_REFRESH_INTERVAL,
+                 max_staleness: float = MAX_STALENESS):
+        if max_size < 1:
+            raise ValueError("max_size は1以上を指定してください")
+        self.db_path = Path(db_path)
+        self.primary = primary
+        self.max_size = max_size
+        self.timeout = timeout
+        self.versions = versions
+        self.tables = tuple(tables)
+        self.check_interval = check_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.max_staleness = max_staleness
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use: Dict[sqlite3.Connection, int] = {}  # conn -> 世代
+        self._primary_in_use = set()
+        self._size = 0
+        self._generation = 0
+        self._closed = False
+        # 作り直しの元になるコピー (貸し出さない)。バックアップ中は _master_lock を持つ
+        self._master: Optional[sqlite3.Connection] = None
+        self._master_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # 最後に作り直したときのテーブルのバージョンと data_version
+        self._snapshot: Tuple[int, ...] = ()
+        self._data_version: Optional[int] = None
+        # コピーに反映されていない変更を最初に検知した時刻 (なければ None)
+        self._dirty_since: Optional[float] = None
+        self._refreshed_at = 0.0
+        # data_version の確認とバックアップの読み取り元に使う接続 (監視スレッドだけが使う)
+        self._source: Optional[sqlite3.Connection] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'replica_reads': 0,
+            'primary_reads': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'refreshes': 0,
+            'refresh_time': 0.0,
+            'refresh_errors': 0,
+        }
+
+    def start(self) -> None:
+        """最初のコピーを作り、変更を監視するスレッドを開始"""
+        self._source = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='read-replica', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """監視スレッドを止め、全てのコピーを閉じる"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+        with self._master_lock:
+            if self._master is not None:
+                self._master.close()
+                self._master = None
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    close = stop
+
+    def _versions_snapshot(self) -> Tuple[int, ...]:
+        if self.versions is None:
+            return ()
+        return tuple(self.versions.get(table) for table in self.tables)
+
+    def _note_changes(self) -> None:
+        """このサーバーでの書き込みを検知する (_cond を取得した状態で呼ぶ)"""
+        if self._dirty_since is None and self._versions_snapshot() != self._snapshot:
+            self._dirty_since = time.monotonic()
+            self._wake.set()
+
+    def _stale(self) -> bool:
+        """許容する時間を超えて変更が反映されていないか (_cond を取得した状態で呼ぶ)"""
+        self._note_changes()
+        return self._dirty_since is not None and \
+            time.monotonic() - self._dirty_since >= self.max_staleness
+
+    def serves_stale(self) -> bool:
+        """反映前の変更があるのにコピーから読む状態か (結果をキャッシュしてはいけない)"""
+        with self._cond:
+            self._note_changes()
+            return self._dirty_since is not None and \
+                time.monotonic() - self._dirty_since < self.max_staleness
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """読み取り用の接続を借りる (コピーが古すぎる場合は主DBの接続)"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None
+        with self._cond:
+            use_primary = self._closed or self._master is None or self._stale()
+            while not use_primary:
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._in_use[conn] = self._generation
+                    self._stats['replica_reads'] += 1
+                    return conn
+                if self._size < self.max_size:
+                    self._size += 1
+                    generation = self._generation
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + timeout
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"{timeout}秒以内にレプリカの接続を取得できませんでした")
+                use_primary = self._closed or self._stale()
+        if use_primary:
+            conn = self.primary.acquire(timeout)
+            with self._cond:
+                self._primary_in_use.add(conn)
+                self._stats['primary_reads'] += 1
+            return conn
+        # 同時に使われているコピーの数が増えた: マスターから1つ作る
+        try:
+            with self._master_lock:
+                if self._master is None:
+                    raise sqlite3.ProgrammingError("レプリカは閉じられています")
+                conn = self._copy(self._master)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._in_use[conn] = generation
+            self._stats['replica_reads'] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """借りた接続を返す"""
+        with self._cond:
+            if conn in self._primary_in_use:
+                self._primary_in_use.discard(conn)
+                to_primary, to_close = True, False
+            else:
+                generation = self._in_use.pop(conn)
+                to_primary = False
+                # 作り直した後に返された古い世代のコピーは閉じる
+                to_close = self._closed or generation != self._generation
+                if to_close:
+                    self._size -= 1
+                else:
+                    self._idle.append(conn)
+                self._cond.notify()
+        if to_primary:
+            self.primary.release(conn)
+        elif to_close:
+            conn.close()
+
+    @staticmethod
+    def _copy(source: sqlite3.Connection) -> sqlite3.Connection:
+        """source の内容を新しい :memory: のデータベースに複製"""
+        conn = sqlite3.connect(':memory:', check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        try:
+            source.backup(conn)
+            # 誤って書き込んでもコピーだけが変わり、主DBに反映されないため禁止する
+            conn.execute("PRAGMA query_only = ON")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def refresh(self) -> None:
+        """DBファイルからコピーを作り直し、世代を切り替える"""
+        with self._refresh_lock:
+            started = time.monotonic()
+            # 読み取り前のバージョンを記録する (バックアップ中の書き込みは次回に反映される)
+            with self._cond:
+                snapshot = self._versions_snapshot()
+                # 貸し出し中の分も作っておき、返却後の読み取りでコピーを作らずに済むようにする。
+                # ただし貸し出し中の古い世代のコピーも max_size に数えるため、空いている分だけ
+                # 作り、残りは古いコピーが返却されてから acquire で作る
+                wanted = max(1, min(self.max_size, len(self._idle) + len(self._in_use)))
+                count = min(wanted, self.max_size - len(self._in_use))
+            data_version = self._source.execute("PRAGMA data_version").fetchone()[0]
+            master = sqlite3.connect(':memory:', check_same_thread=False)
+            copies = []
+            try:
+                self._source.backup(master)
+                copies = [self._copy(master) for _ in range(count)]
+            except Exception:
+                master.close()
+                for conn in copies:
+                    conn.close()
+                raise
+            with self._master_lock:
+                old_master, self._master = self._master, master
+            with self._cond:
+                self._generation += 1
+                old_idle = list(self._idle)
+                self._idle.clear()
+                self._size -= len(old_idle)
+                # バックアップ中に貸し出しが増えていれば、上限を超える分は使わずに閉じる
+                room = max(0, self.max_size - self._size)
+                old_idle += copies[room:]
+                copies = copies[:room]
+                self._idle.extend(copies)
+                self._size += len(copies)
+                self._snapshot = snapshot
+                self._data_version = data_version
+                self._dirty_since = None
+                self._refreshed_at = time.monotonic()
+                self._stats['refreshes'] += 1
+                self._stats['refresh_time'] += self._refreshed_at - started
+                # バックアップ中にこのサーバーで書き込まれていれば、すぐに次の作り直しを待つ
+                self._note_changes()
+                self._cond.notify_all()
+            for conn in old_idle:
+                conn.close()
+            if old_master is not None:
+                old_master.close()
+
+    def _run(self) -> None:
+        """変更を監視し、必要に応じてコピーを作り直す (監視スレッド)"""
+        while not self._stop.is_set():
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                with self._refresh_lock:
+                    data_version = self._source.execute("PRAGMA data_version").fetchone()[0]
+                with self._cond:
+                    if data_version != self._data_version and self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+                    self._note_changes()
+                    due = self._dirty_since is not None and \
+                        time.monotonic() - self._refreshed_at >= self.min_refresh_interval
+                if due:
+                    self.refresh()
+            except sqlite3.Error as e:
+                with self._cond:
+                    self._stats['refresh_errors'] += 1
+                print(f"レプリカの更新エラー: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """利用統計を取得"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+            stats['max_size'] = self.max_size
+            stats['generation'] = self._generation
+            # 反映されていない変更を検知してからの秒数 (なければ0)
+            stats['staleness'] = time.monotonic() - self._dirty_since \
+                if self._dirty_since is not None else 0.0
+            stats['age'] = time.monotonic() - self._refreshed_at if self._refreshed_at else 0.0
+        with self._master_lock:
+            if self._master is not None:
+                page_count = self._master.execute("PRAGMA page_count").fetchone()[0]
+                page_size = self._master.execute("PRAGMA page_size").fetchone()[0]
+                stats['bytes'] = page_count * page_size
+        reads = stats['replica_reads'] + stats['primary_reads']
+        stats['replica_read_rate'] = stats['replica_reads'] / reads if reads else 0.0
+        return stats
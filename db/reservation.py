@@ -0,0 +1,231 @@
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from .connection_pool import ConnectionPool
+except ImportError:  # スクリプトとして直接実行された場合
+    from connection_pool import ConnectionPool
+
+# 予約の既定の有効期間 (秒)
+DEFAULT_TTL = 900.0
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS reservations (
+        id TEXT PRIMARY KEY,
+        product_id INTEGER NOT NULL REFERENCES products(id),
+        owner TEXT NOT NULL,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        expires_at REAL NOT NULL
+    )
+    ''',
+    # 期限切れの検索と持ち主ごとの一覧に使う
+    "CREATE INDEX IF NOT EXISTS idx_reservations_expires_at ON reservations (expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reservations_owner ON reservations (owner)",
+]
+
+class OutOfStockError(Exception):
+    """在庫が足りない場合の例外 (available は現在の在庫数、商品がなければ None)"""
+
+    def __init__(self, product_id: int, requested: int, available: Optional[int]):
+        if available is None:
+            message = f"商品が見つかりません: {product_id}"
+        else:
+            message = f"在庫が不足しています: 商品 {product_id} (要求 {requested}, 在庫 {available})"
+        super().__init__(message)
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """予約テーブルがなければ作成"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+class ReservationStore:
+    """在庫の引き当て (予約) を管理する
+
+    予約は products.stock を条件付きで減らし (stock >= 数量 のときだけ)、
+    同じトランザクションで reservations に有効期限付きで記録する。
+    確定 (confirm) すると在庫は減ったままになり、取り消し (release) または
+    期限切れ (expire) で在庫に戻す。条件付きの減算は1文で判定と更新を行うため、
+    同時に予約されても在庫がマイナスになることはない。
+
+    SQLite の書き込みは1つずつしか実行できず、ロック待ちは busy_timeout による
+    スリープの繰り返しになるため、同じプロセス内の書き込みはロックで順番に
+    実行して待ち時間を減らす (別プロセスとの競合は busy_timeout で待つ)。
+    """
+
+    def __init__(self, pool: ConnectionPool, ttl: float = DEFAULT_TTL,
+                 sweep_interval: float = 5.0,
+                 on_expire: Optional[Callable[[int], None]] = None):
+        self.pool = pool
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        # 期限切れの予約を在庫に戻した後に件数を渡して呼び出す (キャッシュの無効化など)
+        self.on_expire = on_expire
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'reserved': 0,
+            'rejected': 0,
+            'released': 0,
+            'confirmed': 0,
+            'expired': 0,
+        }
+        conn = self.pool.acquire()
+        try:
+            ensure_schema(conn)
+        finally:
+            self.pool.release(conn)
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """書き込みトランザクション (例外が発生すればロールバック)"""
+        with self._write_lock:
+            conn = self.pool.acquire()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.rollback()
+                    raise
+                conn.commit()
+            finally:
+                self.pool.release(conn)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def reserve(self, product_id: int, quantity: int, owner: str,
+                ttl: Optional[float] = None) -> Dict[str, Any]:
+        """在庫を引き当てて予約を作成 (在庫が足りなければ OutOfStockError)"""
+        if quantity < 1:
+            raise ValueError("数量は1以上を指定してください")
+        reservation = {
+            'id': uuid.uuid4().hex,
+            'product_id': product_id,
+            'owner': owner,
+            'quantity': quantity,
+            'expires_at': time.time() + (ttl if ttl is not None else self.ttl),
+        }
+        try:
+            with self._write() as conn:
+                cursor = conn.execute(
+                    "UPDATE products SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                    (quantity, product_id, quantity))
+                if cursor.rowcount == 0:
+                    row = conn.execute("SELECT stock FROM products WHERE id = ?",
+                                       (product_id,)).fetchone()
+                    raise OutOfStockError(product_id, quantity, row[0] if row else None)
+                conn.execute(
+                    "INSERT INTO reservations (id, product_id, owner, quantity, expires_at) "
+                    "VALUES (:id, :product_id, :owner, :quantity, :expires_at)", reservation)
+        except OutOfStockError:
+            self._count('rejected')
+            raise
+        self._count('reserved')
+        return reservation
+
+    def release(self, reservation_id: str, owner: Optional[str] = None) -> bool:
+        """予約を取り消して在庫に戻す (該当する予約がなければ False)"""
+        with self._write() as conn:
+            row = self._find(conn, reservation_id, owner)
+            if row is None:
+                return False
+            conn.execute("DELETE FROM reservations WHERE id = ?", (reservation_id,))
+            conn.execute("UPDATE products SET stock = stock + ? WHERE id = ?",
+                         (row[1], row[0]))
+        self._count('released')
+        return True
+
+    def confirm(self, reservation_id: str, owner: Optional[str] = None) -> bool:
+        """予約を確定 (在庫は減ったまま予約だけを消す)
+
+        期限切れの予約は確定できず False を返す (在庫は期限切れの処理で戻す)。
+        """
+        with self._write() as conn:
+            row = self._find(conn, reservation_id, owner)
+            if row is None or row[2] <= time.time():
+                return False
+            conn.execute("DELETE FROM reservations WHERE id = ?", (reservation_id,))
+        self._count('confirmed')
+        return True
+
+    @staticmethod
+    def _find(conn: sqlite3.Connection, reservation_id: str, owner: Optional[str]):
+        """(product_id, quantity, expires_at) を取得 (なければ None)"""
+        query = "SELECT product_id, quantity, expires_at FROM reservations WHERE id = ?"
+        params: List[Any] = [reservation_id]
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        return conn.execute(query, params).fetchone()
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """期限切れの予約を在庫に戻して削除し、件数を返す"""
+        now = time.time() if now is None else now
+        with self._write() as conn:
+            totals = conn.execute(
+                "SELECT product_id, SUM(quantity) FROM reservations "
+                "WHERE expires_at <= ? GROUP BY product_id", (now,)).fetchall()
+            if not totals:
+                return 0
+            conn.executemany("UPDATE products SET stock = stock + ? WHERE id = ?",
+                             [(quantity, product_id) for product_id, quantity in totals])
+            expired = conn.execute("DELETE FROM reservations WHERE expires_at <= ?",
+                                   (now,)).rowcount
+        self._count('expired', expired)
+        if self.on_expire:
+            self.on_expire(expired)
+        return expired
+
+    def list_reservations(self, owner: str) -> List[Dict[str, Any]]:
+        """持ち主の有効な予約を取得"""
+        conn = self.pool.acquire()
+        try:
+            rows = conn.execute(
+                "SELECT id, product_id, owner, quantity, expires_at FROM reservations "
+                "WHERE owner = ? AND expires_at > ? ORDER BY expires_at",
+                (owner, time.time())).fetchall()
+        finally:
+            self.pool.release(conn)
+        keys = ('id', 'product_id', 'owner', 'quantity', 'expires_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.expire()
+            except sqlite3.Error as e:
+                print(f"予約の期限切れ処理エラー: {e}")
+
+    def start(self) -> None:
+        """バックグラウンドでの期限切れ処理を開始"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='reservation-sweeper',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """期限切れ処理を停止"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """予約の処理件数を取得"""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,83 @@
+import sqlite3
+from typing import List, Optional
+
+# trigram トークナイザーで索引を使って検索できる最短の語の長さ
+MIN_TERM_LENGTH = 3
+
+# 商品名の一致を説明文の一致より重視する (bm25 の列ごとの重み)
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# 索引を使えない語 (MIN_TERM_LENGTH 未満) だけの検索で、部分一致を調べる商品数の上限
+# (id 順に先頭から)。全件を LIKE で調べると商品数に比例して遅くなるため、
+# これを超える商品がある場合は結果に truncated を付けて一部だけを調べたことを示す。
+MAX_SCAN_ROWS = 20000
+
+SCHEMA = [
+    # products を参照する外部コンテンツ形式の全文検索索引 (本文は products 側にだけ持つ)
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='trigram'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    ''',
+    # 在庫や価格だけの更新では索引を書き換えない
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products
+    BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts (rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    ''',
+]
+
+def ensure_schema(conn: sqlite3.Connection) -> bool:
+    """全文検索索引とトリガーがなければ作成 (新たに作成した場合は既存の行から索引を作って True)"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+    conn.commit()
+    return not exists
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    """products の内容から全文検索索引を作り直す (トリガーを通さずに一括投入した後に使う)"""
+    conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+def split_terms(text: str) -> List[str]:
+    """検索文字列を空白 (全角を含む) で語に分ける"""
+    return text.replace('　', ' ').split()
+
+def build_match_query(terms: List[str]) -> Optional[str]:
+    """語のリストから FTS5 の MATCH 式を作る (全ての語を含む行に一致)
+
+    各語は引用符で囲んで演算子として解釈されないようにする。
+    trigram では3文字未満の語を索引で検索できないため、その語は式に含めない
+    (呼び出し側で short_terms の語を LIKE で絞り込む)。索引で検索できる語が
+    なければ None。
+    """
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    if not indexed:
+        return None
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in indexed)
+
+def short_terms(terms: List[str]) -> List[str]:
+    """索引で検索できない (MIN_TERM_LENGTH 未満の) 語"""
+    return [term for term in terms if len(term) < MIN_TERM_LENGTH]
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# 接続時に適用する PRAGMA の組み合わせ
+# busy_timeout は journal_mode の切り替えでロック待ちできるよう先頭に置く
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # SQLite の既定値のまま (ロールバックジャーナル, synchronous=FULL)
+    'default': {},
+    # 読み取りと書き込みを並行させるための設定
+    'performance': {
+        'busy_timeout': 5000,           # ロック待ち (ミリ秒)
+        'journal_mode': 'WAL',          # 読み取りが書き込みにブロックされない
+        'synchronous': 'NORMAL',        # WAL ではコミットごとの fsync が不要
+        'cache_size': -32768,           # ページキャッシュ 32MiB (負数は KiB 指定)
+        'mmap_size': 268435456,         # 256MiB までメモリマップで読む
+        'temp_store': 'MEMORY',         # ソート等の一時領域をメモリに置く
+        'wal_autocheckpoint': 1000,     # 1000ページごとに自動チェックポイント
+        'journal_size_limit': 67108864, # チェックポイント後に WAL を 64MiB まで切り詰める
+    },
+}
+
+DEFAULT_PROFILE = 'performance'
+
+def get_profile(name: str, **overrides) -> Dict[str, Any]:
+    """プロファイルの PRAGMA 設定を取得 (個別の値は上書き可能)"""
+    if name not in PROFILES:
+        raise ValueError(f"不明なプロファイルです: {name}")
+    profile = dict(PROFILES[name])
+    profile.update(overrides)
+    return profile
+
+def apply_profile(conn: sqlite3.Connection, profile: Dict[str, Any]) -> None:
+    """接続にプロファイルの PRAGMA を適用"""
+    for name, value in profile.items():
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+class WalCheckpointer:
+    """WAL ファイルが際限なく大きくならないよう定期的にチェックポイントを行うスレッド
+
+    wal_autocheckpoint による自動チェックポイントは読み取りが続くと
+    最後まで進まないことがあるため、interval 秒ごとに PASSIVE で
+    チェックポイントし、WAL が max_wal_bytes を超えていれば TRUNCATE で
+    読み取りの終了を待って WAL を空にする。
+    """
+
+    def __init__(self, db_path, interval: float = 10.0,
+                 max_wal_bytes: int = 64 * 1024 * 1024, busy_timeout: int = 5000):
+        self.db_path = Path(db_path)
+        self.wal_path = Path(str(self.db_path) + "-wal")
+        self.interval = interval
+        self.max_wal_bytes = max_wal_bytes
+        self.busy_timeout = busy_timeout
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'truncates': 0,
+            'busy': 0,
+            'errors': 0,
+            'wal_bytes': 0,
+        }
+
+    def wal_size(self) -> int:
+        """現在の WAL ファイルのサイズ"""
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def checkpoint(self, mode: Optional[str] = None) -> Optional[tuple]:
+        """チェックポイントを1回実行 (mode 省略時は WAL のサイズで決める)"""
+        if mode is None:
+            mode = 'TRUNCATE' if self.wal_size() >= self.max_wal_bytes else 'PASSIVE'
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+                # (busy, WAL のページ数, チェックポイント済みページ数)
+                result = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"チェックポイントエラー: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return None
+        with self._lock:
+            self._stats['runs'] += 1
+            if mode == 'TRUNCATE':
+                self._stats['truncates'] += 1
+            if result and result[0]:
+                self._stats['busy'] += 1
+            self._stats['wal_bytes'] = self.wal_size()
+        return result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.checkpoint()
+
+    def start(self) -> None:
+        """バックグラウンドでの定期チェックポイントを開始"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='wal-checkpointer',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """定期チェックポイントを停止"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """チェックポイントの実行統計を取得"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['wal_bytes'] = self.wal_size()
+        return stats
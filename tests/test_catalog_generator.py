@@ -0,0 +1,75 @@
+import unittest
+import sys
+import sqlite3
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.catalog_generator import generate_products
+from db.db_initialize import initialize_database
+
+class TestCatalogGenerator(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        # 他のテストが前提とするサンプルデータに戻す
+        initialize_database()
+        print("="*50)  # 区切り線
+
+    def test_deterministic(self):
+        """同じシードから同じ商品が生成されることのテスト"""
+        print("テスト: 同じシード・異なるシードで商品を生成")
+        print("期待する挙動: 同じシードでは同じ内容、異なるシードでは異なる内容になること")
+
+        first = list(generate_products(1000, seed=1))
+        second = list(generate_products(1000, seed=1))
+        other = list(generate_products(1000, seed=2))
+
+        print(f"実際の挙動: 先頭の商品 {first[0]}")
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(first), 1000)
+        # 説明には通し番号付きの型番が入るため全て異なる
+        self.assertEqual(len({description for _, _, description, _ in first}), 1000)
+        for name, price, description, stock in first:
+            self.assertTrue(name and description)
+            self.assertGreater(price, 0)
+            self.assertGreaterEqual(stock, 0)
+
+    def test_bulk_load(self):
+        """生成した商品の一括投入のテスト"""
+        print("テスト: 3000件を1000件ずつ投入")
+        print("期待する挙動: 全件が投入され、索引・全文検索・WAL モードが有効になること")
+
+        result = initialize_database(3000, seed=7, batch_size=1000)
+        db_path = project_root / "db" / "shop.db"
+        conn = sqlite3.connect(db_path)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            indexes = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'products'")}
+            name = conn.execute("SELECT name FROM products WHERE id = 1").fetchone()[0]
+            matches = conn.execute("SELECT COUNT(*) FROM products_fts WHERE products_fts MATCH ?",
+                                   ('"' + name + '"',)).fetchone()[0]
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+
+        print(f"実際の挙動: {result}, 索引 {sorted(indexes)}, 検索の一致 {matches}件")
+
+        self.assertEqual(result['products'], 3000)
+        self.assertEqual(count, 3000)
+        self.assertGreater(result['rows_per_sec'], 0)
+        self.assertTrue({'idx_products_name', 'idx_products_price',
+                         'idx_products_stock'} <= indexes)
+        self.assertGreaterEqual(matches, 1)
+        self.assertEqual(journal_mode, 'wal')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,143 @@
+import unittest
+import sys
+import threading
+from pathlib import Path
+import tempfile
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.connection_pool import ConnectionPool, PoolTimeoutError
+from db.db_access import DatabaseAccess
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / "pool_test.db"
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.tmpdir.cleanup()
+        print("="*50)  # 区切り線
+
+    def test_reuse(self):
+        """接続の再利用のテスト"""
+        print("テスト: 接続の再利用")
+        print("期待する挙動: 返却した接続が次の貸出で再利用されること")
+
+        pool = ConnectionPool(self.db_path, max_size=2)
+        conn1 = pool.acquire()
+        pool.release(conn1)
+        conn2 = pool.acquire()
+        pool.release(conn2)
+        stats = pool.stats()
+
+        print(f"実際の挙動: 同一接続={conn1 is conn2}, 統計={stats}")
+
+        self.assertIs(conn1, conn2)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        pool.close()
+
+    def test_pragmas(self):
+        """接続ごとのPRAGMA設定のテスト"""
+        print("テスト: 接続ごとのPRAGMA設定")
+        print("期待する挙動: 新しい接続にPRAGMAが適用されること")
+
+        pool = ConnectionPool(self.db_path, pragmas={'cache_size': -4096})
+        conn = pool.acquire()
+        cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+        pool.release(conn)
+
+        print(f"実際の挙動: cache_size={cache_size}")
+
+        self.assertEqual(cache_size, -4096)
+        pool.close()
+
+    def test_timeout(self):
+        """貸出待ちタイムアウトのテスト"""
+        print("テスト: 貸出待ちタイムアウト")
+        print("期待する挙動: 上限まで貸し出すと PoolTimeoutError になり、返却で待ちが解除されること")
+
+        pool = ConnectionPool(self.db_path, max_size=1, timeout=0.1)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+
+        # 別スレッドから返却されると待機中の貸出が成功する
+        timer = threading.Timer(0.05, pool.release, args=(conn,))
+        timer.start()
+        conn2 = pool.acquire(timeout=2.0)
+        timer.join()
+        pool.release(conn2)
+        stats = pool.stats()
+
+        print(f"実際の挙動: 統計={stats}")
+
+        self.assertIs(conn, conn2)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreaterEqual(stats['waits'], 1)
+        pool.close()
+
+    def test_rollback_on_release(self):
+        """返却時のロールバックのテスト"""
+        print("テスト: 返却時のロールバック")
+        print("期待する挙動: 未確定のトランザクションが返却時に破棄されること")
+
+        pool = ConnectionPool(self.db_path, max_size=1)
+        conn = pool.acquire()
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+        pool.release(conn)
+
+        conn = pool.acquire()
+        count = conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+        pool.release(conn)
+
+        print(f"実際の挙動: 件数={count}")
+
+        self.assertEqual(count, 0)
+        pool.close()
+
+    def test_reset(self):
+        """プールのリセットのテスト"""
+        print("テスト: プールのリセット")
+        print("期待する挙動: リセット前に貸し出した接続は返却時に破棄されること")
+
+        pool = ConnectionPool(self.db_path, max_size=2)
+        conn = pool.acquire()
+        pool.reset()
+        pool.release(conn)
+        stats = pool.stats()
+
+        print(f"実際の挙動: 統計={stats}")
+
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['discarded'], 1)
+        pool.close()
+
+    def test_database_access_uses_pool(self):
+        """DatabaseAccess のプール利用のテスト"""
+        print("テスト: DatabaseAccess のプール利用")
+        print("期待する挙動: with ブロックを抜けると接続がプールに返却されること")
+
+        pool = ConnectionPool(self.db_path, max_size=1)
+        with DatabaseAccess(pool) as db:
+            first = db.conn
+        with DatabaseAccess(pool) as db:
+            second = db.conn
+        stats = pool.stats()
+
+        print(f"実際の挙動: 同一接続={first is second}, 統計={stats}")
+
+        self.assertIs(first, second)
+        self.assertEqual(stats['in_use'], 0)
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,147 @@
+import unittest
+import threading
+from pathlib import Path
+import sys
+
+# プロジェクトルートと web/ へのパスを追加 (web のモジュールは直接読み込まれる前提)
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / 'web'))
+
+from common.http_servers import make_server
+from db.db_access import shared_pool
+from db.db_initialize import initialize_database
+from db.db_server import DBHandler
+from db.query_cache import TableVersions
+from db.reservation import ReservationStore
+from data_backend import DataBackend, HTTPDataBackend, LocalDataBackend
+
+class QuietDBHandler(DBHandler):
+    def log_message(self, format, *args):
+        pass
+
+class TestDataBackend(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """テストクラスの前処理"""
+        initialize_database()
+        cls.httpd = make_server(('localhost', 0), QuietDBHandler, mode='threaded', workers=4)
+        cls.httpd.table_versions = TableVersions()
+        cls.httpd.reservations = ReservationStore(shared_pool())
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """テストクラスの後処理"""
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        initialize_database()
+
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)
+        self.backends = {
+            'http': HTTPDataBackend(port=self.httpd.server_address[1], pool_size=2),
+            'local': LocalDataBackend(pool_size=2),
+        }
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        for backend in self.backends.values():
+            backend.close()
+        print("="*50)
+
+    def test_incomplete_backend(self):
+        """実装が足りない取得先のテスト"""
+        print("テスト: reserve だけを実装していない取得先を作る")
+        print("期待する挙動: 最初のリクエストを待たずに、作った時点で TypeError になること")
+
+        class IncompleteBackend(DataBackend):
+            def products_page(self, cursor=None, limit=50, if_none_match=None):
+                return 200, None, {}
+
+            def search(self, text, limit, offset=0):
+                return {}
+
+            def product(self, product_id):
+                return None
+
+            def iter_products(self):
+                return iter([])
+
+        with self.assertRaises(TypeError) as context:
+            IncompleteBackend()
+
+        print(f"実際の挙動: {context.exception}")
+
+        self.assertIn('reserve', str(context.exception))
+
+    def test_same_results(self):
+        """HTTP と同じプロセスの取得先で結果が一致するかのテスト"""
+        print("テスト: 両方の取得先で一覧の2ページ・検索・商品詳細・全件を取得")
+        print("期待する挙動: 同じ商品が同じ順序で返ること")
+
+        results = {}
+        for name, backend in self.backends.items():
+            status, etag, first = backend.products_page(limit=2)
+            _, _, second = backend.products_page(first['next_cursor'], limit=2)
+            results[name] = {
+                'status': status,
+                'etag': etag is not None,
+                'pages': [list(map(list, first['products'])), list(map(list, second['products']))],
+                'columns': list(first['columns']),
+                'search': list(map(list, backend.search('マウス', 10)['products'])),
+                'product': backend.product(2),
+                'missing': backend.product(999999),
+                'all': list(map(list, backend.iter_products())),
+            }
+
+        print(f"実際の挙動: {results['local']}")
+
+        self.assertEqual(results['http'], results['local'])
+        self.assertEqual(results['local']['status'], 200)
+        self.assertTrue(results['local']['etag'])
+        self.assertEqual(len(results['local']['pages'][0]), 2)
+        self.assertGreater(results['local']['pages'][1][0][0], results['local']['pages'][0][1][0])
+        self.assertEqual(results['local']['product']['id'], 2)
+        self.assertIsNone(results['local']['missing'])
+
+    def test_revalidation(self):
+        """一覧の ETag による再検証のテスト"""
+        print("テスト: 取得した ETag で再検証し、別の接続から在庫を引き当ててから再検証")
+        print("期待する挙動: 変更前は304、HTTP 側での書き込み後は新しい ETag で200が返ること")
+
+        local = self.backends['local']
+        _, etag, _ = local.products_page(limit=2)
+        not_modified, _, _ = local.products_page(limit=2, if_none_match=etag)
+        reserved, _ = self.backends['http'].reserve(1, 1, 'owner-a')
+        modified, new_etag, data = local.products_page(limit=2, if_none_match=etag)
+
+        print(f"実際の挙動: {not_modified}, 予約 {reserved}, 変更後 {modified}")
+
+        self.assertEqual(not_modified, 304)
+        self.assertEqual(reserved, 200)
+        self.assertEqual(modified, 200)
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(len(data['products']), 2)
+
+    def test_reserve(self):
+        """在庫の引き当てのテスト"""
+        print("テスト: 両方の取得先で在庫の引き当て・在庫不足・存在しない商品を指定")
+        print("期待する挙動: どちらも200・409・404を返し、在庫が減ること")
+
+        results = {}
+        for name, backend in self.backends.items():
+            before = backend.product(3)['stock']
+            statuses = [backend.reserve(3, 1, f'owner-{name}')[0],
+                        backend.reserve(3, before + 100, f'owner-{name}')[0],
+                        backend.reserve(999999, 1, f'owner-{name}')[0]]
+            results[name] = (statuses, before - backend.product(3)['stock'])
+
+        print(f"実際の挙動: {results}")
+
+        self.assertEqual(results['http'], ([200, 409, 404], 1))
+        self.assertEqual(results['local'], ([200, 409, 404], 1))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
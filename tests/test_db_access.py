@@ -7,6 +7,9 @@ import os
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
+from unittest import mock
+
+from db import db_access
 from db.db_access import DatabaseAccess
 from db.db_initialize import initialize_database
 
@@ -58,6 +61,68 @@ class TestDatabaseAccess(unittest.TestCase):
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0][1], "ノートパソコン")
 
+    def test_select_page(self):
+        """select_page メソッドのテスト"""
+        print("テスト: ページ単位の商品取得")
+        print("期待する挙動: 2件ずつ id 順に取得でき、次ページの開始位置が返ること")
+
+        first_page, next_after_id = self.db.select_page('products', limit=2)
+        second_page, _ = self.db.select_page('products', limit=2, after_id=next_after_id)
+        offset_page, _ = self.db.select_page('products', limit=2, offset=2)
+
+        print(f"実際の挙動: 1ページ目 {first_page}, 次の開始位置 {next_after_id}")
+        print(f"2ページ目: {second_page}")
+
+        self.assertEqual([row[0] for row in first_page], [1, 2])
+        self.assertEqual(next_after_id, 2)
+        self.assertEqual([row[0] for row in second_page], [3, 4])
+        self.assertEqual(second_page, offset_page)
+
+    def test_search(self):
+        """search メソッドのテスト"""
+        print("テスト: 商品名・説明の全文検索")
+        print("期待する挙動: 日本語の部分一致で検索でき、更新が索引に反映されること")
+
+        results, next_offset = self.db.search('マウス', limit=10)
+        short_results, _ = self.db.search('PC', limit=10)
+        self.db.insert('products', {"name": "検索テスト用ヘッドホン", "price": 5000,
+                                    "description": "密閉型", "stock": 3})
+        inserted, _ = self.db.search('ヘッドホン 密閉型', limit=10)
+
+        print(f"実際の挙動: マウス {results}, PC {short_results}, ヘッドホン {inserted}")
+
+        self.assertEqual([row[1] for row in results], ['ワイヤレスマウス'])
+        self.assertIsNone(next_offset)
+        self.assertEqual([row[1] for row in short_results], ['ノートパソコン'])
+        self.assertEqual([row[1] for row in inserted], ['検索テスト用ヘッドホン'])
+
+    def test_search_short_terms(self):
+        """索引を使えない短い語を含む検索のテスト"""
+        print("テスト: 3文字以上の語と短い語の組み合わせ、調べる商品数を2件に制限した短い語だけの検索")
+        print("期待する挙動: 組み合わせは索引の一致を短い語で絞り込み、短い語だけの検索は"
+              "先頭2件だけを調べて truncated になること")
+
+        mixed, _ = self.db.search('マウス 対応', limit=10)
+        mixed_truncated = self.db.search_truncated
+        unmatched, _ = self.db.search('マウス 32', limit=10)
+        full, _ = self.db.search('対応', limit=10)
+        full_truncated = self.db.search_truncated
+        with mock.patch.object(db_access, 'MAX_SCAN_ROWS', 2):
+            limited, _ = self.db.search('対応', limit=10)
+            limited_truncated = self.db.search_truncated
+
+        print(f"実際の挙動: マウス 対応 {mixed}, マウス 32 {unmatched}, "
+              f"対応 {[row[0] for row in full]} ({full_truncated}), "
+              f"制限時 {[row[0] for row in limited]} ({limited_truncated})")
+
+        self.assertEqual([row[1] for row in mixed], ['ワイヤレスマウス'])
+        self.assertFalse(mixed_truncated)
+        self.assertEqual(unmatched, [])
+        self.assertEqual([row[0] for row in full], [2, 5])
+        self.assertFalse(full_truncated)
+        self.assertEqual([row[0] for row in limited], [2])
+        self.assertTrue(limited_truncated)
+
     def test_insert(self):
         """insert メソッドのテスト"""
         print("テスト: 新規商品の追加")
@@ -134,6 +199,72 @@ class TestDatabaseAccess(unittest.TestCase):
         self.assertTrue(success)
         self.assertEqual(len(results), 0)
 
+    def test_transaction(self):
+        """transaction メソッドのテスト"""
+        print("テスト: トランザクションとセーブポイント")
+        print("期待する挙動: 例外で抜けると取り消され、内側の失敗は内側の変更だけが取り消されること")
+
+        try:
+            with self.db.transaction():
+                self.db.insert('products', {"name": "取り消し商品", "price": 1,
+                                            "description": "tx", "stock": 1})
+                raise RuntimeError("中断")
+        except RuntimeError:
+            pass
+        rolled_back = self.db.select('products', {"name": "取り消し商品"})
+
+        with self.db.transaction(immediate=True):
+            self.db.insert('products', {"name": "外側の商品", "price": 1,
+                                        "description": "tx", "stock": 1})
+            try:
+                with self.db.transaction():
+                    self.db.insert('products', {"name": "内側の商品", "price": 1,
+                                                "description": "tx", "stock": 1})
+                    raise RuntimeError("内側で中断")
+            except RuntimeError:
+                pass
+            self.assertTrue(self.db.in_transaction)
+        results = self.db.select('products', {"description": "tx"})
+
+        print(f"実際の挙動: 取り消し後 {rolled_back}, コミット後 {results}")
+
+        self.assertEqual(rolled_back, [])
+        self.assertEqual([row[1] for row in results], ["外側の商品"])
+        self.assertFalse(self.db.in_transaction)
+        self.assertFalse(self.db.conn.in_transaction)
+
+    def test_bulk_write(self):
+        """insert_many / update_many / upsert_many メソッドのテスト"""
+        print("テスト: 複数商品の一括追加・更新")
+        print("期待する挙動: 全行が書き込まれ、失敗した行だけがエラーになること")
+
+        rows = [{"name": f"一括商品{i}", "price": i, "description": "一括", "stock": i}
+                for i in range(5)]
+        # 不正な列を含む行は失敗し、他の行は書き込まれる
+        rows.insert(2, {"invalid_column": "value"})
+        errors = self.db.insert_many('products', rows, chunk_size=2)
+        inserted = self.db.select('products', {"description": "一括"})
+        print(f"挿入結果: {errors}")
+
+        ids = [row[0] for row in inserted]
+        update_errors = self.db.update_many(
+            'products', [{"id": product_id, "stock": 100} for product_id in ids])
+        upsert_errors = self.db.upsert_many('products', [
+            {"id": ids[0], "name": "一括商品0", "price": 999, "description": "一括", "stock": 1},
+            {"name": "一括商品new", "price": 1, "description": "一括", "stock": 1},
+        ])
+        results = self.db.select('products', {"description": "一括"})
+        print(f"実際の挙動: 更新結果 {update_errors}, 挿入・更新結果 {upsert_errors}")
+        print(f"取得データ: {results}")
+
+        self.assertEqual([e is None for e in errors], [True, True, False, True, True, True])
+        self.assertEqual(len(inserted), 5)
+        self.assertEqual(update_errors, [None] * 5)
+        self.assertEqual(upsert_errors, [None, None])
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[0][2], 999)
+        self.assertTrue(all(row[4] == 100 for row in results[1:5]))
+
     def test_error_handling(self):
         """エラーハンドリングのテスト"""
         print("テスト: エラーハンドリング")
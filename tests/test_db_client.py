@@ -0,0 +1,193 @@
+import unittest
+import json
+import socket
+import threading
+import time
+from pathlib import Path
+import sys
+from http.server import BaseHTTPRequestHandler
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.http_servers import make_server
+from db.db_server import DBHandler
+from db.db_initialize import initialize_database
+from web.db_client import DBClient
+
+class ShortTimeoutDBHandler(DBHandler):
+    """持続的接続をすぐに切断する DBHandler"""
+    timeout = 0.2
+
+    def log_message(self, format, *args):
+        pass
+
+class SlowPostHandler(BaseHTTPRequestHandler):
+    """POST を受け付けた回数を数え、応答を遅らせるハンドラー"""
+    protocol_version = 'HTTP/1.1'
+    posts = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        type(self).posts += 1
+        time.sleep(0.5)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class TestDBClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """テストクラスの前処理"""
+        initialize_database()
+        cls.httpd = make_server(('localhost', 0), ShortTimeoutDBHandler, mode='threaded', workers=4)
+        cls.port = cls.httpd.server_address[1]
+        cls.server_thread = threading.Thread(target=cls.httpd.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """テストクラスの後処理"""
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        self.client = DBClient(port=self.port, pool_size=2)
+        print("\n" + "="*50)
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.client.close()
+        print("="*50)
+
+    def test_keep_alive(self):
+        """持続的接続の再利用のテスト"""
+        print("テスト: 持続的接続の再利用")
+        print("期待する挙動: 連続したリクエストで同じ接続が使い回されること")
+
+        first = self.client.get_json("/select?id=1")
+        second = self.client.get_json("/select?id=2")
+        stats = self.client.stats()
+
+        print(f"実際の挙動: 統計 {stats}")
+        print(f"取得データ: {first}, {second}")
+
+        self.assertEqual(first['products'][0][0], 1)
+        self.assertEqual(second['products'][0][0], 2)
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['reused'], 1)
+
+    def test_iter_lines(self):
+        """NDJSON のストリーミング受信のテスト"""
+        print("テスト: iter_lines での NDJSON の受信")
+        print("期待する挙動: 1行1商品で受け取れ、読み終えた接続が再利用されること")
+
+        lines = list(self.client.iter_lines("/select_all?stream=1",
+                                            headers={'Accept': 'application/x-ndjson'}))
+        data = self.client.get_json("/select?id=1")
+        stats = self.client.stats()
+
+        print(f"実際の挙動: {len(lines)} 行受信, 統計 {stats}")
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])[0], 1)
+        self.assertEqual(data['products'][0][0], 1)
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['reused'], 1)
+
+    def test_retry_on_closed_connection(self):
+        """切断された接続での再送のテスト"""
+        print("テスト: サーバー側で切断された接続での再送")
+        print("期待する挙動: 送信前に切断を検知して新しい接続で送り、POST も成功すること")
+
+        self.client.get_json("/select?id=1")
+        # サーバー側のタイムアウトで持続的接続が閉じられるのを待つ
+        time.sleep(0.5)
+        data = self.client.get_json("/select?id=1")
+        time.sleep(0.5)
+        status, _, _ = self.client.request("POST", "/non_existent", body=b'{}')
+        stats = self.client.stats()
+
+        print(f"実際の挙動: ステータスコード {status}, 統計 {stats}")
+
+        self.assertEqual(data['products'][0][0], 1)
+        self.assertEqual(status, 404)
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['connects'], 3)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_no_retry_after_send(self):
+        """送信後に失敗した冪等でないリクエストのテスト"""
+        print("テスト: 応答の前にタイムアウトする POST と、接続できない POST")
+        print("期待する挙動: 送信後のタイムアウトは再送せず (サーバーの処理は1回)、"
+              "接続できない場合は再送すること")
+
+        SlowPostHandler.posts = 0
+        httpd = make_server(('localhost', 0), SlowPostHandler, mode='threaded', workers=4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        client = DBClient(port=httpd.server_address[1], timeout=0.2, retries=2, backoff=0.01)
+        try:
+            with self.assertRaises(TimeoutError):
+                client.request("POST", "/reserve", body=b'{}')
+            time.sleep(0.6)
+            posts = SlowPostHandler.posts
+            stats = client.stats()
+        finally:
+            client.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+        # 使われていないポートに送る
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            closed_port = sock.getsockname()[1]
+        refused = DBClient(port=closed_port, retries=2, backoff=0.01)
+        with self.assertRaises(ConnectionRefusedError):
+            refused.request("POST", "/reserve", body=b'{}')
+        refused_stats = refused.stats()
+
+        print(f"実際の挙動: サーバーの処理 {posts} 回, 統計 {stats}, 接続できない場合 {refused_stats}")
+
+        self.assertEqual(posts, 1)
+        self.assertEqual(stats['retries'], 0)
+        self.assertEqual(refused_stats['retries'], 2)
+
+    def test_unknown_path_keeps_connection(self):
+        """存在しない宛先への本文付きリクエストのテスト"""
+        print("テスト: 存在しない宛先への本文付きリクエスト後の接続の再利用")
+        print("期待する挙動: 本文が読み捨てられ、同じ接続で次のリクエストが処理されること")
+
+        status, _, _ = self.client.request("POST", "/non_existent", body=b'{"name": "x"}')
+        data = self.client.get_json("/select?id=1")
+        stats = self.client.stats()
+
+        print(f"実際の挙動: ステータスコード {status}, 統計 {stats}")
+
+        self.assertEqual(status, 404)
+        self.assertEqual(data['products'][0][0], 1)
+        self.assertEqual(stats['reused'], 1)
+
+    def test_get_rows(self):
+        """バイナリ形式での行の取得のテスト"""
+        print("テスト: 列を指定した select をバイナリ形式で取得し、JSON の応答と比べる")
+        print("期待する挙動: 列名付きの行形式に戻り、JSON と同じ値になること")
+
+        status, _, data = self.client.get_rows("/select?id=1&fields=name,id")
+        expected = self.client.get_json("/select?id=1&fields=name,id")
+        error_status, _, error = self.client.get_rows("/select?unknown=1")
+
+        print(f"実際の挙動: {status} {data}, エラー {error_status} {error}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['columns'], ['name', 'id'])
+        self.assertEqual(data['products'], expected['products'])
+        self.assertEqual(error_status, 400)
+        self.assertIn('error', error)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
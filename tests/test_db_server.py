@@ -2,7 +2,6 @@ import unittest
 import json
 import http.client
 import threading
-import time
 from pathlib import Path
 import sys
 from urllib.parse import quote  # URLエンコード用に追加
@@ -11,7 +10,9 @@ from urllib.parse import quote  # URLエンコード用に追加
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from db.db_server import run_server
+from common.http_servers import wait_until_ready
+from common.row_formats import FORMATS, decode_result
+from db.db_server import DBHandler, run_server
 from db.db_initialize import initialize_database
 
 class TestDBServer(unittest.TestCase):
@@ -24,8 +25,9 @@ class TestDBServer(unittest.TestCase):
         # サーバーを別スレッドで起動
         cls.server_thread = threading.Thread(target=run_server, daemon=True)
         cls.server_thread.start()
-        # サーバーの起動を待機
-        time.sleep(1)
+        # サーバーが応答するまで待機
+        if not wait_until_ready('localhost', 8000, '/stats'):
+            raise RuntimeError('サーバーが起動しませんでした')
         print("サーバーの起動完了")
 
     def setUp(self):
@@ -54,6 +56,87 @@ class TestDBServer(unittest.TestCase):
         self.assertIn('products', data)
         self.assertGreater(len(data['products']), 0)
 
+    def test_select_all_pagination(self):
+        """select_all エンドポイントのページングのテスト"""
+        print("テスト: ページ単位の商品取得 (GET /select_all?limit=2)")
+        print("期待する挙動: 2件ずつ返却され、next_cursor で次のページを取得できること")
+
+        self.conn.request("GET", "/select_all?limit=2")
+        response = self.conn.getresponse()
+        first = json.loads(response.read().decode())
+        self.conn.close()
+
+        self.conn = http.client.HTTPConnection("localhost", 8000)
+        self.conn.request("GET", f"/select_all?limit=2&cursor={first['next_cursor']}")
+        response = self.conn.getresponse()
+        second = json.loads(response.read().decode())
+
+        print(f"実際の挙動: 1ページ目 {first}")
+        print(f"2ページ目: {second}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(first['products']), 2)
+        self.assertEqual(len(second['products']), 2)
+        self.assertGreater(second['products'][0][0], first['products'][-1][0])
+
+    def test_select_all_stream(self):
+        """select_all エンドポイントのストリーミングのテスト"""
+        print("テスト: ストリーミングでの商品取得 (GET /select_all?stream=1)")
+        print("期待する挙動: チャンク転送で返却され、通常の応答と同じ商品が含まれること")
+
+        self.conn.request("GET", "/select_all?limit=3")
+        expected = json.loads(self.conn.getresponse().read().decode())
+        self.conn.close()
+
+        self.conn = http.client.HTTPConnection("localhost", 8000)
+        self.conn.request("GET", "/select_all?stream=1&limit=3")
+        response = self.conn.getresponse()
+        data = json.loads(response.read().decode())
+        self.conn.close()
+
+        self.conn = http.client.HTTPConnection("localhost", 8000)
+        self.conn.request("GET", "/select_all?limit=3", headers={'Accept': 'application/x-ndjson'})
+        ndjson_response = self.conn.getresponse()
+        lines = ndjson_response.read().decode().splitlines()
+
+        print(f"実際の挙動: Transfer-Encoding {response.getheader('Transfer-Encoding')}")
+        print(f"取得データ: {data}")
+        print(f"NDJSON: {lines}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Transfer-Encoding'), 'chunked')
+        self.assertEqual(data, expected)
+        self.assertEqual([json.loads(line) for line in lines], expected['products'])
+
+    def test_select_all_stream_batch_boundary(self):
+        """limit がバッチの大きさの倍数の場合のストリーミングのテスト"""
+        print("テスト: バッチの大きさ2で limit=2, 4 をストリーミングで取得する")
+        print("期待する挙動: 先読みの行だけが次のバッチに来ても、通常の応答と同じ next_cursor が返ること")
+
+        original = DBHandler.stream_batch_size
+        DBHandler.stream_batch_size = 2
+        results = []
+        try:
+            for limit in (2, 4):
+                self.conn.request("GET", f"/select_all?limit={limit}")
+                expected = json.loads(self.conn.getresponse().read().decode())
+                self.conn.close()
+                self.conn = http.client.HTTPConnection("localhost", 8000)
+                self.conn.request("GET", f"/select_all?stream=1&limit={limit}")
+                data = json.loads(self.conn.getresponse().read().decode())
+                self.conn.close()
+                self.conn = http.client.HTTPConnection("localhost", 8000)
+                results.append((limit, expected, data))
+        finally:
+            DBHandler.stream_batch_size = original
+
+        for limit, expected, data in results:
+            print(f"実際の挙動: limit={limit} 件数 {len(data['products'])}, "
+                  f"next_cursor {data['next_cursor']} (通常の応答 {expected['next_cursor']})")
+            self.assertEqual(len(data['products']), limit)
+            self.assertIsNotNone(data['next_cursor'])
+            self.assertEqual(data, expected)
+
     def test_select(self):
         """select エンドポイントのテスト"""
         print("テスト: 条件付き商品の取得 (GET /select)")
@@ -72,6 +155,160 @@ class TestDBServer(unittest.TestCase):
         self.assertEqual(len(data['products']), 1)
         self.assertEqual(data['products'][0][1], "ノートパソコン")
 
+    def test_search(self):
+        """search エンドポイントのテスト"""
+        print("テスト: 全文検索 (GET /search?q=...)")
+        print("期待する挙動: 関連度順の結果が返り、limit / offset でページ送りできること")
+
+        self.conn.request("GET", "/search?" + "q=" + quote("対応") + "&limit=1")
+        response = self.conn.getresponse()
+        first = json.loads(response.read().decode())
+        self.conn.request("GET", f"/search?q={quote('対応')}&limit=1&offset={first['next_offset']}")
+        second = json.loads(self.conn.getresponse().read().decode())
+        self.conn.request("GET", "/search")
+        missing = self.conn.getresponse()
+        missing.read()
+
+        print(f"実際の挙動: ステータスコード {response.status}, 1ページ目 {first}, 2ページ目 {second}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(first['products']), 1)
+        self.assertEqual(first['next_offset'], 1)
+        self.assertEqual(len(second['products']), 1)
+        self.assertNotEqual(first['products'][0][0], second['products'][0][0])
+        self.assertEqual(missing.status, 400)
+
+    def test_select_query(self):
+        """select エンドポイントの範囲・並べ替え・射影のテスト"""
+        print("テスト: 範囲条件・並べ替え・列の指定 (GET /select?price__lt=...)")
+        print("期待する挙動: 指定した列だけが条件に合う順で返り、不正な列は400になること")
+
+        self.conn.request("GET", "/select?price__lt=5000&fields=id,name,price&order=-price&limit=2")
+        response = self.conn.getresponse()
+        data = json.loads(response.read().decode())
+        self.conn.request("GET", "/select?order=password&limit=1")
+        invalid = self.conn.getresponse()
+        invalid.read()
+
+        print(f"実際の挙動: ステータスコード {response.status}, レスポンス {data}, 不正な列 {invalid.status}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data['columns'], ['id', 'name', 'price'])
+        self.assertEqual(len(data['products']), 2)
+        self.assertTrue(all(len(row) == 3 and row[2] < 5000 for row in data['products']))
+        self.assertGreaterEqual(data['products'][0][2], data['products'][1][2])
+        self.assertEqual(invalid.status, 400)
+
+    def test_select_cache(self):
+        """select エンドポイントのキャッシュのテスト"""
+        print("テスト: 検索結果のキャッシュ (GET /select)")
+        print("期待する挙動: 2回目はキャッシュから返り、更新後は再取得されること")
+
+        statuses = []
+        for method, path, body in [
+            ("GET", "/select?id=2", None),
+            ("GET", "/select?id=2", None),
+            ("PUT", "/update", {"conditions": {"id": 2}, "stock": 49}),
+            ("GET", "/select?id=2", None),
+        ]:
+            self.conn.request(method, path, json.dumps(body).encode() if body else None)
+            response = self.conn.getresponse()
+            data = json.loads(response.read().decode())
+            statuses.append(response.getheader('X-Cache'))
+
+        self.conn.request("GET", "/select?id=2", headers={'X-Cache-Bypass': '1'})
+        response = self.conn.getresponse()
+        response.read()
+        statuses.append(response.getheader('X-Cache'))
+
+        print(f"実際の挙動: X-Cache {statuses}")
+        print(f"取得データ: {data}")
+
+        self.assertEqual(statuses, ['MISS', 'HIT', None, 'MISS', None])
+        self.assertEqual(data['products'][0][4], 49)
+
+    def test_select_etag(self):
+        """select エンドポイントの条件付きGETのテスト"""
+        print("テスト: ETag による条件付きGET (GET /select)")
+        print("期待する挙動: 同じ ETag なら304が返り、更新後は新しい内容が返ること")
+
+        self.conn.request("GET", "/select?id=3")
+        response = self.conn.getresponse()
+        response.read()
+        etag = response.getheader('ETag')
+
+        self.conn.request("GET", "/select?id=3", headers={'If-None-Match': etag})
+        not_modified = self.conn.getresponse()
+        not_modified.read()
+
+        update_data = {"conditions": {"id": 3}, "stock": 29}
+        self.conn.request("PUT", "/update", json.dumps(update_data).encode())
+        self.conn.getresponse().read()
+
+        self.conn.request("GET", "/select?id=3", headers={'If-None-Match': etag})
+        modified = self.conn.getresponse()
+        data = json.loads(modified.read().decode())
+
+        print(f"実際の挙動: ETag {etag}, 2回目 {not_modified.status}, 更新後 {modified.status}")
+
+        self.assertIsNotNone(etag)
+        self.assertEqual(not_modified.status, 304)
+        self.assertEqual(modified.status, 200)
+        self.assertNotEqual(modified.getheader('ETag'), etag)
+        self.assertEqual(data['products'][0][4], 29)
+
+    def test_small_body_etag(self):
+        """圧縮しない小さい応答の ETag のテスト"""
+        print("テスト: 小さい応答 (GET /select?id=2) を Accept-Encoding: gzip の有無で取得し、"
+              "gzip 付きで条件付きGETを送る")
+        print("期待する挙動: 圧縮されず、どちらも同じ ETag になり、その ETag で304が返ること")
+
+        etags = []
+        encodings = []
+        for headers in ({}, {'Accept-Encoding': 'gzip'}):
+            self.conn.request("GET", "/select?id=2", headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            etags.append(response.getheader('ETag'))
+            encodings.append(response.getheader('Content-Encoding'))
+        self.conn.request("GET", "/select?id=2",
+                          headers={'Accept-Encoding': 'gzip', 'If-None-Match': etags[0]})
+        not_modified = self.conn.getresponse()
+        not_modified.read()
+
+        print(f"実際の挙動: ETag {etags}, Content-Encoding {encodings}, "
+              f"条件付きGET {not_modified.status} {not_modified.getheader('ETag')}")
+
+        self.assertEqual(encodings, [None, None])
+        self.assertEqual(etags[0], etags[1])
+        self.assertEqual(not_modified.status, 304)
+        self.assertEqual(not_modified.getheader('ETag'), etags[0])
+
+    def test_select_formats(self):
+        """Accept ヘッダーによる応答形式の選択のテスト"""
+        print("テスト: 同じ select_all を json・列形式・バイナリ形式で取得 (GET /select_all?limit=3)")
+        print("期待する挙動: 形式ごとの Content-Type と ETag で返り、デコードすると同じ行になること")
+
+        results = {}
+        for fmt, content_type in FORMATS.items():
+            self.conn.request("GET", "/select_all?limit=3", headers={'Accept': content_type})
+            response = self.conn.getresponse()
+            body = response.read()
+            results[fmt] = (response.getheader('Content-Type'), response.getheader('ETag'),
+                            decode_result(body, response.getheader('Content-Type')))
+
+        print(f"実際の挙動: {results}")
+
+        rows = results['json'][2]['products']
+        self.assertEqual(len(rows), 3)
+        for fmt, (content_type, _, data) in results.items():
+            self.assertEqual(content_type, FORMATS[fmt])
+            self.assertEqual(data['products'], rows)
+            self.assertEqual(data['next_cursor'], results['json'][2]['next_cursor'])
+        self.assertEqual(results['binary'][2]['columns'],
+                         ['id', 'name', 'price', 'description', 'stock'])
+        self.assertEqual(len({etag for _, etag, _ in results.values()}), 3)
+
     def test_insert(self):
         """insert エンドポイントのテスト"""
         print("テスト: 新規商品の追加 (POST /insert)")
@@ -118,6 +355,109 @@ class TestDBServer(unittest.TestCase):
         self.assertEqual(response.status, 200)
         self.assertIn('message', data)
 
+    def test_bulk(self):
+        """bulk エンドポイントのテスト"""
+        print("テスト: 複数商品の一括追加 (POST /bulk)")
+        print("期待する挙動: JSON配列と NDJSON の両方を受け付け、行ごとの結果が返却されること")
+
+        rows = [{"name": f"一括追加{i}", "price": 100, "description": "一括", "stock": 1}
+                for i in range(3)]
+        self.conn.request("POST", "/bulk?op=insert", json.dumps(rows).encode(),
+                          {'Content-Type': 'application/json'})
+        response = self.conn.getresponse()
+        data = json.loads(response.read().decode())
+        print(f"実際の挙動: ステータスコード {response.status}, レスポンス {data}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data['succeeded'], 3)
+
+        lines = [json.dumps({"name": "一括追加0", "stock": 7}), "invalid json", "[1]"]
+        self.conn.request("POST", "/bulk?op=update&key=name", "\n".join(lines).encode(),
+                          {'Content-Type': 'application/x-ndjson'})
+        response = self.conn.getresponse()
+        data = json.loads(response.read().decode())
+        print(f"NDJSON での更新: ステータスコード {response.status}, レスポンス {data}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual([r['ok'] for r in data['results']], [True, False, False])
+        self.assertEqual(data['failed'], 2)
+
+    def test_batch(self):
+        """batch エンドポイントのテスト"""
+        print("テスト: 複数操作の一括実行 (POST /batch)")
+        print("期待する挙動: 全操作が1回で実行され、expect_rows が一致しなければ全て取り消されること")
+
+        headers = {'Content-Type': 'application/json'}
+        operations = [
+            {"op": "insert", "data": {"name": "バッチ商品", "price": 10,
+                                      "description": "バッチ", "stock": 3}},
+            {"op": "update", "data": {"stock": 2},
+             "conditions": {"name": "バッチ商品", "stock": 3}, "expect_rows": 1},
+            {"op": "select", "conditions": {"name": "バッチ商品"}},
+        ]
+        self.conn.request("POST", "/batch", json.dumps({"operations": operations}).encode(),
+                          headers)
+        response = self.conn.getresponse()
+        data = json.loads(response.read().decode())
+        print(f"実際の挙動: ステータスコード {response.status}, レスポンス {data}")
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data['results'][1]['rowcount'], 1)
+        self.assertEqual(data['results'][2]['products'][0][4], 2)
+
+        # 在庫が3ではないため2つ目の操作が失敗し、1つ目の削除も取り消される
+        operations = [
+            {"op": "delete", "conditions": {"name": "バッチ商品"}},
+            {"op": "update", "data": {"stock": 2},
+             "conditions": {"name": "バッチ商品", "stock": 3}, "expect_rows": 1},
+        ]
+        self.conn.request("POST", "/batch", json.dumps({"operations": operations}).encode(),
+                          headers)
+        response = self.conn.getresponse()
+        data = json.loads(response.read().decode())
+        self.conn.request("GET", "/select?name=" + quote("バッチ商品"),
+                          headers={'Cache-Control': 'no-cache'})
+        remaining = json.loads(self.conn.getresponse().read().decode())
+        print(f"失敗時: ステータスコード {response.status}, レスポンス {data}, 残り {remaining}")
+
+        self.assertEqual(response.status, 409)
+        self.assertEqual(data['index'], 1)
+        self.assertEqual(len(remaining['products']), 1)
+
+    def test_reserve(self):
+        """reserve / release エンドポイントのテスト"""
+        print("テスト: 在庫の予約と取り消し (POST /reserve, /release)")
+        print("期待する挙動: 在庫の範囲で予約でき、不足すると409、取り消すと在庫が戻ること")
+
+        headers = {'Content-Type': 'application/json'}
+
+        def post(path, data):
+            self.conn.request("POST", path, json.dumps(data).encode(), headers)
+            response = self.conn.getresponse()
+            return response.status, json.loads(response.read().decode())
+
+        def stock():
+            self.conn.request("GET", "/select?id=4")
+            return json.loads(self.conn.getresponse().read().decode())['products'][0][4]
+
+        before = stock()
+        status, data = post("/reserve", {"product_id": 4, "quantity": before, "owner": "test"})
+        after_reserve = stock()
+        over_status, over_data = post("/reserve", {"product_id": 4, "quantity": 1, "owner": "test"})
+        release_status, _ = post("/release", {"reservation_id": data['reservation']['id'],
+                                              "owner": "test"})
+        after_release = stock()
+
+        print(f"実際の挙動: 予約 {status}, 在庫 {before} -> {after_reserve}, "
+              f"不足時 {over_status} {over_data}, 取り消し {release_status}, 在庫 {after_release}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(after_reserve, 0)
+        self.assertEqual(over_status, 409)
+        self.assertEqual(over_data['available'], 0)
+        self.assertEqual(release_status, 200)
+        self.assertEqual(after_release, before)
+
     def test_delete(self):
         """delete エンドポイントのテスト"""
         print("テスト: 商品の削除 (DELETE /delete)")
@@ -150,6 +490,24 @@ class TestDBServer(unittest.TestCase):
         self.assertEqual(response.status, 200)
         self.assertIn('message', data)
 
+    def test_metrics(self):
+        """metrics エンドポイントのテスト"""
+        print("テスト: 商品を取得してから計測値を取得 (GET /metrics)")
+        print("期待する挙動: Prometheus の形式で select の件数・SQL の時間・プールの統計が返ること")
+
+        self.conn.request("GET", "/select?id=1")
+        self.conn.getresponse().read()
+        self.conn.request("GET", "/metrics")
+        response = self.conn.getresponse()
+        text = response.read().decode()
+
+        print(f"実際の挙動: ステータスコード {response.status}, {len(text.splitlines())} 行")
+
+        self.assertEqual(response.status, 200)
+        self.assertIn('db_requests_total{route="select",method="GET",status="200"}', text)
+        self.assertIn('db_phase_duration_seconds_count{route="select",phase="sql"}', text)
+        self.assertIn('db_pool_size', text)
+
     # def test_error_handling(self):
     #     """エラーハンドリングのテスト"""
     #     print("テスト: エラー処理")
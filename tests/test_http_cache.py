@@ -0,0 +1,88 @@
+import unittest
+import gzip
+import sys
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.http_cache import (MIN_COMPRESS_SIZE, applied_encoding, compress, encoding_etag,
+                               etag_matches, make_etag, negotiate_encoding)
+
+class TestHTTPCache(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def test_negotiate_encoding(self):
+        """Accept-Encoding の解釈のテスト"""
+        print("テスト: Accept-Encoding の解釈")
+        print("期待する挙動: q値を考慮して gzip / deflate / 圧縮なしを選ぶこと")
+
+        cases = {
+            None: None,
+            'gzip, deflate, br': 'gzip',
+            'deflate': 'deflate',
+            'gzip;q=0, deflate;q=0.5': 'deflate',
+            'br': None,
+            '*': 'gzip',
+        }
+        results = {k: negotiate_encoding(k) for k in cases}
+
+        print(f"実際の挙動: {results}")
+
+        self.assertEqual(results, cases)
+
+    def test_etag_matches(self):
+        """If-None-Match の比較のテスト"""
+        print("テスト: If-None-Match の比較")
+        print("期待する挙動: 一覧・弱い ETag・* を解釈し、圧縮形式ごとに別の ETag になること")
+
+        etag = make_etag('products', 1)
+        gzip_etag = encoding_etag(etag, 'gzip')
+
+        print(f"実際の挙動: {etag}, {gzip_etag}")
+
+        self.assertTrue(etag_matches(f'"other", {etag}', etag))
+        self.assertTrue(etag_matches(f'W/{etag}', etag))
+        self.assertTrue(etag_matches('*', etag))
+        self.assertFalse(etag_matches(etag, gzip_etag))
+        self.assertFalse(etag_matches(None, etag))
+
+    def test_applied_encoding(self):
+        """本文の大きさによる圧縮の有無のテスト"""
+        print("テスト: MIN_COMPRESS_SIZE の前後の大きさで適用する圧縮形式を求める")
+        print("期待する挙動: 小さい本文は圧縮せず、ETag にも圧縮形式が付かないこと")
+
+        etag = make_etag('products', 1)
+        small = applied_encoding('gzip', MIN_COMPRESS_SIZE - 1)
+        large = applied_encoding('gzip', MIN_COMPRESS_SIZE)
+
+        print(f"実際の挙動: 小さい本文 {small}, 大きい本文 {large}")
+
+        self.assertIsNone(small)
+        self.assertEqual(large, 'gzip')
+        self.assertIsNone(applied_encoding(None, MIN_COMPRESS_SIZE))
+        self.assertEqual(encoding_etag(etag, small), etag)
+
+    def test_compress(self):
+        """圧縮のテスト"""
+        print("テスト: gzip 圧縮")
+        print("期待する挙動: 展開すると元の本文に戻り、同じ入力から同じ出力になること")
+
+        body = '商品'.encode('utf-8') * 1000
+        compressed = compress(body, 'gzip')
+
+        print(f"実際の挙動: {len(body)} bytes -> {len(compressed)} bytes")
+
+        self.assertEqual(gzip.decompress(compressed), body)
+        self.assertEqual(compressed, compress(body, 'gzip'))
+        self.assertLess(len(compressed), len(body))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
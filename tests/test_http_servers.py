@@ -0,0 +1,204 @@
+import unittest
+import json
+import http.client
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+import sys
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.http_servers import make_server
+from db.db_server import DBHandler
+from db.db_initialize import initialize_database
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """/slow は0.5秒かかり、それ以外は即座に応答するハンドラー"""
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(0.5)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+class BlockingHandler(BaseHTTPRequestHandler):
+    """サーバーの release が set されるまで応答しないハンドラー"""
+
+    def do_GET(self):
+        self.server.release.wait(10)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(handler_class, mode):
+    """ポートを自動で割り当ててサーバーを別スレッドで起動"""
+    httpd = make_server(('localhost', 0), handler_class, mode=mode, workers=4)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd, httpd.server_address[1]
+
+class TestHTTPServers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """テストクラスの前処理"""
+        initialize_database()
+
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)
+
+    def _request(self, port, path):
+        conn = http.client.HTTPConnection("localhost", port, timeout=5)
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    def _request_ignoring_errors(self, port, path):
+        try:
+            self._request(port, path)
+        except (OSError, http.client.HTTPException):
+            pass
+
+    def _check_not_blocked(self, mode):
+        httpd, port = start_server(SlowHandler, mode)
+        try:
+            slow = threading.Thread(target=self._request, args=(port, '/slow'))
+            slow.start()
+            time.sleep(0.1)
+            start = time.perf_counter()
+            status, body = self._request(port, '/fast')
+            elapsed = time.perf_counter() - start
+            slow.join()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+        return status, elapsed
+
+    def test_threaded_mode(self):
+        """threaded モードのテスト"""
+        print("テスト: threaded モードでの並行処理")
+        print("期待する挙動: 遅いリクエストの処理中でも他のリクエストがすぐに返ること")
+
+        status, elapsed = self._check_not_blocked('threaded')
+
+        print(f"実際の挙動: ステータスコード {status}, 応答時間 {elapsed:.3f}秒")
+
+        self.assertEqual(status, 200)
+        self.assertLess(elapsed, 0.3)
+
+    def test_async_mode(self):
+        """async モードのテスト"""
+        print("テスト: async モードでの並行処理")
+        print("期待する挙動: 遅いリクエストの処理中でも他のリクエストがすぐに返ること")
+
+        status, elapsed = self._check_not_blocked('async')
+
+        print(f"実際の挙動: ステータスコード {status}, 応答時間 {elapsed:.3f}秒")
+
+        self.assertEqual(status, 200)
+        self.assertLess(elapsed, 0.3)
+
+    def test_idle_keep_alive_released(self):
+        """threaded モードでのアイドルな持続的接続のテスト"""
+        print("テスト: ワーカー2つの threaded モードで2つの持続的接続を開いたまま、別のクライアントから送る")
+        print("期待する挙動: アイドルな接続が keep_alive_timeout で閉じられ、"
+              "送受信のタイムアウト (15秒) を待たずに応答されること")
+
+        httpd = make_server(('localhost', 0), DBHandler, mode='threaded', workers=2)
+        httpd.keep_alive_timeout = 0.3
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        idle = [http.client.HTTPConnection("localhost", port, timeout=5) for _ in range(2)]
+        try:
+            for conn in idle:
+                conn.request("GET", "/select?id=1")
+                conn.getresponse().read()
+            start = time.perf_counter()
+            status, _ = self._request(port, '/select?id=2')
+            elapsed = time.perf_counter() - start
+        finally:
+            for conn in idle:
+                conn.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+        print(f"実際の挙動: ステータスコード {status}, 応答時間 {elapsed:.3f}秒")
+
+        self.assertEqual(status, 200)
+        self.assertLess(elapsed, 2.0)
+
+    def test_shutdown_while_queue_full(self):
+        """処理待ちが上限に達しているときの停止のテスト"""
+        print("テスト: workers=1, queue_size=1 の threaded モードで処理中の接続を3つ作り、shutdown() を呼ぶ")
+        print("期待する挙動: accept のスレッドが空きを待ち続けず、処理の完了を待たずに shutdown() が返ること")
+
+        httpd = make_server(('localhost', 0), BlockingHandler, mode='threaded',
+                            workers=1, queue_size=1)
+        httpd.release = threading.Event()
+        httpd.slot_poll_interval = 0.05
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        clients = [threading.Thread(target=self._request_ignoring_errors, args=(port, '/'),
+                                    daemon=True) for _ in range(3)]
+        try:
+            for client in clients:
+                client.start()
+            time.sleep(0.3)
+            stopper = threading.Thread(target=httpd.shutdown, daemon=True)
+            start = time.perf_counter()
+            stopper.start()
+            stopper.join(3)
+            elapsed = time.perf_counter() - start
+            stopped = not stopper.is_alive()
+        finally:
+            httpd.release.set()
+            for client in clients:
+                client.join(5)
+            httpd.server_close()
+
+        print(f"実際の挙動: 停止 {stopped}, {elapsed:.3f}秒")
+
+        self.assertTrue(stopped)
+        self.assertLess(elapsed, 1.0)
+
+    def test_async_mode_db_handler(self):
+        """async モードでの DBHandler のテスト"""
+        print("テスト: async モードでの DBHandler")
+        print("期待する挙動: 既存のエンドポイントが同じ形式で応答すること")
+
+        httpd, port = start_server(DBHandler, 'async')
+        try:
+            status, body = self._request(port, '/select?id=1')
+            data = json.loads(body.decode())
+            not_found_status, _ = self._request(port, '/non_existent')
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        print(f"実際の挙動: ステータスコード {status}, 取得データ {data}")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data['products'][0][0], 1)
+        self.assertEqual(not_found_status, 404)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
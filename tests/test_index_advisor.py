@@ -0,0 +1,97 @@
+import unittest
+import sys
+import sqlite3
+from pathlib import Path
+import tempfile
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.connection_pool import ConnectionPool
+from db.db_access import DatabaseAccess
+from db.index_advisor import IndexAdvisor, suggest_index
+
+class TestIndexAdvisor(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self.tmpdir.name) / "advisor_test.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            description TEXT,
+            stock INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        conn.executemany("INSERT INTO products (name, price, description, stock) "
+                         "VALUES (?, ?, ?, ?)",
+                         [(f"商品{i}", i * 10, "説明", i % 7) for i in range(100)])
+        conn.commit()
+        conn.close()
+        self.pool = ConnectionPool(db_path, max_size=2)
+        self.advisor = IndexAdvisor()
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.pool.close()
+        self.tmpdir.cleanup()
+        print("="*50)  # 区切り線
+
+    def test_full_scan_report(self):
+        """全件走査の検出と索引の提案のテスト"""
+        print("テスト: 商品名での検索の実行計画を記録")
+        print("期待する挙動: 全件走査が回数付きで報告され、索引を作ると解消されること")
+
+        with DatabaseAccess(self.pool, index_advisor=self.advisor) as db:
+            for i in range(3):
+                db.select('products', {'name': f'商品{i}'})
+            db.select('products', {'id': 1})
+        report = self.advisor.report()
+        recommendations = self.advisor.recommendations()
+
+        print(f"実際の挙動: {report}")
+        print(f"推奨する索引: {recommendations}")
+
+        self.assertEqual(report[0]['count'], 3)
+        self.assertTrue(report[0]['full_scan'])
+        self.assertFalse(report[1]['full_scan'])
+        self.assertEqual(recommendations,
+                         ["CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)"])
+
+        with DatabaseAccess(self.pool) as db:
+            db.conn.execute(recommendations[0])
+        self.advisor.reset()
+        with DatabaseAccess(self.pool, index_advisor=self.advisor) as db:
+            db.select('products', {'name': '商品1'})
+        print(f"索引の作成後: {self.advisor.report()}")
+
+        self.assertFalse(self.advisor.report()[0]['full_scan'])
+        self.assertEqual(self.advisor.recommendations(), [])
+
+    def test_suggest_index(self):
+        """索引の列の組み立てのテスト"""
+        print("テスト: 条件と並べ替えからの索引の組み立て")
+        print("期待する挙動: 等価条件の列が先、範囲条件または並べ替えの列が後ろになること")
+
+        range_sql = "SELECT * FROM products WHERE price < ? AND stock = ? ORDER BY name LIMIT ?"
+        order_sql = "SELECT id, name FROM products WHERE stock = ? ORDER BY price DESC"
+        results = [suggest_index(range_sql), suggest_index(order_sql),
+                   suggest_index("SELECT * FROM products WHERE id = ?")]
+
+        print(f"実際の挙動: {results}")
+
+        self.assertEqual(results[0],
+                         "CREATE INDEX IF NOT EXISTS idx_products_stock_price "
+                         "ON products (stock, price)")
+        self.assertEqual(results[1],
+                         "CREATE INDEX IF NOT EXISTS idx_products_stock_price "
+                         "ON products (stock, price)")
+        self.assertIsNone(results[2])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
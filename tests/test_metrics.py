@@ -0,0 +1,158 @@
+import unittest
+import http.client
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+import sys
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.access_log import AccessLog
+from common.http_servers import make_server
+from common.metrics import Histogram, MetricsMixin, MetricsRegistry
+
+class MetricsHandler(MetricsMixin, BaseHTTPRequestHandler):
+    """/ok は200、/fail は500、/items/<id> は200、/metrics は計測値を返すハンドラー"""
+    protocol_version = 'HTTP/1.1'
+
+    def _metrics_route(self, path):
+        return '/items/{id}' if path.startswith('/items/') else path
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_metrics()
+            return
+        with self._phase('work'):
+            status = 500 if self.path == '/fail' else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def test_histogram(self):
+        """ヒストグラムの区切りごとの件数のテスト"""
+        print("テスト: 0.002, 0.02, 20 秒を記録")
+        print("期待する挙動: 累積件数が区切りごとに増え、+Inf が全件数になること")
+
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for value in (0.002, 0.02, 20):
+            histogram.observe(value)
+        cumulative = histogram.cumulative()
+
+        print(f"実際の挙動: {cumulative}, 合計 {histogram.sum}")
+
+        self.assertEqual(cumulative, [('0.001', 0), ('0.01', 1), ('0.1', 2), ('+Inf', 3)])
+        self.assertEqual(histogram.count, 3)
+
+    def test_registry_render(self):
+        """Prometheus 形式の出力のテスト"""
+        print("テスト: 2件のリクエストと統計を記録して出力")
+        print("期待する挙動: 件数・エラー数・ヒストグラム・統計のゲージが出力されること")
+
+        registry = MetricsRegistry('app')
+        registry.add_stats('pool', '接続プール', lambda: {'size': 3, 'hit_rate': 0.5, 'name': 'x'})
+        for status in (200, 503):
+            registry.start('/a')
+            registry.finish('/a', 'GET', status, 0.003, {'sql': 0.001})
+        text = registry.render()
+
+        print(f"実際の挙動:\n{text}")
+
+        self.assertIn('app_requests_total{route="/a",method="GET",status="200"} 1', text)
+        self.assertIn('app_requests_total{route="/a",method="GET",status="503"} 1', text)
+        self.assertIn('app_request_errors_total{route="/a"} 1', text)
+        self.assertIn('app_requests_in_flight{route="/a"} 0', text)
+        self.assertIn('app_request_duration_seconds_bucket{route="/a",le="0.005"} 2', text)
+        self.assertIn('app_request_duration_seconds_count{route="/a"} 2', text)
+        self.assertIn('app_phase_duration_seconds_count{route="/a",phase="sql"} 2', text)
+        self.assertIn('app_pool_size 3', text)
+        self.assertIn('app_pool_hit_rate 0.5', text)
+        self.assertNotIn('app_pool_name', text)
+
+    def test_access_log(self):
+        """アクセスログの間引きとバッファリングのテスト"""
+        print("テスト: 間引き率0で200と500を記録し、10行たまるまで書き込まない設定で flush")
+        print("期待する挙動: 500だけがバッファに入り、flush で書き込まれること")
+
+        stream = io.StringIO()
+        log = AccessLog(stream, sample_rate=0, buffer_lines=10, flush_interval=60)
+        log.log_request('127.0.0.1', 'GET / HTTP/1.1', 200, 0.001)
+        log.log_request('127.0.0.1', 'GET /fail HTTP/1.1', 500, 0.002)
+        before = stream.getvalue()
+        log.flush()
+        after = stream.getvalue()
+
+        print(f"実際の挙動: flush 前 {before!r}, flush 後 {after!r}, {log.stats()}")
+
+        self.assertEqual(before, '')
+        self.assertEqual(len(after.splitlines()), 1)
+        self.assertIn('"GET /fail HTTP/1.1" 500', after)
+        self.assertEqual(log.stats()['requests'], 2)
+
+    def test_access_log_idle_flush(self):
+        """リクエストが途絶えた後のアクセスログの書き込みのテスト"""
+        print("テスト: flush_interval=0.2 で500を1件だけ記録し、以降は何も記録せずに待つ")
+        print("期待する挙動: 次の記録や flush を待たずに0.2秒ほどで書き込まれること")
+
+        stream = io.StringIO()
+        log = AccessLog(stream, sample_rate=0, buffer_lines=10, flush_interval=0.2)
+        log.log_request('127.0.0.1', 'GET /fail HTTP/1.1', 500, 0.002)
+        before = stream.getvalue()
+        deadline = time.monotonic() + 2
+        while not stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        after = stream.getvalue()
+
+        print(f"実際の挙動: 直後 {before!r}, 待った後 {after!r}, {log.stats()}")
+
+        self.assertEqual(before, '')
+        self.assertIn('"GET /fail HTTP/1.1" 500', after)
+        self.assertEqual(log.stats()['buffered'], 0)
+
+    def test_handler(self):
+        """ハンドラーでの計測のテスト"""
+        print("テスト: /ok, /fail, /items/1, /items/2 を送ってから /metrics を取得")
+        print("期待する挙動: ルートごとに件数が数えられ、ID を含むパスはまとめられること")
+
+        httpd = make_server(('localhost', 0), MetricsHandler, mode='threaded', workers=2)
+        httpd.metrics = MetricsRegistry('test')
+        httpd.access_log = AccessLog(io.StringIO(), sample_rate=0)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            conn = http.client.HTTPConnection('localhost', httpd.server_address[1], timeout=5)
+            for path in ('/ok', '/fail', '/items/1', '/items/2'):
+                conn.request('GET', path)
+                conn.getresponse().read()
+            conn.request('GET', '/metrics')
+            response = conn.getresponse()
+            text = response.read().decode()
+            conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        print(f"実際の挙動: ステータス {response.status}, {response.getheader('Content-Type')}")
+
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader('Content-Type').startswith('text/plain'))
+        self.assertIn('test_requests_total{route="/items/{id}",method="GET",status="200"} 2', text)
+        self.assertIn('test_request_errors_total{route="/fail"} 1', text)
+        self.assertIn('test_phase_duration_seconds_count{route="/ok",phase="work"} 1', text)
+        self.assertEqual(httpd.access_log.stats()['logged'], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,205 @@
+import unittest
+import http.client
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+import sys
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.http_servers import wait_until_ready
+from common.prefork import WorkerTable
+
+# 子プロセスで起動する監視プロセス (引数: プロジェクトルート, プロセス数, モード, reuse_port)
+# /pid はワーカーのプロセスID、/slow は1秒後に応答、/metrics は計測値を返す
+SUPERVISOR_SCRIPT = '''
+import os, sys, time
+sys.path.append(sys.argv[1])
+from http.server import BaseHTTPRequestHandler
+from common.http_servers import make_server
+from common.metrics import MetricsMixin, MetricsRegistry
+from common.prefork import PreforkSupervisor
+
+class Handler(MetricsMixin, BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_metrics()
+            return
+        if self.path == '/slow':
+            time.sleep(1.0)
+        body = str(os.getpid()).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(worker):
+    httpd = make_server(None, Handler, mode=sys.argv[3], workers=4, sock=worker.socket)
+    httpd.metrics = MetricsRegistry('test')
+    worker.serve(httpd)
+
+supervisor = PreforkSupervisor(('localhost', 0), int(sys.argv[2]), serve,
+                               reuse_port=sys.argv[4] == '1', drain_timeout=5.0, name='test')
+print(supervisor.server_address[1], flush=True)
+supervisor.run()
+'''
+
+def start_supervisor(processes=2, mode='threaded', reuse_port=False):
+    """監視プロセスを起動し、(Popen, ポート番号) を返す"""
+    process = subprocess.Popen(
+        [sys.executable, '-c', SUPERVISOR_SCRIPT, str(project_root), str(processes), mode,
+         '1' if reuse_port else '0'],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    port = int(process.stdout.readline())
+    if not wait_until_ready('localhost', port, '/pid', timeout=10,
+                            is_alive=lambda: process.poll() is None):
+        process.kill()
+        raise RuntimeError("監視プロセスが起動しませんでした")
+    return process, port
+
+def request(port, path, timeout=10):
+    conn = http.client.HTTPConnection('localhost', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read().decode()
+    finally:
+        conn.close()
+
+def worker_metrics(port, name):
+    """/metrics の test_workers_{name}{worker="番号"} を {番号: 値} で返す"""
+    _, text = request(port, '/metrics')
+    pattern = rf'^test_workers_{name}{{worker="(\d+)"}} (\S+)$'
+    return {int(index): float(value) for index, value in re.findall(pattern, text, re.MULTILINE)}
+
+class TestPrefork(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+        self.process = None
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.process is not None:
+            self.process.stdout.close()
+        print("="*50)  # 区切り線
+
+    def _stop(self, timeout=15):
+        """監視プロセスに SIGTERM を送り、(終了コード, 出力) を返す"""
+        self.process.send_signal(signal.SIGTERM)
+        output, _ = self.process.communicate(timeout=timeout)
+        return self.process.returncode, output
+
+    def test_worker_table(self):
+        """共有メモリの統計のテスト"""
+        print("テスト: 2つのワーカーのうち1つだけ pid と件数を書き込む")
+        print("期待する挙動: 書き込んだワーカーだけが統計に含まれ、項目ごとに値が残ること")
+
+        table = WorkerTable(2)
+        table.set(1, pid=1234, started=time.time() - 3)
+        table.set(1, requests=10, errors=2, heartbeat=time.time())
+        stats = table.stats()
+
+        print(f"実際の挙動: {stats}")
+
+        self.assertEqual(list(stats), [1])
+        self.assertEqual(stats[1]['pid'], 1234)
+        self.assertEqual(stats[1]['requests'], 10)
+        self.assertEqual(stats[1]['errors'], 2)
+        self.assertGreaterEqual(stats[1]['uptime'], 3)
+
+    def test_restart_crashed_worker(self):
+        """異常終了したワーカーの再起動のテスト"""
+        print("テスト: 応答したワーカーを SIGKILL で止める")
+        print("期待する挙動: 同じ番号のワーカーが別の pid で起動し直され、"
+              "/metrics のワーカーごとの統計に再起動の回数が出ること")
+
+        self.process, port = start_supervisor(processes=2)
+        _, pid = request(port, '/pid')
+        pids = worker_metrics(port, 'pid')
+        index = next(index for index, value in pids.items() if int(value) == int(pid))
+        os.kill(int(pid), signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        restarts = {}
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            restarts = worker_metrics(port, 'restarts')
+            if restarts.get(index) == 1 and len(worker_metrics(port, 'pid')) == 2:
+                break
+        new_pids = worker_metrics(port, 'pid')
+        status, _ = request(port, '/pid')
+        code, output = self._stop()
+
+        print(f"実際の挙動: pid {pids} -> {new_pids}, 再起動 {restarts}, 終了コード {code}")
+        print(output)
+
+        self.assertEqual(len(pids), 2)
+        self.assertEqual(restarts.get(index), 1)
+        self.assertNotEqual(int(new_pids[index]), int(pid))
+        self.assertEqual(status, 200)
+        self.assertEqual(code, 0)
+        self.assertIn(f'ワーカー {index} (pid {pid}) が終了しました', output)
+
+    def _check_drain(self, mode, reuse_port=False):
+        self.process, port = start_supervisor(processes=2, mode=mode, reuse_port=reuse_port)
+        result = {}
+
+        def slow_request():
+            try:
+                result['response'] = request(port, '/slow')
+            except (OSError, http.client.HTTPException) as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=slow_request)
+        thread.start()
+        time.sleep(0.3)
+        started = time.monotonic()
+        code, output = self._stop()
+        elapsed = time.monotonic() - started
+        thread.join()
+        refused = False
+        try:
+            request(port, '/pid', timeout=2)
+        except OSError:
+            refused = True
+        return result, code, elapsed, refused, output
+
+    def test_graceful_drain(self):
+        """SIGTERM での停止のテスト"""
+        for mode, reuse_port in (('threaded', False), ('async', True)):
+            with self.subTest(mode=mode, reuse_port=reuse_port):
+                print(f"テスト: {mode} モード (reuse_port={reuse_port}) で1秒かかる"
+                      f"リクエストの処理中に SIGTERM を送る")
+                print("期待する挙動: 処理中のリクエストが正常に応答してから全プロセスが"
+                      "終了し、以降の接続は拒否されること")
+
+                result, code, elapsed, refused, output = self._check_drain(mode, reuse_port)
+
+                print(f"実際の挙動: {result}, 終了コード {code}, {elapsed:.2f} 秒で終了, "
+                      f"接続の拒否 {refused}")
+                print(output)
+
+                self.assertNotIn('error', result)
+                self.assertEqual(result['response'][0], 200)
+                self.assertEqual(code, 0)
+                self.assertLess(elapsed, 5)
+                self.assertTrue(refused)
+                self.process.stdout.close()
+                self.process = None
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
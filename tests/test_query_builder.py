@@ -0,0 +1,72 @@
+import unittest
+import sys
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.query_builder import QueryError, build_select_sql, parse_select_params
+
+class TestQueryBuilder(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def test_build_sql(self):
+        """SQL 文の組み立てのテスト"""
+        print("テスト: 射影・比較・IN・BETWEEN・並べ替え・件数の指定")
+        print("期待する挙動: プレースホルダーを使った SQL 文と値が組み立てられること")
+
+        query = parse_select_params('products', {
+            'fields': 'id,name', 'price__lt': '5000', 'id__in': '1,2,3',
+            'stock__between': '1,100', 'order': 'price,-id', 'limit': '10',
+        })
+        sql, params = query.to_sql()
+
+        print(f"実際の挙動: {sql} {params}")
+
+        self.assertEqual(sql, "SELECT id, name FROM products "
+                              "WHERE id IN (?, ?, ?) AND price < ? AND stock BETWEEN ? AND ? "
+                              "ORDER BY price, id DESC LIMIT ?")
+        self.assertEqual(params, ['1', '2', '3', '5000', '1', '100', 10])
+
+    def test_shape_cache(self):
+        """形ごとの SQL 文の再利用のテスト"""
+        print("テスト: 値だけが違う検索の SQL 文")
+        print("期待する挙動: パラメータの順序や値が違っても同じ SQL 文が使い回されること")
+
+        build_select_sql.cache_clear()
+        first, _ = parse_select_params('products', {'price__ge': '100', 'stock': '1'}).to_sql()
+        second, _ = parse_select_params('products', {'stock': '5', 'price__ge': '900'}).to_sql()
+        info = build_select_sql.cache_info()
+
+        print(f"実際の挙動: {first} / {second}, {info}")
+
+        self.assertIs(first, second)
+        self.assertEqual(info.hits, 1)
+
+    def test_invalid(self):
+        """不正な指定のテスト"""
+        print("テスト: 許可されていない列・演算子・値")
+        print("期待する挙動: QueryError になること")
+
+        invalid_params = [
+            {'password': 'x'},
+            {'fields': 'id,name;DROP TABLE products'},
+            {'order': 'price DESC'},
+            {'price__like': '1'},
+            {'price__between': '1'},
+            {'limit': '0'},
+        ]
+        for params in invalid_params:
+            with self.assertRaises(QueryError):
+                parse_select_params('products', params)
+        print("実際の挙動: 全て QueryError")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,140 @@
+import unittest
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.query_cache import QueryCache, SharedTableVersions
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def test_key_normalization(self):
+        """キーの正規化のテスト"""
+        print("テスト: 条件の順序が異なるキー")
+        print("期待する挙動: 同じ条件なら順序に関係なく同じキーになること")
+
+        key1 = QueryCache.make_key('products', 'select', {'name': 'a', 'price': 100})
+        key2 = QueryCache.make_key('products', 'select', {'price': '100', 'name': 'a'})
+
+        print(f"実際の挙動: {key1} / {key2}")
+
+        self.assertEqual(key1, key2)
+
+    def test_invalidate(self):
+        """書き込みによる無効化のテスト"""
+        print("テスト: テーブル単位の無効化")
+        print("期待する挙動: 書き込んだテーブルのエントリだけが破棄されること")
+
+        cache = QueryCache()
+        products_key = cache.make_key('products', 'select', {'id': 1})
+        users_key = cache.make_key('users', 'select', {'id': 1})
+        cache.put(products_key, b'products', cache.version('products'))
+        cache.put(users_key, b'users', cache.version('users'))
+        cache.invalidate('products')
+
+        print(f"実際の挙動: products={cache.get(products_key)}, users={cache.get(users_key)}")
+
+        self.assertIsNone(cache.get(products_key))
+        self.assertEqual(cache.get(users_key), b'users')
+
+    def test_stale_put(self):
+        """読み取り中の書き込みのテスト"""
+        print("テスト: 読み取り中に書き込みがあった結果の保存")
+        print("期待する挙動: 古いバージョンで読んだ結果は保存されないこと")
+
+        cache = QueryCache()
+        key = cache.make_key('products', 'select_all', {})
+        version = cache.version('products')
+        cache.invalidate('products')
+        stored = cache.put(key, b'old', version)
+
+        print(f"実際の挙動: 保存={stored}, 統計={cache.stats()}")
+
+        self.assertFalse(stored)
+        self.assertIsNone(cache.get(key))
+
+    def test_lru_and_size_limit(self):
+        """件数・サイズ上限のテスト"""
+        print("テスト: 件数とバイト数の上限")
+        print("期待する挙動: 上限を超えると最も使われていないエントリから追い出されること")
+
+        cache = QueryCache(max_entries=2, max_bytes=10)
+        keys = [cache.make_key('products', 'select', {'id': i}) for i in range(3)]
+        cache.put(keys[0], b'aaa', 0)
+        cache.put(keys[1], b'bbb', 0)
+        cache.get(keys[0])
+        cache.put(keys[2], b'ccc', 0)
+        evicted_by_count = cache.get(keys[1])
+        cache.put(keys[1], b'dddddddd', 0)
+        stats = cache.stats()
+
+        print(f"実際の挙動: 統計={stats}")
+
+        self.assertIsNone(evicted_by_count)
+        self.assertLessEqual(stats['bytes'], 10)
+        self.assertEqual(cache.get(keys[1]), b'dddddddd')
+
+    def test_ttl(self):
+        """有効期間のテスト"""
+        print("テスト: 有効期間切れ")
+        print("期待する挙動: ttl を過ぎたエントリは返されないこと")
+
+        cache = QueryCache(ttl=0.05)
+        key = cache.make_key('products', 'select', {'id': 1})
+        cache.put(key, b'x', 0)
+        time.sleep(0.1)
+        result = cache.get(key)
+
+        print(f"実際の挙動: {result}, 統計={cache.stats()}")
+
+        self.assertIsNone(result)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_shared_versions(self):
+        """プロセス間で共有するバージョンのテスト"""
+        print("テスト: fork した別のプロセスで products に書き込む")
+        print("期待する挙動: 元のプロセスのキャッシュの products のエントリが使われず、"
+              "token と他のテーブルのエントリは変わらないこと")
+
+        versions = SharedTableVersions(['products', 'users'])
+        cache = QueryCache(versions=versions)
+        products_key = cache.make_key('products', 'select', {'id': 1})
+        users_key = cache.make_key('users', 'select', {'id': 1})
+        cache.put(products_key, b'products', cache.version('products'))
+        cache.put(users_key, b'users', cache.version('users'))
+        tokens = multiprocessing.get_context('fork').Queue()
+
+        def write_products():
+            versions.bump('products')
+            tokens.put(versions.token)
+
+        process = multiprocessing.get_context('fork').Process(target=write_products)
+        process.start()
+        child_token = tokens.get(timeout=10)
+        process.join(timeout=10)
+        products = cache.get(products_key)
+        users = cache.get(users_key)
+
+        print(f"実際の挙動: products={products}, users={users}, "
+              f"バージョン={versions.get('products')}, 統計={cache.stats()}")
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(child_token, versions.token)
+        self.assertEqual(versions.get('products'), 1)
+        self.assertIsNone(products)
+        self.assertEqual(users, b'users')
+        self.assertEqual(cache.stats()['version_misses'], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
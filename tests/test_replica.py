@@ -0,0 +1,271 @@
+import unittest
+import http.client
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+import sys
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.http_servers import make_server
+from db.connection_pool import ConnectionPool
+from db.db_access import DB_PATH, shared_pool
+from db.db_initialize import initialize_database
+from db.db_server import DBHandler
+from db.query_builder import TABLE_COLUMNS
+from db.query_cache import QueryCache, TableVersions
+from db.replica import ReadReplica
+
+class TestReadReplica(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / 'test.db'
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT INTO items (id, value) VALUES (1, 'old')")
+        conn.commit()
+        conn.close()
+        self.primary = ConnectionPool(self.db_path, max_size=2)
+        self.versions = TableVersions()
+        self.replica = None
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        if self.replica is not None:
+            self.replica.stop()
+        self.primary.close()
+        self.tmpdir.cleanup()
+        print("="*50)  # 区切り線
+
+    def _start(self, **options):
+        self.replica = ReadReplica(self.db_path, self.primary, max_size=2,
+                                   versions=self.versions, tables=['items'], **options)
+        self.replica.start()
+        return self.replica
+
+    def _write(self, value):
+        """主DBに書き込み、このサーバーでの書き込みとしてバージョンを進める"""
+        conn = self.primary.acquire()
+        try:
+            conn.execute("UPDATE items SET value = ? WHERE id = 1", (value,))
+            conn.commit()
+        finally:
+            self.primary.release(conn)
+        self.versions.bump('items')
+
+    def _read(self):
+        conn = self.replica.acquire()
+        try:
+            return conn.execute("SELECT value FROM items WHERE id = 1").fetchone()[0]
+        finally:
+            self.replica.release(conn)
+
+    def test_read_your_writes(self):
+        """書き込み直後の読み取りのテスト"""
+        print("テスト: max_staleness=0 で書き込んだ直後に読み、その後コピーを作り直して読む")
+        print("期待する挙動: 直後は主DBから新しい値を読み、作り直した後はコピーから新しい値を読むこと")
+
+        replica = self._start(min_refresh_interval=60)
+        before = self._read()
+        self._write('new')
+        after_write = self._read()
+        stats_after_write = replica.stats()
+        replica.refresh()
+        after_refresh = self._read()
+        stats = replica.stats()
+
+        print(f"実際の挙動: {before} -> {after_write} -> {after_refresh}, 統計={stats}")
+
+        self.assertEqual((before, after_write, after_refresh), ('old', 'new', 'new'))
+        self.assertEqual(stats_after_write['primary_reads'], 1)
+        self.assertEqual(stats['replica_reads'], 2)
+        self.assertEqual(stats['staleness'], 0.0)
+
+    def test_bounded_staleness(self):
+        """反映前のコピーから読む時間の上限のテスト"""
+        print("テスト: max_staleness=0.3 で書き込み、直後と0.3秒後に読む (作り直しは行わない)")
+        print("期待する挙動: 直後はコピーの古い値、0.3秒を過ぎると主DBの新しい値を読むこと")
+
+        replica = self._start(min_refresh_interval=60, max_staleness=0.3)
+        self._write('new')
+        serves_stale = replica.serves_stale()
+        soon = self._read()
+        time.sleep(0.35)
+        later = self._read()
+
+        print(f"実際の挙動: 直後 {soon} (serves_stale={serves_stale}), 0.35秒後 {later}, "
+              f"統計={replica.stats()}")
+
+        self.assertTrue(serves_stale)
+        self.assertEqual(soon, 'old')
+        self.assertEqual(later, 'new')
+        self.assertFalse(replica.serves_stale())
+
+    def test_external_write(self):
+        """別の接続からの書き込みの検知のテスト"""
+        print("テスト: バージョンを進めずに別の接続から書き込む")
+        print("期待する挙動: PRAGMA data_version の変化で検知し、コピーが作り直されること")
+
+        replica = self._start(check_interval=0.02, min_refresh_interval=0)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE items SET value = 'external' WHERE id = 1")
+        conn.commit()
+        conn.close()
+        deadline = time.monotonic() + 5
+        value = self._read()
+        while value != 'external' and time.monotonic() < deadline:
+            time.sleep(0.02)
+            value = self._read()
+        stats = replica.stats()
+
+        print(f"実際の挙動: {value}, 統計={stats}")
+
+        self.assertEqual(value, 'external')
+        self.assertGreaterEqual(stats['refreshes'], 2)
+        self.assertEqual(stats['primary_reads'], 0)
+
+    def test_copies_are_read_only(self):
+        """コピーへの書き込みのテスト"""
+        print("テスト: レプリカから借りた接続で書き込む")
+        print("期待する挙動: query_only により失敗し、主DBの値は変わらないこと")
+
+        self._start(min_refresh_interval=60)
+        conn = self.replica.acquire()
+        try:
+            with self.assertRaises(sqlite3.OperationalError) as context:
+                conn.execute("UPDATE items SET value = 'x' WHERE id = 1")
+        finally:
+            self.replica.release(conn)
+        check = sqlite3.connect(self.db_path)
+        value = check.execute("SELECT value FROM items WHERE id = 1").fetchone()[0]
+        check.close()
+
+        print(f"実際の挙動: {context.exception}, 主DBの値 {value}")
+
+        self.assertEqual(value, 'old')
+
+    def test_size_bounded_across_refresh(self):
+        """貸し出し中の作り直しでのコピー数の上限のテスト"""
+        print("テスト: max_size=2 で2つ借りたまま作り直し、返却してから再度読む")
+        print("期待する挙動: 古い世代を含めたコピー数が max_size を超えず、"
+              "返却後の読み取りでは新しい世代のコピーが作られること")
+
+        replica = self._start(min_refresh_interval=60)
+        lent = [replica.acquire(), replica.acquire()]
+        self._write('new')
+        replica.refresh()
+        during = replica.stats()
+        for conn in lent:
+            replica.release(conn)
+        released = replica.stats()
+        value = self._read()
+        after = replica.stats()
+
+        print(f"実際の挙動: 作り直し直後 size={during['size']}, 返却後 size={released['size']}, "
+              f"読み取り {value} (size={after['size']})")
+
+        self.assertLessEqual(during['size'], 2)
+        self.assertEqual(during['in_use'], 2)
+        self.assertEqual(released['size'], 0)
+        self.assertEqual(value, 'new')
+        self.assertEqual(after['size'], 1)
+
+class TestDBServerReplica(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """テストクラスの前処理"""
+        initialize_database()
+
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def _start_server(self, max_staleness):
+        httpd = make_server(('localhost', 0), DBHandler, workers=4)
+        httpd.table_versions = TableVersions()
+        httpd.query_cache = QueryCache(versions=httpd.table_versions)
+        httpd.replica = ReadReplica(DB_PATH, shared_pool(), max_size=2,
+                                    versions=httpd.table_versions, tables=TABLE_COLUMNS,
+                                    min_refresh_interval=60, max_staleness=max_staleness)
+        httpd.replica.start()
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd, httpd.server_address[1]
+
+    def _stop_server(self, httpd):
+        httpd.shutdown()
+        httpd.server_close()
+        httpd.replica.stop()
+
+    def _request(self, port, method, path, body=None):
+        conn = http.client.HTTPConnection('localhost', port, timeout=10)
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None)
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), json.loads(response.read())
+        finally:
+            conn.close()
+
+    def _price(self, port):
+        _, headers, data = self._request(port, 'GET', '/select?id=1')
+        return data['products'][0][2], headers
+
+    def test_update_then_select(self):
+        """DBサーバーでの書き込み後の読み取りのテスト"""
+        print("テスト: レプリカを使うDBサーバーで /update の直後に /select を送る")
+        print("期待する挙動: 更新後の値が返り、/stats にレプリカの統計が含まれること")
+
+        httpd, port = self._start_server(max_staleness=0)
+        try:
+            before, _ = self._price(port)
+            self._request(port, 'PUT', '/update', {'price': before + 1, 'conditions': {'id': 1}})
+            after, _ = self._price(port)
+            httpd.replica.refresh()
+            _, _, stats = self._request(port, 'GET', '/stats')
+        finally:
+            self._stop_server(httpd)
+
+        print(f"実際の挙動: {before} -> {after}, レプリカ {stats.get('replica')}")
+
+        self.assertEqual(after, before + 1)
+        self.assertGreater(stats['replica']['replica_reads'], 0)
+        self.assertEqual(stats['replica']['primary_reads'], 1)
+
+    def test_stale_reads_not_cached(self):
+        """反映前のコピーから読んだ結果のキャッシュのテスト"""
+        print("テスト: max_staleness=60 で /update の後に /select を送り、コピーを作り直して再度送る")
+        print("期待する挙動: 更新直後は古い値が ETag なしで返り、キャッシュされずに"
+              "作り直した後は新しい値が返ること")
+
+        httpd, port = self._start_server(max_staleness=60)
+        try:
+            before, _ = self._price(port)
+            self._request(port, 'PUT', '/update', {'price': before + 1, 'conditions': {'id': 1}})
+            stale, stale_headers = self._price(port)
+            httpd.replica.refresh()
+            fresh, fresh_headers = self._price(port)
+        finally:
+            self._stop_server(httpd)
+
+        print(f"実際の挙動: {before} -> {stale} ({stale_headers.get('ETag')}) -> "
+              f"{fresh} ({fresh_headers.get('X-Cache')}, {fresh_headers.get('ETag')})")
+
+        self.assertEqual(stale, before)
+        self.assertNotIn('ETag', stale_headers)
+        self.assertEqual(fresh, before + 1)
+        self.assertEqual(fresh_headers.get('X-Cache'), 'MISS')
+        self.assertIn('ETag', fresh_headers)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import tempfile
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.connection_pool import ConnectionPool
+from db.reservation import OutOfStockError, ReservationStore
+from db.sqlite_profile import get_profile
+
+class TestReservationStore(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self.tmpdir.name) / "reservation_test.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, stock INTEGER)")
+        conn.execute("INSERT INTO products (id, name, stock) VALUES (1, 'セール商品', 50)")
+        conn.commit()
+        conn.close()
+        self.pool = ConnectionPool(db_path, max_size=8, pragmas=get_profile('performance'))
+        self.expired_counts = []
+        self.store = ReservationStore(self.pool, ttl=60.0,
+                                      on_expire=self.expired_counts.append)
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.store.stop()
+        self.pool.close()
+        self.tmpdir.cleanup()
+        print("="*50)  # 区切り線
+
+    def stock(self):
+        conn = self.pool.acquire()
+        try:
+            return conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0]
+        finally:
+            self.pool.release(conn)
+
+    def test_no_oversell(self):
+        """同時予約での売り越し防止のテスト"""
+        print("テスト: 多数のスレッドからの同時予約")
+        print("期待する挙動: 在庫の数だけ予約が成功し、在庫がマイナスにならないこと")
+
+        results = {'ok': 0, 'rejected': 0}
+        lock = threading.Lock()
+
+        def worker(index):
+            for i in range(10):
+                try:
+                    self.store.reserve(1, 1, f"user-{index}")
+                    outcome = 'ok'
+                except OutOfStockError:
+                    outcome = 'rejected'
+                with lock:
+                    results[outcome] += 1
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print(f"実際の挙動: {results}, 在庫 {self.stock()}, 統計 {self.store.stats()}")
+
+        self.assertEqual(results['ok'], 50)
+        self.assertEqual(results['rejected'], 30)
+        self.assertEqual(self.stock(), 0)
+
+    def test_release_and_confirm(self):
+        """予約の取り消しと確定のテスト"""
+        print("テスト: 予約の取り消しと確定")
+        print("期待する挙動: 取り消すと在庫が戻り、確定すると在庫は減ったままになること")
+
+        first = self.store.reserve(1, 5, "alice")
+        second = self.store.reserve(1, 3, "alice")
+        listed = self.store.list_reservations("alice")
+        released = self.store.release(first['id'], owner="alice")
+        released_again = self.store.release(first['id'])
+        other_owner = self.store.confirm(second['id'], owner="bob")
+        confirmed = self.store.confirm(second['id'], owner="alice")
+
+        print(f"実際の挙動: 一覧 {len(listed)} 件, 取り消し {released}/{released_again}, "
+              f"確定 {other_owner}/{confirmed}, 在庫 {self.stock()}")
+
+        self.assertEqual(len(listed), 2)
+        self.assertTrue(released)
+        self.assertFalse(released_again)
+        self.assertFalse(other_owner)
+        self.assertTrue(confirmed)
+        self.assertEqual(self.stock(), 47)
+        self.assertEqual(self.store.list_reservations("alice"), [])
+
+    def test_expire(self):
+        """期限切れの予約の処理のテスト"""
+        print("テスト: 期限切れの予約を在庫に戻す")
+        print("期待する挙動: 期限切れの予約だけが在庫に戻り、確定できなくなること")
+
+        expiring = self.store.reserve(1, 10, "alice", ttl=0.01)
+        self.store.reserve(1, 5, "bob")
+        time.sleep(0.05)
+        confirmed = self.store.confirm(expiring['id'])
+        expired = self.store.expire()
+
+        print(f"実際の挙動: 確定 {confirmed}, 期限切れ {expired} 件, 在庫 {self.stock()}")
+
+        self.assertFalse(confirmed)
+        self.assertEqual(expired, 1)
+        self.assertEqual(self.expired_counts, [1])
+        self.assertEqual(self.stock(), 45)
+
+    def test_sweeper(self):
+        """期限切れ処理のスレッドのテスト"""
+        print("テスト: バックグラウンドでの期限切れ処理")
+        print("期待する挙動: 一定間隔で期限切れの予約が在庫に戻ること")
+
+        self.store.sweep_interval = 0.05
+        self.store.reserve(1, 20, "alice", ttl=0.01)
+        self.store.start()
+        deadline = time.time() + 2
+        while self.stock() != 50 and time.time() < deadline:
+            time.sleep(0.02)
+
+        print(f"実際の挙動: 在庫 {self.stock()}, 統計 {self.store.stats()}")
+
+        self.assertEqual(self.stock(), 50)
+        self.assertEqual(self.store.stats()['expired'], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,98 @@
+import unittest
+from pathlib import Path
+import sys
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from common.row_formats import (FORMATS, decode_binary, decode_result, encode_binary,
+                                encode_result, negotiate_format, to_columnar)
+
+COLUMNS = ('id', 'name', 'price', 'description', 'stock')
+
+class TestRowFormats(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def test_negotiate_format(self):
+        """Accept ヘッダーからの形式の選択のテスト"""
+        print("テスト: 指定なし・*/*・バイナリ・q 値付きの Accept ヘッダー")
+        print("期待する挙動: 指定がなければ json、q 値の大きい形式が選ばれること")
+
+        results = [negotiate_format(accept) for accept in (
+            None, '*/*', 'application/x-catalog-rows',
+            'application/x-catalog-rows;q=0.5, application/x-columnar+json')]
+
+        print(f"実際の挙動: {results}")
+
+        self.assertEqual(results, ['json', 'json', 'binary', 'columnar'])
+
+    def test_columnar_layout(self):
+        """列形式の JSON の構造のテスト"""
+        print("テスト: 2行の応答を列形式にする")
+        print("期待する挙動: 列名が1回だけ含まれ、値が列ごとの配列になること")
+
+        data = {'products': [[1, 'a', 100, 'x', 3], [2, 'b', 200, None, 0]], 'next_cursor': 'c'}
+        columnar = to_columnar(data, COLUMNS)
+
+        print(f"実際の挙動: {columnar}")
+
+        self.assertEqual(columnar['columns'], list(COLUMNS))
+        self.assertEqual([list(values) for values in columnar['products']],
+                         [[1, 2], ['a', 'b'], [100, 200], ['x', None], [3, 0]])
+        self.assertEqual(columnar['next_cursor'], 'c')
+
+    def test_round_trip(self):
+        """全ての形式での往復のテスト"""
+        print("テスト: NULL・日本語・絵文字・NUL を含む文字列・64ビット整数・大きな整数・"
+              "浮動小数点数・真偽値を含む応答を各形式でエンコードしてデコード")
+        print("期待する挙動: どの形式でも元の行と付加情報に戻ること")
+
+        data = {
+            'products': [
+                [1, 'ノートパソコン', 98000, None, 2 ** 40],
+                [2, None, -1, '説明\x00NUL付き', 2 ** 70],
+                [3, '😀', 0, '', True],
+            ],
+            'next_cursor': 'abc',
+        }
+        for fmt, content_type in FORMATS.items():
+            with self.subTest(fmt=fmt):
+                decoded = decode_result(encode_result(data, COLUMNS, fmt), content_type)
+                print(f"実際の挙動 ({fmt}): {decoded}")
+                self.assertEqual(decoded['products'], data['products'])
+                self.assertEqual(decoded['next_cursor'], 'abc')
+                if fmt != 'json':
+                    self.assertEqual(decoded['columns'], list(COLUMNS))
+
+        floats = {'products': [[0.1], [-0.0], [1e300], [None]]}
+        self.assertEqual(decode_binary(encode_binary(floats, ['value']))['products'],
+                         floats['products'])
+
+    def test_binary_empty_and_invalid(self):
+        """バイナリ形式の空の応答と不正な本文のテスト"""
+        print("テスト: 0行の応答をエンコードしてデコードし、途中で切れた本文もデコード")
+        print("期待する挙動: 0行は列名付きで戻り、途中で切れた本文は ValueError になること")
+
+        body = encode_binary({'products': [], 'next_cursor': None}, COLUMNS)
+        decoded = decode_binary(body)
+        full = encode_binary({'products': [[1, 'a', 2, 'b', 3]]}, COLUMNS)
+
+        print(f"実際の挙動: {decoded}, {len(body)} バイト")
+
+        self.assertEqual(decoded, {'columns': list(COLUMNS), 'products': [], 'next_cursor': None})
+        with self.assertRaises(ValueError):
+            decode_binary(full[:-3])
+        with self.assertRaises(ValueError):
+            decode_binary(b'JSON' + full[4:])
+        with self.assertRaises(ValueError):
+            encode_binary({'products': [[1, 2]]}, COLUMNS)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,145 @@
+import unittest
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from web.session_store import MemorySessionStore, SessionStore, SQLiteSessionStore, parse_cookies
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.tmpdir.cleanup()
+        print("="*50)  # 区切り線
+
+    def test_incomplete_store(self):
+        """実装が足りないセッションストアのテスト"""
+        print("テスト: get だけを実装していないセッションストアを作る")
+        print("期待する挙動: 最初のリクエストを待たずに、作った時点で TypeError になること")
+
+        class IncompleteStore(SessionStore):
+            def create(self, username, session_id=None):
+                return 'x'
+
+            def delete(self, session_id):
+                return False
+
+            def expire(self, now=None):
+                return 0
+
+            def __len__(self):
+                return 0
+
+        with self.assertRaises(TypeError) as context:
+            IncompleteStore()
+
+        print(f"実際の挙動: {context.exception}")
+
+        self.assertIn('get', str(context.exception))
+
+    def test_parse_cookies(self):
+        """Cookie ヘッダーの解析のテスト"""
+        print("テスト: 空白・引用符・値のない項目・重複を含む Cookie を解析")
+        print("期待する挙動: 名前=値 の組だけが取り出され、重複は先の値になること")
+
+        cookies = parse_cookies(' theme=dark; session="abc=1" ;flag; session=second; =x')
+
+        print(f"実際の挙動: {cookies}")
+
+        self.assertEqual(cookies, {'theme': 'dark', 'session': 'abc=1'})
+        self.assertEqual(parse_cookies(None), {})
+
+    def _check_store(self, store):
+        session_id = store.create('admin')
+        found = store.get(session_id)
+        missing = store.get('unknown')
+        deleted = store.delete(session_id)
+        after_delete = store.get(session_id)
+        return found, missing, deleted, after_delete
+
+    def test_memory_store(self):
+        """メモリ上のストアの作成・参照・削除・期限切れのテスト"""
+        print("テスト: セッションの作成・参照・削除と、有効期間0.2秒での期限切れ")
+        print("期待する挙動: 削除・期限切れの後は参照できず、期限切れは一括でも消せること")
+
+        store = MemorySessionStore(ttl=0.2, shards=4)
+        results = self._check_store(store)
+        lazy = store.create('admin')
+        swept = [store.create(f'user{i}') for i in range(5)]
+        time.sleep(0.25)
+        expired_get = store.get(lazy)
+        removed = store.expire()
+
+        print(f"実際の挙動: {results}, 期限切れの参照 {expired_get}, 一括削除 {removed}件, "
+              f"{store.stats()}")
+
+        self.assertEqual(results, ('admin', None, True, None))
+        self.assertIsNone(expired_get)
+        self.assertEqual(removed, len(swept))
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.stats()['expired'], 6)
+
+    def test_memory_store_sliding_and_lru(self):
+        """参照による有効期限の延長と上限での破棄のテスト"""
+        print("テスト: 参照し続けたセッションと、上限4件 (1分割) に5件目を追加")
+        print("期待する挙動: 参照したセッションは残り、最も長く使われていないものが破棄されること")
+
+        store = MemorySessionStore(ttl=0.3, shards=1)
+        kept = store.create('admin')
+        for _ in range(3):
+            time.sleep(0.15)
+            self.assertEqual(store.get(kept), 'admin')
+
+        lru = MemorySessionStore(max_sessions=4, shards=1)
+        ids = [lru.create(f'user{i}') for i in range(4)]
+        lru.get(ids[0])
+        lru.create('user4')
+        alive = [lru.get(session_id) is not None for session_id in ids]
+
+        print(f"実際の挙動: 0.45秒後も有効 {store.get(kept) is not None}, 残ったセッション {alive}")
+
+        self.assertEqual(alive, [True, False, True, True])
+        self.assertEqual(lru.stats()['evicted'], 1)
+
+    def test_sqlite_store(self):
+        """SQLite のストアのテスト"""
+        print("テスト: SQLite のストアで作成・参照・削除し、別のインスタンスから参照")
+        print("期待する挙動: 同じファイルを使う別のストア (別プロセス相当) からも参照できること")
+
+        db_path = Path(self.tmpdir.name) / "sessions.db"
+        store = SQLiteSessionStore(db_path, ttl=0.2, pool_size=2)
+        other = SQLiteSessionStore(db_path, ttl=0.2, pool_size=2)
+        try:
+            results = self._check_store(store)
+            shared = store.create('admin')
+            seen_by_other = other.get(shared)
+            time.sleep(0.25)
+            expired_get = other.get(shared)
+            store.create('admin')
+            time.sleep(0.25)
+            removed = store.expire()
+            count = len(store)
+        finally:
+            store.close()
+            other.close()
+
+        print(f"実際の挙動: {results}, 別インスタンスから {seen_by_other}, "
+              f"期限切れの参照 {expired_get}, 一括削除 {removed}件")
+
+        self.assertEqual(results, ('admin', None, True, None))
+        self.assertEqual(seen_by_other, 'admin')
+        self.assertIsNone(expired_get)
+        self.assertEqual(removed, 1)
+        self.assertEqual(count, 0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
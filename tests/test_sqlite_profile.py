@@ -0,0 +1,91 @@
+import unittest
+import sys
+from pathlib import Path
+import tempfile
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from db.connection_pool import ConnectionPool
+from db.sqlite_profile import WalCheckpointer, get_profile
+
+class TestSQLiteProfile(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmpdir.name) / "profile_test.db"
+        self.pool = ConnectionPool(self.db_path, max_size=2,
+                                   pragmas=get_profile('performance'))
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.pool.close()
+        self.tmpdir.cleanup()
+        print("="*50)  # 区切り線
+
+    def test_profile_applied(self):
+        """プロファイル適用のテスト"""
+        print("テスト: performance プロファイルの適用")
+        print("期待する挙動: 接続が WAL モード・synchronous=NORMAL になること")
+
+        conn = self.pool.acquire()
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        self.pool.release(conn)
+
+        print(f"実際の挙動: journal_mode={journal_mode}, synchronous={synchronous}, busy_timeout={busy_timeout}")
+
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(synchronous, 1)  # NORMAL
+        self.assertEqual(busy_timeout, 5000)
+
+    def test_read_during_write(self):
+        """書き込み中の読み取りのテスト"""
+        print("テスト: 書き込みトランザクション中の読み取り")
+        print("期待する挙動: 未確定の書き込みがあっても確定済みのデータを読めること")
+
+        writer = self.pool.acquire()
+        writer.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, stock INTEGER)")
+        writer.execute("INSERT INTO products (stock) VALUES (10)")
+        writer.commit()
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("UPDATE products SET stock = 5")
+
+        reader = self.pool.acquire()
+        stock = reader.execute("SELECT stock FROM products").fetchone()[0]
+        self.pool.release(reader)
+        writer.commit()
+        self.pool.release(writer)
+
+        print(f"実際の挙動: 読み取った在庫数={stock}")
+
+        self.assertEqual(stock, 10)
+
+    def test_checkpoint_truncate(self):
+        """チェックポイントのテスト"""
+        print("テスト: WAL のチェックポイント")
+        print("期待する挙動: 上限を超えた WAL が TRUNCATE で空になること")
+
+        conn = self.pool.acquire()
+        conn.execute("CREATE TABLE t (x TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?)", [("x" * 1000,) for _ in range(200)])
+        conn.commit()
+        self.pool.release(conn)
+
+        checkpointer = WalCheckpointer(self.db_path, max_wal_bytes=1)
+        before = checkpointer.wal_size()
+        result = checkpointer.checkpoint()
+        stats = checkpointer.stats()
+
+        print(f"実際の挙動: 実行前 {before} bytes, 結果 {result}, 統計 {stats}")
+
+        self.assertGreater(before, 0)
+        self.assertEqual(result[0], 0)
+        self.assertEqual(stats['truncates'], 1)
+        self.assertEqual(stats['wal_bytes'], 0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
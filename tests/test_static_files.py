@@ -0,0 +1,193 @@
+import unittest
+import gzip
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+from email.utils import formatdate
+from pathlib import Path
+import sys
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / 'web'))
+
+from common.http_servers import make_server
+from web.static_files import StaticFiles, parse_range
+from web.web_server import WebHandler
+
+SCRIPT = b'function hello() { return "hello"; }\n' * 100
+
+class TestStaticFiles(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+        self.tmp = Path(tempfile.mkdtemp())
+        root = self.tmp / 'root'
+        root.mkdir()
+        (root / 'app.js').write_bytes(SCRIPT)
+        (root / 'index.html').write_bytes(
+            b'<link href="app.js"><img src="logo.png"><a href="https://example.com/">')
+        self.static_files = StaticFiles(root, self.tmp / 'cache')
+        self.httpd = make_server(('localhost', 0), WebHandler, mode='threaded', workers=2)
+        self.httpd.static_files = self.static_files
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.conn = http.client.HTTPConnection('localhost', self.httpd.server_address[1],
+                                               timeout=5)
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        self.conn.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        print("="*50)  # 区切り線
+
+    def request(self, path, method='GET', headers=None):
+        self.conn.request(method, path, headers=headers or {})
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def test_parse_range(self):
+        """Range ヘッダーの解析のテスト"""
+        print("テスト: bytes=0-9, bytes=-5, bytes=5-, bytes=100-, items=0-1 を100バイトに対して解析")
+        print("期待する挙動: 範囲・末尾からの範囲・開始のみの範囲を返し、外は unsatisfiable、不明な単位は None")
+
+        results = [parse_range(header, 100) for header in
+                   ('bytes=0-9', 'bytes=-5', 'bytes=5-', 'bytes=100-', 'items=0-1')]
+
+        print(f"実際の挙動: {results}")
+
+        self.assertEqual(results, [(0, 9), (95, 99), (5, 99), 'unsatisfiable', None])
+
+    def test_hashed_url(self):
+        """ハッシュ付きの URL とキャッシュヘッダーのテスト"""
+        print("テスト: /static/app.js とハッシュ付きの URL を取得")
+        print("期待する挙動: 同じ内容が返り、ハッシュ付きの URL だけ immutable になること")
+
+        plain, plain_body = self.request('/static/app.js')
+        hashed_url = self.static_files.url('app.js')
+        hashed, hashed_body = self.request(hashed_url)
+
+        print(f"実際の挙動: {hashed_url}, {plain.getheader('Cache-Control')}, "
+              f"{hashed.getheader('Cache-Control')}")
+
+        self.assertEqual(plain.status, 200)
+        self.assertEqual(plain_body, SCRIPT)
+        self.assertEqual(hashed_body, SCRIPT)
+        self.assertEqual(plain.getheader('Cache-Control'), 'no-cache')
+        self.assertIn('immutable', hashed.getheader('Cache-Control'))
+        self.assertTrue(plain.getheader('Content-Type').startswith(('application/javascript',
+                                                                    'text/javascript')))
+        self.assertEqual(plain.getheader('ETag'), hashed.getheader('ETag'))
+
+    def test_html_rewrite(self):
+        """HTML の参照の書き換えのテスト"""
+        print("テスト: /static/ (index.html) を取得")
+        print("期待する挙動: 存在するファイルへの参照だけがハッシュ付きの名前に書き換わること")
+
+        response, body = self.request('/static/')
+
+        print(f"実際の挙動: {body!r}")
+
+        hashed_name = self.static_files.url('app.js')[len('/static/'):]
+        self.assertEqual(response.status, 200)
+        self.assertIn(f'href="{hashed_name}"'.encode(), body)
+        self.assertIn(b'src="logo.png"', body)
+        self.assertIn(b'href="https://example.com/"', body)
+
+    def test_conditional(self):
+        """条件付きリクエストのテスト"""
+        print("テスト: If-None-Match と If-Modified-Since を付けて再取得")
+        print("期待する挙動: どちらも本文のない304が返り、ETag が異なれば200が返ること")
+
+        first, _ = self.request('/static/app.js')
+        etag = first.getheader('ETag')
+        by_etag, body = self.request('/static/app.js', headers={'If-None-Match': etag})
+        by_date, _ = self.request('/static/app.js', headers={
+            'If-Modified-Since': first.getheader('Last-Modified')})
+        changed, _ = self.request('/static/app.js', headers={'If-None-Match': '"other"'})
+
+        print(f"実際の挙動: {by_etag.status}, {by_date.status}, {changed.status}")
+
+        self.assertEqual(by_etag.status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(by_date.status, 304)
+        self.assertEqual(changed.status, 200)
+
+    def test_html_last_modified(self):
+        """参照先が更新された HTML の Last-Modified のテスト"""
+        print("テスト: index.html より新しい app.js を読み込み、HTML 自身の更新時刻を"
+              " If-Modified-Since に付けて /static/ を取得")
+        print("期待する挙動: 書き換えた内容が変わるため200が返り、Last-Modified は app.js の更新時刻になること")
+
+        root = self.tmp / 'root'
+        html_mtime = (root / 'index.html').stat().st_mtime
+        os.utime(root / 'index.html', (html_mtime - 3600, html_mtime - 3600))
+        (root / 'app.js').write_bytes(SCRIPT + b'// changed\n')
+        os.utime(root / 'app.js', (html_mtime, html_mtime))
+        self.static_files.load()
+        html_modified = formatdate(int(html_mtime - 3600), usegmt=True)
+        response, body = self.request('/static/', headers={'If-Modified-Since': html_modified})
+
+        print(f"実際の挙動: {response.status}, Last-Modified {response.getheader('Last-Modified')}")
+
+        self.assertEqual(response.status, 200)
+        self.assertIn(self.static_files.url('app.js')[len('/static/'):].encode(), body)
+        self.assertEqual(response.getheader('Last-Modified'),
+                         formatdate(int(html_mtime), usegmt=True))
+
+    def test_range(self):
+        """範囲指定のテスト"""
+        print("テスト: bytes=10-19 と範囲外の bytes=100000- を要求")
+        print("期待する挙動: 206で10バイトが返り、範囲外は416になること")
+
+        partial, body = self.request('/static/app.js', headers={'Range': 'bytes=10-19'})
+        outside, _ = self.request('/static/app.js', headers={'Range': 'bytes=100000-'})
+
+        print(f"実際の挙動: {partial.status} {partial.getheader('Content-Range')} {body!r}, "
+              f"{outside.status} {outside.getheader('Content-Range')}")
+
+        self.assertEqual(partial.status, 206)
+        self.assertEqual(body, SCRIPT[10:20])
+        self.assertEqual(partial.getheader('Content-Range'), f'bytes 10-19/{len(SCRIPT)}')
+        self.assertEqual(outside.status, 416)
+        self.assertEqual(outside.getheader('Content-Range'), f'bytes */{len(SCRIPT)}')
+
+    def test_gzip(self):
+        """事前に圧縮したファイルの配信のテスト"""
+        print("テスト: Accept-Encoding: gzip を付けて取得し、HEAD も送る")
+        print("期待する挙動: gzip 版が返り、HEAD では本文なしで同じヘッダーが返ること")
+
+        response, body = self.request('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+        head, head_body = self.request('/static/app.js', method='HEAD',
+                                       headers={'Accept-Encoding': 'gzip'})
+
+        print(f"実際の挙動: {response.getheader('Content-Encoding')}, {len(body)} バイト "
+              f"(元は {len(SCRIPT)} バイト), HEAD {head.status} {head.getheader('Content-Length')}")
+
+        self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+        self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body), SCRIPT)
+        self.assertLess(len(body), len(SCRIPT))
+        self.assertEqual(head.status, 200)
+        self.assertEqual(head_body, b'')
+        self.assertEqual(head.getheader('Content-Length'), str(len(body)))
+
+    def test_not_found(self):
+        """存在しないファイルのテスト"""
+        print("テスト: 存在しないファイルとディレクトリの外を指すパスを要求")
+        print("期待する挙動: どちらも404になること")
+
+        missing, _ = self.request('/static/missing.js')
+        outside, _ = self.request('/static/../web_server.py')
+
+        print(f"実際の挙動: {missing.status}, {outside.status}")
+
+        self.assertEqual(missing.status, 404)
+        self.assertEqual(outside.status, 404)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# プロジェクトルートへのパスを追加
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from web.template_engine import Template, TemplateLoader
+
+class TestTemplateEngine(unittest.TestCase):
+    def setUp(self):
+        """各テストメソッドの前処理"""
+        print("\n" + "="*50)  # 区切り線
+
+    def tearDown(self):
+        """各テストメソッドの後処理"""
+        print("="*50)  # 区切り線
+
+    def test_render_escape(self):
+        """埋め込みとエスケープのテスト"""
+        print("テスト: 値の埋め込み")
+        print("期待する挙動: {{name}} はエスケープされ、{{name|safe}} はそのまま埋め込まれること")
+
+        template = Template("<p>{{ name }}</p>{{rows|safe}}<style>p { color: red; }</style>")
+        result = template.render(name='<b>"商品"</b>', rows='<tr></tr>')
+
+        print(f"実際の挙動: {result}")
+
+        self.assertEqual(result, '<p>&lt;b&gt;&quot;商品&quot;&lt;/b&gt;</p><tr></tr>'
+                                 '<style>p { color: red; }</style>')
+
+    def test_render_stream(self):
+        """ストリーミング描画のテスト"""
+        print("テスト: ジェネレーターを値にしたストリーミング描画")
+        print("期待する挙動: 先頭部分が値の生成より前に返され、結果が render と一致すること")
+
+        template = Template("<head></head>{{rows|safe}}<p>{{name}}</p>")
+        started = []
+
+        def rows():
+            started.append(True)
+            yield '<tr>1</tr>'
+            yield '<tr>2</tr>'
+
+        stream = template.render_stream(rows=rows(), name='<a>')
+        head = next(stream)
+        head_before_rows = not started
+        result = head + ''.join(stream)
+
+        print(f"実際の挙動: 先頭 {head!r}, 全体 {result!r}")
+
+        self.assertEqual(head, '<head></head>')
+        self.assertTrue(head_before_rows)
+        self.assertEqual(result, template.render(rows='<tr>1</tr><tr>2</tr>', name='<a>'))
+
+    def test_missing_key(self):
+        """値が足りない場合のテスト"""
+        print("テスト: 値が指定されていない埋め込み位置")
+        print("期待する挙動: KeyError になること")
+
+        template = Template("{{name}}", name='test.html')
+        with self.assertRaises(KeyError):
+            template.render()
+        print("実際の挙動: KeyError")
+
+    def test_loader_cache_and_reload(self):
+        """テンプレートの読み込みのテスト"""
+        print("テスト: テンプレートの読み込みと再読み込み")
+        print("期待する挙動: 通常は読み込み済みのものを使い、auto_reload では更新を反映すること")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "page.html"
+            path.write_text("v1 {{x}}", encoding="utf-8")
+            cached_loader = TemplateLoader(tmpdir)
+            reload_loader = TemplateLoader(tmpdir, auto_reload=True)
+            first = cached_loader.get("page.html")
+            reload_loader.get("page.html")
+
+            path.write_text("v2 {{x}}", encoding="utf-8")
+            # 更新時刻の分解能が粗い環境でも変更を検知できるようにずらす
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+            cached = cached_loader.get("page.html").render(x=1)
+            reloaded = reload_loader.get("page.html").render(x=1)
+
+        print(f"実際の挙動: 通常 {cached}, auto_reload {reloaded}")
+
+        self.assertIs(first, cached_loader.get("page.html"))
+        self.assertEqual(cached, "v1 1")
+        self.assertEqual(reloaded, "v2 1")
+
+    def test_shipped_templates(self):
+        """同梱テンプレートのテスト"""
+        print("テスト: templates ディレクトリのテンプレート")
+        print("期待する挙動: 全てのテンプレートが描画できること")
+
+        loader = TemplateLoader()
+        products = loader.get("products.html").render(products='<tr></tr>', pagination='',
+                                                      query='"><検索>')
+        detail = loader.get("product_detail.html").render(
+            id=1, name='<商品>', price=100, description='説明', stock=3)
+        login = loader.get("login.html").render()
+
+        print(f"実際の挙動: {len(products)}, {len(detail)}, {len(login)} 文字")
+
+        self.assertIn('<tr></tr>', products)
+        self.assertIn('value="&quot;&gt;&lt;検索&gt;"', products)
+        self.assertIn('&lt;商品&gt;', detail)
+        self.assertIn('ログイン', login)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,251 @@
+import json
+import sqlite3
+import sys
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlencode
+from db_client import DBClient
+
+# プロジェクトルートへのパスを追加 (共通部品を読み込むため)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.http_cache import etag_matches, make_etag
+from db.connection_pool import ConnectionPool
+from db.db_access import DB_PATH, DatabaseAccess
+from db.pagination import decode_cursor, encode_cursor
+from db.query_builder import TABLE_COLUMNS
+from db.reservation import DEFAULT_TTL as RESERVATION_TTL, OutOfStockError, ReservationStore
+from db.sqlite_profile import DEFAULT_PROFILE, get_profile
+
+# 商品の行の列
+PRODUCT_COLUMNS = TABLE_COLUMNS['products']
+
+class DataBackend(ABC):
+    """Webサーバーが商品データを読み書きする先
+
+    サブクラスは以下を実装する (実装していないとインスタンスを作る時点で TypeError)。
+    行は PRODUCT_COLUMNS の順の値の並び (応答データの columns に列名があればその順)。
+    - products_page(cursor, limit, if_none_match): (ステータス, ETag, 応答データ)。
+      if_none_match が現在の ETag と一致すれば (304, ETag, {})
+    - search(text, limit, offset): {'columns', 'products', 'next_offset', 'truncated'}
+      (truncated は短い語だけの検索で商品の一部だけを調べた場合に True)
+    - product(product_id): {列名: 値} (なければ None)
+    - iter_products(): 全商品の行を id 順に1行ずつ返すイテレーター
+    - reserve(product_id, quantity, owner): (ステータス, 応答データ)
+      (DBサーバーの /reserve と同じく、在庫不足は409、商品がなければ404)
+    """
+
+    name = ''
+
+    @abstractmethod
+    def products_page(self, cursor: Optional[str] = None, limit: int = 50,
+                      if_none_match: Optional[str] = None) -> Tuple[int, Optional[str], dict]:
+        """商品一覧の1ページを取得"""
+
+    @abstractmethod
+    def search(self, text: str, limit: int, offset: int = 0) -> dict:
+        """商品を全文検索"""
+
+    @abstractmethod
+    def product(self, product_id: int) -> Optional[Dict[str, Any]]:
+        """商品を1件取得"""
+
+    @abstractmethod
+    def iter_products(self) -> Iterator[list]:
+        """全商品を id 順に返す"""
+
+    @abstractmethod
+    def reserve(self, product_id: int, quantity: int, owner: str) -> Tuple[int, dict]:
+        """在庫を引き当てる"""
+
+    def start(self) -> None:
+        """バックグラウンドの処理を開始 (必要な場合のみ)"""
+
+    def close(self) -> None:
+        """接続などを閉じる"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+class HTTPDataBackend(DataBackend):
+    """DBサーバーのAPIを HTTP で呼び出す (DBClient の持続的接続を使い回す)
+
+    行の一覧はバイナリ形式 (common.row_formats) で受け取る。
+    """
+
+    name = 'http'
+
+    def __init__(self, host: str = 'localhost', port: int = 8000, pool_size: int = 8,
+                 timeout: float = 10.0):
+        self.client = DBClient(host=host, port=port, pool_size=pool_size, timeout=timeout)
+
+    def products_page(self, cursor=None, limit=50, if_none_match=None):
+        query = {'limit': limit}
+        if cursor:
+            query['cursor'] = cursor
+        headers = {'If-None-Match': if_none_match} if if_none_match else {}
+        status, headers, data = self.client.get_rows(f"/select_all?{urlencode(query)}",
+                                                     headers=headers)
+        return status, headers.get('ETag') if status in (200, 304) else None, data
+
+    def search(self, text, limit, offset=0):
+        params = {'q': text, 'limit': limit}
+        if offset:
+            params['offset'] = offset
+        _, _, data = self.client.get_rows(f"/search?{urlencode(params)}")
+        return data
+
+    def product(self, product_id):
+        _, _, data = self.client.get_rows(f"/select?id={int(product_id)}")
+        if data.get('products'):
+            return dict(zip(data['columns'], data['products'][0]))
+        return None
+
+    def iter_products(self):
+        for line in self.client.iter_lines(
+                "/select_all?stream=1", headers={'Accept': 'application/x-ndjson'}):
+            yield json.loads(line)
+
+    def reserve(self, product_id, quantity, owner):
+        body = json.dumps({'product_id': product_id, 'quantity': quantity,
+                           'owner': owner}).encode()
+        status, _, data = self.client.request("POST", "/reserve", body=body)
+        return status, json.loads(data.decode())
+
+    def close(self):
+        self.client.close()
+
+    def stats(self):
+        return self.client.stats()
+
+class LocalDataBackend(DataBackend):
+    """同じプロセス内で DatabaseAccess を直接呼び出す (HTTP の往復とエンコードを省く)
+
+    Webサーバーとデータベースのファイルが同じマシンにある場合に使う。
+    商品一覧の ETag は PRAGMA data_version から作る。data_version は他の接続
+    (別プロセスのDBサーバーを含む) がコミットするたびに変わるため、書き込みを
+    行わない専用の接続で読めば、どこからの書き込みでもページを描画し直せる。
+    ここでの在庫の引き当ては別プロセスのDBサーバーの検索結果キャッシュを
+    無効にしないため、DBサーバーと併用する場合はその応答が最大でキャッシュの
+    有効期間 (既定30秒) だけ古くなる。
+    """
+
+    name = 'local'
+
+    def __init__(self, db_path=DB_PATH, pool_size: int = 8, profile: str = DEFAULT_PROFILE,
+                 reservation_ttl: float = RESERVATION_TTL, sweep_interval: float = 5.0,
+                 stream_batch_size: int = 500):
+        self.pool = ConnectionPool(db_path, max_size=pool_size, pragmas=get_profile(profile))
+        self.reservations = ReservationStore(self.pool, ttl=reservation_ttl,
+                                             sweep_interval=sweep_interval)
+        self.stream_batch_size = stream_batch_size
+        # 起動ごとに変わる値 (再起動後に以前の data_version と一致しないようにする)
+        self._token = uuid.uuid4().hex[:12]
+        self._version_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._version_lock = threading.Lock()
+
+    def _db(self) -> DatabaseAccess:
+        return DatabaseAccess(pool=self.pool)
+
+    def data_version(self) -> int:
+        """データベースの変更を表す値 (コミットがあるたびに変わる)"""
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def products_page(self, cursor=None, limit=50, if_none_match=None):
+        etag = make_etag(self._token, self.data_version(), cursor, limit)
+        if etag_matches(if_none_match, etag):
+            return 304, etag, {}
+        after_id = None
+        if cursor:
+            try:
+                after_id = decode_cursor(cursor)
+            except ValueError:
+                return 400, None, {'error': '不正なカーソルです'}
+        with self._db() as db:
+            rows, next_after_id = db.select_page('products', limit, after_id=after_id)
+            ok = db.last_error is None
+        next_cursor = encode_cursor(next_after_id) if next_after_id is not None else None
+        data = {'columns': list(PRODUCT_COLUMNS), 'products': rows, 'next_cursor': next_cursor}
+        if not ok:
+            return 500, None, data
+        return 200, etag, data
+
+    def search(self, text, limit, offset=0):
+        with self._db() as db:
+            rows, next_offset = db.search(text, limit, offset)
+            truncated = db.search_truncated
+        return {'columns': list(PRODUCT_COLUMNS), 'products': rows, 'next_offset': next_offset,
+                'truncated': truncated}
+
+    def product(self, product_id):
+        with self._db() as db:
+            rows = db.select('products', {'id': int(product_id)})
+        return dict(zip(PRODUCT_COLUMNS, rows[0])) if rows else None
+
+    def iter_products(self):
+        with self._db() as db:
+            for batch in db.iter_batches('products', batch_size=self.stream_batch_size):
+                yield from batch
+
+    def reserve(self, product_id, quantity, owner):
+        try:
+            reservation = self.reservations.reserve(product_id, quantity, owner)
+        except OutOfStockError as e:
+            status = 404 if e.available is None else 409
+            return status, {'error': str(e), 'available': e.available}
+        except sqlite3.Error as e:
+            print(f"予約エラー: {e}")
+            return 500, {'error': '在庫の予約に失敗しました'}
+        return 200, {'reservation': reservation}
+
+    def start(self):
+        # 期限切れの予約を在庫に戻す
+        self.reservations.start()
+
+    def close(self):
+        self.reservations.stop()
+        with self._version_lock:
+            self._version_conn.close()
+        self.pool.close()
+
+    def stats(self):
+        stats = self.pool.stats()
+        stats.update({f'reservations_{key}': value
+                      for key, value in self.reservations.stats().items()})
+        return stats
+
+# データの取得先の種類
+BACKENDS = {
+    'http': HTTPDataBackend,
+    'local': LocalDataBackend,
+}
+
+_backend: Optional[DataBackend] = None
+_backend_lock = threading.Lock()
+
+def get_data_backend() -> DataBackend:
+    """共有のデータの取得先を取得 (未設定なら localhost:8000 のDBサーバー)"""
+    global _backend
+    # 設定済みならロックを取らずに返す (ページの描画ごとに全体のロックを通らない)
+    backend = _backend
+    if backend is not None:
+        return backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = HTTPDataBackend()
+        return _backend
+
+def configure_data_backend(backend: str = 'http', **options) -> DataBackend:
+    """共有のデータの取得先を作り直す (options は各クラスのコンストラクタの引数)"""
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError(f"不明なデータの取得先です: {backend}")
+    with _backend_lock:
+        old, _backend = _backend, BACKENDS[backend](**options)
+    if old is not None:
+        old.close()
+    return _backend
@@ -0,0 +1,225 @@
+import http.client
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+# プロジェクトルートへのパスを追加 (共通部品を読み込むため)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.row_formats import FORMATS, decode_result
+
+# 接続が切れていた場合に再送してよいメソッド (同じリクエストを繰り返しても結果が変わらない)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+# 持続的接続がサーバー側で閉じられていた場合などに発生する例外
+RETRYABLE_ERRORS = (ConnectionError, http.client.RemoteDisconnected,
+                    http.client.BadStatusLine, TimeoutError)
+
+# 使い回しの接続への書き込みで発生した場合、サーバーが接続を閉じていて
+# リクエストを処理していないとみなせる例外
+STALE_SOCKET_ERRORS = (BrokenPipeError, ConnectionResetError)
+
+class DBClient:
+    """DBサーバーのAPIクライアント (スレッドセーフ)
+
+    HTTP/1.1 の持続的接続をプールして使い回すため、ページ表示のたびに
+    TCP接続を張り直さずに済む。
+
+    失敗したリクエストの再送は、冪等なメソッドなら応答の受信中の失敗も含めて行う。
+    POST などの冪等でないメソッドは、サーバーが処理した可能性がない場合
+    (接続できなかった場合と、使い回しの接続への書き込みが切断で失敗した場合) だけ
+    再送し、送信後のタイムアウトなどでは二重に処理されないよう再送しない。
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8000,
+                 pool_size: int = 8, timeout: float = 10.0, retries: int = 2,
+                 backoff: float = 0.05):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = queue.LifoQueue()
+        # 同時に開く接続数の上限
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'reused': 0, 'connects': 0, 'retries': 0, 'errors': 0,
+                       'dropped': 0}
+
+    def _checkout(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """接続を借りる (戻り値の2つ目は使い回しの接続かどうか)"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("DBサーバーへの接続待ちがタイムアウトしました")
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not self._is_dropped(conn):
+                return conn, True
+            # 待機中にサーバー側で閉じられた接続は、送信する前に捨てる
+            conn.close()
+            with self._lock:
+                self._stats['dropped'] += 1
+        with self._lock:
+            self._stats['connects'] += 1
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _is_dropped(self, conn: http.client.HTTPConnection) -> bool:
+        """待機中の接続が使えなくなっているか (EOF または応答待ちでないのに読めるデータがある)"""
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            sock.setblocking(False)
+            sock.recv(1, socket.MSG_PEEK)
+            return True
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        finally:
+            sock.settimeout(self.timeout)
+
+    def _checkin(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        """接続を返す (再利用できない接続は閉じる)"""
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def _open(self, method: str, path: str, body: Optional[bytes],
+              headers: dict) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse, bool]:
+        """リクエストを送り、応答のヘッダーまで受け取る
+
+        戻り値は (接続, 応答, 使い回しの接続かどうか)。本文は呼び出し側で読み、
+        読み終えたら _checkin で接続を返す。
+        """
+        attempt = 0
+        while True:
+            conn, reused = self._checkout()
+            # 失敗した時点: connect (何も送っていない) / send / response
+            phase = 'connect'
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                phase = 'send'
+                conn.request(method, path, body=body, headers=headers)
+                phase = 'response'
+                return conn, conn.getresponse(), reused
+            except RETRYABLE_ERRORS as e:
+                self._checkin(conn, False)
+                # 使い回しの接続が閉じられていただけならすぐに再送する
+                stale = reused and phase == 'send' and isinstance(e, STALE_SOCKET_ERRORS)
+                not_processed = phase == 'connect' or stale
+                can_retry = method in IDEMPOTENT_METHODS or not_processed
+                if not can_retry or attempt >= self.retries:
+                    with self._lock:
+                        self._stats['errors'] += 1
+                    raise
+                if not reused:
+                    time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+                with self._lock:
+                    self._stats['retries'] += 1
+            except Exception:
+                self._checkin(conn, False)
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise
+
+    def _record_request(self, reused: bool) -> None:
+        with self._lock:
+            self._stats['requests'] += 1
+            if reused:
+                self._stats['reused'] += 1
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[dict] = None) -> Tuple[int, dict, bytes]:
+        """リクエストを送り、(ステータス, ヘッダー, 本文) を返す"""
+        headers = dict(headers or {})
+        if body is not None:
+            headers.setdefault('Content-Type', 'application/json')
+        conn, response, reused = self._open(method, path, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            self._checkin(conn, False)
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        self._checkin(conn, not response.will_close)
+        self._record_request(reused)
+        return response.status, dict(response.getheaders()), data
+
+    def iter_lines(self, path: str, headers: Optional[dict] = None) -> Iterator[bytes]:
+        """GETリクエストの応答本文を1行ずつ返す (NDJSON のストリーミング用)
+
+        本文を全て受け取る前に行を返すため、応答全体をメモリに溜めない。
+        最後まで読んだ接続はプールに戻し、途中でやめた場合は閉じる。
+        200 以外の応答は RuntimeError。
+        """
+        conn, response, reused = self._open("GET", path, None, dict(headers or {}))
+        completed = False
+        try:
+            if response.status != 200:
+                response.read()
+                completed = True
+                raise RuntimeError(f"DBサーバーがエラーを返しました: {response.status}")
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                yield line
+            completed = True
+        except RETRYABLE_ERRORS + (http.client.IncompleteRead,):
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            self._checkin(conn, completed and not response.will_close)
+        self._record_request(reused)
+
+    def get_json(self, path: str) -> dict:
+        """GETリクエストを送り、JSONの応答を返す"""
+        status, _, data = self.request("GET", path)
+        return json.loads(data.decode())
+
+    def get_rows(self, path: str, headers: Optional[dict] = None,
+                 fmt: str = 'binary') -> Tuple[int, dict, dict]:
+        """行の一覧を返すAPI (select_all / select / search) にGETリクエストを送る
+
+        fmt の形式 (common.row_formats) を Accept で求め、応答を行形式の辞書に戻す。
+        戻り値は (ステータス, ヘッダー, 応答データ)。304 などの本文のない応答では
+        応答データは空の辞書。エラーの応答 (JSON) もそのまま辞書にする。
+        """
+        headers = dict(headers or {})
+        headers['Accept'] = FORMATS[fmt]
+        status, response_headers, body = self.request("GET", path, headers=headers)
+        # ヘッダー名の大文字・小文字はサーバーによって異なる
+        content_type = next((value for name, value in response_headers.items()
+                             if name.lower() == 'content-type'), None)
+        data = decode_result(body, content_type) if body else {}
+        return status, response_headers, data
+
+    def stats(self) -> dict:
+        """接続の利用統計を取得"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+    def close(self) -> None:
+        """待機中の接続を全て閉じる"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
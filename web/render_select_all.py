@@ -1,47 +1,185 @@
-import http.client
-import json
 import html
+import sys
+import threading
+import uuid
+from collections import OrderedDict
 from pathlib import Path
+from urllib.parse import urlencode
+from data_backend import PRODUCT_COLUMNS, get_data_backend
+from template_engine import get_template
 
-def get_template(template_name):
-    """テンプレートファイルを読み込む"""
-    template_path = Path(__file__).parent / "templates" / template_name
-    with open(template_path, "r", encoding="utf-8") as f:
-        return f.read()
+# プロジェクトルートへのパスを追加 (共通部品を読み込むため)
+sys.path.append(str(Path(__file__).parent.parent))
 
-def get_products_from_api():
-    """DBサーバーから商品情報を取得"""
+from common.http_cache import make_etag
+
+# 商品一覧ページの1ページあたりの件数
+PAGE_SIZE = 50
+
+# 検索結果の1ページあたりの件数
+SEARCH_PAGE_SIZE = 20
+
+# 全件表示 (ストリーミング) で1回に送信する行数
+ROW_BATCH_SIZE = 100
+
+# 描画済みの商品一覧ページを保持する件数
+PAGE_CACHE_SIZE = 64
+
+# 起動ごとに変わる値 (テンプレートを変えて再起動した後に古い ETag が一致しないようにする)
+_BOOT_TOKEN = uuid.uuid4().hex[:12]
+
+# カーソル -> 描画済みページ ({'db_etag', 'template_version', 'etag', 'body', 'encoded'})
+_page_cache = OrderedDict()
+_page_cache_lock = threading.Lock()
+# hits: DBが 304 を返して描画済みページを使い回した回数、misses: 描画し直した回数
+_page_cache_stats = {'hits': 0, 'misses': 0}
+
+def create_product_rows(products, columns=PRODUCT_COLUMNS):
+    """商品一覧のHTML行を生成 (columns は各行の値の列名)"""
+    escape = html.escape
+    index = {name: i for i, name in enumerate(columns)}
+    id_, name, price, description, stock = (index[column] for column in PRODUCT_COLUMNS)
+    return "".join([
+        f'<tr><td>{escape(str(p[id_]))}</td>'
+        f'<td><a href="/product/{escape(str(p[id_]))}">{escape(str(p[name]))}</a></td>'
+        f'<td>{escape(str(p[price]))}</td><td>{escape(str(p[description]))}</td>'
+        f'<td>{escape(str(p[stock]))}</td></tr>\n'
+        for p in products
+    ])
+
+def create_pagination(cursor, next_cursor):
+    """ページ送りのリンクを生成"""
+    links = []
+    if cursor:
+        links.append('<a href="/products">最初のページ</a>')
+    if next_cursor:
+        href = html.escape(f"/products?{urlencode({'cursor': next_cursor})}")
+        links.append(f'<a href="{href}">次のページ</a>')
+    links.append('<a href="/products?stream=1">全件を表示</a>')
+    return " ".join(links)
+
+def stream_product_rows(batch_size=ROW_BATCH_SIZE):
+    """データの取得先から順に受け取った商品を batch_size 件ずつHTML行にして返す
+
+    全件を待たずに届いた分から変換するため、件数が増えても
+    メモリに載るのは1回分の行だけになる。
+    """
+    batch = []
+    try:
+        for row in get_data_backend().iter_products():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield create_product_rows(batch)
+                batch = []
+    except Exception as e:
+        # ヘッダーは送信済みのため、取得できた分までを表示する
+        print(f"APIエラー: {e}")
+    if batch:
+        yield create_product_rows(batch)
+
+def stream_products_page(batch_size=ROW_BATCH_SIZE):
+    """全商品の一覧ページを先頭から少しずつ生成する (bytes のジェネレーター)
+
+    テンプレートの先頭をすぐに返し、商品の行を batch_size 件ずつ返してから
+    末尾を返す。
+    """
+    template = get_template("products.html")
+    pagination = '<a href="/products">ページ単位で表示</a>'
+    for part in template.render_stream(products=stream_product_rows(batch_size),
+                                       pagination=pagination, query=''):
+        yield part.encode()
+
+def build_products_html(products, cursor, next_cursor, columns=PRODUCT_COLUMNS):
+    """商品一覧ページのHTMLを組み立てる"""
+    template = get_template("products.html")
+    product_rows = create_product_rows(products, columns)
+    pagination = create_pagination(cursor, next_cursor)
+    return template.render(products=product_rows, pagination=pagination, query='')
+
+def create_search_pagination(query, offset, next_offset, truncated=False):
+    """検索結果のページ送りのリンクを生成 (truncated なら一部の商品だけを検索した旨を添える)"""
+    links = ['<a href="/products">一覧に戻る</a>']
+    if offset:
+        previous = {'q': query}
+        if offset > SEARCH_PAGE_SIZE:
+            previous['offset'] = offset - SEARCH_PAGE_SIZE
+        links.append(f'<a href="{html.escape("/products?" + urlencode(previous))}">前のページ</a>')
+    if next_offset:
+        href = html.escape(f"/products?{urlencode({'q': query, 'offset': next_offset})}")
+        links.append(f'<a href="{href}">次のページ</a>')
+    if truncated:
+        links.append('<span>2文字以下の語だけの検索のため、一部の商品から探しています。'
+                     '3文字以上の語を加えると全ての商品から探せます。</span>')
+    return " ".join(links)
+
+def render_search_page(query, offset=0):
+    """商品の検索結果ページのHTMLを生成 (関連度順、offset で表示するページを指定)"""
     try:
-        conn = http.client.HTTPConnection("localhost", 8000)
-        conn.request("GET", "/select_all")
-        response = conn.getresponse()
-        data = json.loads(response.read().decode())
-        return data.get('products', [])
+        data = get_data_backend().search(query, SEARCH_PAGE_SIZE, offset)
+        products, next_offset = data.get('products', []), data.get('next_offset')
+        columns = data.get('columns', PRODUCT_COLUMNS)
+        truncated = data.get('truncated', False)
     except Exception as e:
         print(f"APIエラー: {e}")
-        return []
-    finally:
-        conn.close()
-
-def create_product_rows(products):
-    """商品一覧のHTML行を生成"""
-    rows = []
-    for product in products:
-        row = f"""
-        <tr>
-            <td>{html.escape(str(product[0]))}</td>
-            <td><a href="/product/{product[0]}">{html.escape(product[1])}</a></td>
-            <td>{html.escape(str(product[2]))}</td>
-            <td>{html.escape(product[3])}</td>
-            <td>{html.escape(str(product[4]))}</td>
-        </tr>
-        """
-        rows.append(row)
-    return "\n".join(rows)
-
-def render_products_page():
-    """商品一覧ページのHTMLを生成"""
-    products = get_products_from_api()
+        products, next_offset, columns, truncated = [], None, PRODUCT_COLUMNS, False
     template = get_template("products.html")
-    product_rows = create_product_rows(products)
-    return template.replace("{products}", product_rows)
+    rows = create_product_rows(products, columns) if products else \
+        '<tr><td colspan="5">該当する商品はありません</td></tr>'
+    return template.render(products=rows,
+                           pagination=create_search_pagination(query, offset, next_offset,
+                                                               truncated),
+                           query=query)
+
+def get_products_page(cursor=None):
+    """商品一覧ページを描画済みの形で取得
+
+    戻り値は {'etag', 'body', 'encoded'} の辞書 (encoded は圧縮済み本文の置き場)。
+    前回描画したページがあれば、そのときのDBの ETag で再検証し、
+    変更がなければ (304) 描画し直さずに使い回す。
+    """
+    template_version = get_template("products.html").version
+    with _page_cache_lock:
+        cached = _page_cache.get(cursor)
+        if cached is not None and cached['template_version'] != template_version:
+            # テンプレートが読み込み直された
+            cached = None
+        if cached is not None:
+            _page_cache.move_to_end(cursor)
+
+    try:
+        status, db_etag, data = get_data_backend().products_page(
+            cursor, PAGE_SIZE, if_none_match=cached['db_etag'] if cached else None)
+        if status == 304 and cached:
+            with _page_cache_lock:
+                _page_cache_stats['hits'] += 1
+            return cached
+        products, next_cursor = data.get('products', []), data.get('next_cursor')
+        columns = data.get('columns', PRODUCT_COLUMNS)
+        if status != 200:
+            db_etag = None
+    except Exception as e:
+        print(f"APIエラー: {e}")
+        products, next_cursor, columns, db_etag = [], None, PRODUCT_COLUMNS, None
+
+    page = {
+        'db_etag': db_etag,
+        'template_version': template_version,
+        'etag': make_etag('products', _BOOT_TOKEN, template_version, db_etag, cursor)
+                if db_etag else None,
+        'body': build_products_html(products, cursor, next_cursor, columns).encode(),
+        'encoded': {},
+    }
+    with _page_cache_lock:
+        _page_cache_stats['misses'] += 1
+        if db_etag:
+            _page_cache[cursor] = page
+            while len(_page_cache) > PAGE_CACHE_SIZE:
+                _page_cache.popitem(last=False)
+    return page
+
+def page_cache_stats():
+    """描画済みページのキャッシュの統計を取得"""
+    with _page_cache_lock:
+        stats = dict(_page_cache_stats)
+        stats['entries'] = len(_page_cache)
+    return stats
@@ -0,0 +1,358 @@
+import secrets
+import sqlite3
+from abc import ABC, abstractmethod
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# プロジェクトルートへのパスを追加 (共通部品を読み込むため)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from db.connection_pool import ConnectionPool
+from db.sqlite_profile import get_profile
+
+# セッションの既定の有効期間 (秒)。最後のアクセスから数える
+DEFAULT_TTL = 1800.0
+
+# メモリ上に保持するセッション数の上限 (超えると最も長く使われていないものから破棄)
+DEFAULT_MAX_SESSIONS = 1000000
+
+# メモリ上のストアの分割数 (分割ごとにロックを持ち、ロックの競合を減らす)
+DEFAULT_SHARDS = 16
+
+# SQLite のストアの既定のファイル
+DEFAULT_DB_PATH = Path(__file__).parent / "sessions.db"
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)",
+]
+
+def parse_cookies(header: Optional[str]) -> Dict[str, str]:
+    """Cookie ヘッダーを {名前: 値} に分解 (値の前後の引用符は外す)
+
+    http.cookies.SimpleCookie は属性の解釈などで遅く、不正な項目があると
+    全体を捨ててしまうため、名前=値 の組だけを取り出す。同じ名前は先に現れた方を使う。
+    """
+    cookies: Dict[str, str] = {}
+    if not header:
+        return cookies
+    for item in header.split(';'):
+        name, sep, value = item.partition('=')
+        name = name.strip()
+        if not sep or not name or name in cookies:
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        cookies[name] = value
+    return cookies
+
+def new_session_id() -> str:
+    """推測できないセッションIDを生成"""
+    return secrets.token_urlsafe(32)
+
+class SessionStore(ABC):
+    """セッションストアの共通部分 (期限切れのバックグラウンド処理と統計)
+
+    サブクラスは create / get / delete / expire / __len__ を実装する
+    (実装していないとインスタンスを作る時点で TypeError になる)。
+    有効期限は最後のアクセスから ttl 秒 (get のたびに延長する)。
+    期限切れのセッションは get で見つけた時点で消し (遅延削除)、
+    start() で動く処理が sweep_interval 秒ごとにまとめて消す。
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, sweep_interval: float = 60.0):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'created': 0, 'hits': 0, 'misses': 0, 'deleted': 0,
+                       'expired': 0, 'evicted': 0}
+
+    @abstractmethod
+    def create(self, username: str, session_id: Optional[str] = None) -> str:
+        """セッションを作成してIDを返す"""
+
+    @abstractmethod
+    def get(self, session_id: Optional[str]) -> Optional[str]:
+        """有効なセッションのユーザー名を返し、有効期限を延ばす (なければ None)"""
+
+    @abstractmethod
+    def delete(self, session_id: Optional[str]) -> bool:
+        """セッションを削除 (存在した場合は True)"""
+
+    @abstractmethod
+    def expire(self, now: Optional[float] = None) -> int:
+        """期限切れのセッションを削除し、削除した件数を返す"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """保持しているセッション数"""
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.expire()
+            except sqlite3.Error as e:
+                print(f"セッションの期限切れ処理エラー: {e}")
+
+    def start(self) -> None:
+        """バックグラウンドでの期限切れ処理を開始"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='session-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """期限切れ処理を停止"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """セッションの件数と処理件数を取得"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['active'] = len(self)
+        return stats
+
+class MemorySessionStore(SessionStore):
+    """プロセス内のメモリに保持するセッションストア
+
+    セッションIDのハッシュで shards 個に分け、分割ごとのロックで守る。
+    各分割は最後のアクセス順の OrderedDict で、有効期間は全セッションで同じため
+    先頭から期限切れになる。期限切れの処理は先頭から期限内のものが出るまで消すだけでよく、
+    分割ごとの上限 (max_sessions / shards) を超えたときは先頭 (最も長く使われていないもの) を
+    破棄する (分割ごとの件数には偏りがあるため、max_sessions はおおよその上限)。
+    処理件数も分割ごとに数え、全体で共有するロックを取らないようにする。
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 shards: int = DEFAULT_SHARDS, sweep_interval: float = 60.0):
+        super().__init__(ttl, sweep_interval)
+        if shards < 1:
+            raise ValueError("shards は1以上を指定してください")
+        self.max_sessions = max_sessions
+        self._max_per_shard = max(1, max_sessions // shards)
+        # (ロック, セッションID -> (ユーザー名, 有効期限), 処理件数)
+        self._shards: List[Tuple[threading.Lock, "OrderedDict[str, Tuple[str, float]]",
+                                 Dict[str, int]]] = \
+            [(threading.Lock(), OrderedDict(), dict.fromkeys(self._stats, 0))
+             for _ in range(shards)]
+
+    def _shard(self, session_id: str):
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def create(self, username: str, session_id: Optional[str] = None) -> str:
+        """セッションを作成してIDを返す"""
+        session_id = session_id or new_session_id()
+        lock, entries, counts = self._shard(session_id)
+        with lock:
+            entries[session_id] = (username, time.monotonic() + self.ttl)
+            entries.move_to_end(session_id)
+            counts['created'] += 1
+            while len(entries) > self._max_per_shard:
+                entries.popitem(last=False)
+                counts['evicted'] += 1
+        return session_id
+
+    def get(self, session_id: Optional[str]) -> Optional[str]:
+        """有効なセッションのユーザー名を返し、有効期限を延ばす (なければ None)"""
+        if not session_id:
+            return None
+        lock, entries, counts = self._shard(session_id)
+        now = time.monotonic()
+        with lock:
+            entry = entries.get(session_id)
+            if entry is None:
+                counts['misses'] += 1
+                return None
+            if entry[1] <= now:
+                del entries[session_id]
+                counts['expired'] += 1
+                counts['misses'] += 1
+                return None
+            entries[session_id] = (entry[0], now + self.ttl)
+            entries.move_to_end(session_id)
+            counts['hits'] += 1
+            return entry[0]
+
+    def delete(self, session_id: Optional[str]) -> bool:
+        """セッションを削除 (ログアウト)"""
+        if not session_id:
+            return False
+        lock, entries, counts = self._shard(session_id)
+        with lock:
+            found = entries.pop(session_id, None) is not None
+            if found:
+                counts['deleted'] += 1
+        return found
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """期限切れのセッションを削除し、件数を返す (now は time.monotonic() の値)"""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        for lock, entries, counts in self._shards:
+            with lock:
+                while entries:
+                    session_id, (_, expires_at) = next(iter(entries.items()))
+                    if expires_at > now:
+                        break
+                    del entries[session_id]
+                    counts['expired'] += 1
+                    removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(entries) for _, entries, _ in self._shards)
+
+    def stats(self) -> Dict[str, Any]:
+        """セッションの件数と処理件数を取得"""
+        stats = dict.fromkeys(self._stats, 0)
+        for lock, entries, counts in self._shards:
+            with lock:
+                for name, value in counts.items():
+                    stats[name] += value
+        stats['active'] = len(self)
+        return stats
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite に保持するセッションストア (複数のワーカープロセスで共有でき、再起動後も残る)
+
+    アクセスのたびに有効期限を書き換えると読み取りが書き込みになってしまうため、
+    期限の延長は前回の延長から touch_interval 秒以上経ったときだけ行う。
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, ttl: float = DEFAULT_TTL,
+                 touch_interval: float = 60.0, sweep_interval: float = 60.0,
+                 pool_size: int = 8):
+        super().__init__(ttl, sweep_interval)
+        self.touch_interval = min(touch_interval, ttl)
+        self.pool = ConnectionPool(db_path, max_size=pool_size,
+                                   pragmas=get_profile('performance'))
+        conn = self.pool.acquire()
+        try:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def _execute(self, sql: str, params: tuple = (), write: bool = False):
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute(sql, params)
+            if write:
+                conn.commit()
+                return cursor.rowcount
+            return cursor.fetchone()
+        finally:
+            self.pool.release(conn)
+
+    def create(self, username: str, session_id: Optional[str] = None) -> str:
+        """セッションを作成してIDを返す"""
+        session_id = session_id or new_session_id()
+        self._execute("INSERT OR REPLACE INTO sessions (id, username, expires_at) VALUES (?, ?, ?)",
+                      (session_id, username, time.time() + self.ttl), write=True)
+        self._count('created')
+        return session_id
+
+    def get(self, session_id: Optional[str]) -> Optional[str]:
+        """有効なセッションのユーザー名を返し、必要なら有効期限を延ばす (なければ None)"""
+        if not session_id:
+            return None
+        row = self._execute("SELECT username, expires_at FROM sessions WHERE id = ?",
+                            (session_id,))
+        now = time.time()
+        if row is None:
+            self._count('misses')
+            return None
+        username, expires_at = row
+        if expires_at <= now:
+            self._execute("DELETE FROM sessions WHERE id = ? AND expires_at <= ?",
+                          (session_id, now), write=True)
+            self._count('expired')
+            self._count('misses')
+            return None
+        if now + self.ttl - expires_at >= self.touch_interval:
+            self._execute("UPDATE sessions SET expires_at = ? WHERE id = ?",
+                          (now + self.ttl, session_id), write=True)
+        self._count('hits')
+        return username
+
+    def delete(self, session_id: Optional[str]) -> bool:
+        """セッションを削除 (ログアウト)"""
+        if not session_id:
+            return False
+        found = self._execute("DELETE FROM sessions WHERE id = ?", (session_id,), write=True) > 0
+        if found:
+            self._count('deleted')
+        return found
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """期限切れのセッションを削除し、件数を返す (now は time.time() の値)"""
+        now = time.time() if now is None else now
+        removed = self._execute("DELETE FROM sessions WHERE expires_at <= ?", (now,), write=True)
+        if removed:
+            self._count('expired', removed)
+        return removed
+
+    def __len__(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?",
+                             (time.time(),))[0]
+
+    def close(self) -> None:
+        super().close()
+        self.pool.close()
+
+# セッションストアの種類
+BACKENDS = {
+    'memory': MemorySessionStore,
+    'sqlite': SQLiteSessionStore,
+}
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """共有のセッションストアを取得 (未設定ならメモリ上のストアを作成)"""
+    global _store
+    # 設定済みならロックを取らずに返す (リクエストごとに全体のロックを通らない)
+    store = _store
+    if store is not None:
+        return store
+    with _store_lock:
+        if _store is None:
+            _store = MemorySessionStore()
+        return _store
+
+def configure_session_store(backend: str = 'memory', **options) -> SessionStore:
+    """共有のセッションストアを作り直す (options は各ストアのコンストラクタの引数)"""
+    global _store
+    if backend not in BACKENDS:
+        raise ValueError(f"不明なセッションストアです: {backend}")
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = BACKENDS[backend](**options)
+        return _store
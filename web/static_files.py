@@ -0,0 +1,304 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import sys
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# プロジェクトルートへのパスを追加 (共通部品を読み込むため)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.http_cache import MIN_COMPRESS_SIZE, encoding_etag, etag_matches, negotiate_encoding
+
+# 配信する静的ファイルの既定のディレクトリ
+STATIC_ROOT = Path(__file__).parent.parent / "SPA"
+
+# 起動時に作る配信用のコピーと gzip 版の置き場 (内容のハッシュをファイル名にする)
+CACHE_DIR = Path(__file__).parent / ".static_cache"
+
+# 静的ファイルの URL の接頭辞
+URL_PREFIX = '/static/'
+
+# ディレクトリの URL で返すファイル
+INDEX_FILE = 'index.html'
+
+# URL にハッシュを含む (内容が変わると URL も変わる) ファイルは1年間再検証させない
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# ハッシュを含まない URL は毎回 ETag / Last-Modified で再検証させる
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# URL に含めるハッシュの長さ
+HASH_LENGTH = 12
+
+# 事前に gzip 版を作る Content-Type
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# sendfile が使えない場合に1回で読み書きするバイト数
+COPY_CHUNK_SIZE = 64 * 1024
+
+# HTML から参照されている静的ファイルをハッシュ付きの URL に書き換える
+REFERENCE_PATTERN = re.compile(rb'(\b(?:href|src)=")([^"#?:]+)(")')
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+
+class StaticAsset:
+    """配信する1ファイル (起動時の内容を CACHE_DIR にコピーしたもの)"""
+
+    __slots__ = ('name', 'hashed_name', 'path', 'size', 'mtime', 'last_modified',
+                 'content_type', 'etag', 'gzip_path', 'gzip_size')
+
+    def __init__(self, name: str, data: bytes, mtime: float, cache_dir: Path):
+        digest = hashlib.sha256(data).hexdigest()
+        stem, suffix = posixpath.splitext(name)
+        self.name = name
+        self.hashed_name = f"{stem}.{digest[:HASH_LENGTH]}{suffix}"
+        self.size = len(data)
+        self.mtime = int(mtime)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.etag = f'"{digest[:32]}"'
+        # 配信中に元のファイルが書き換わっても Content-Length と食い違わないようコピーを配信する
+        self.path = cache_dir / (digest + suffix)
+        if not self.path.exists():
+            _write_atomic(self.path, data)
+        self.gzip_path = None
+        self.gzip_size = 0
+        if self.size >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            gzip_path = cache_dir / f"{digest}.gz"
+            if not gzip_path.exists():
+                _write_atomic(gzip_path, gzip.compress(data, compresslevel=9, mtime=0))
+            gzip_size = gzip_path.stat().st_size
+            if gzip_size < self.size:
+                self.gzip_path = gzip_path
+                self.gzip_size = gzip_size
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """別名で書いてから置き換える (複数のプロセスが同時に起動しても壊れたファイルを読まない)"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+class StaticFiles:
+    """静的ファイルの一覧 (起動時に読み込み、ハッシュと gzip 版を用意する)
+
+    /static/app.js のような URL は毎回再検証させ、/static/app.<ハッシュ>.js は
+    内容が変わらないため長期間キャッシュさせる。HTML の中の相対参照
+    (href="styles.css" など) はハッシュ付きの URL に書き換えてから配信する。
+    URL はファイル名の一覧と照合するだけで、ファイルシステムのパスには使わない。
+    """
+
+    def __init__(self, root=STATIC_ROOT, cache_dir=CACHE_DIR, prefix: str = URL_PREFIX):
+        self.root = Path(root)
+        self.cache_dir = Path(cache_dir)
+        self.prefix = prefix
+        self._assets: Dict[str, StaticAsset] = {}
+        self._hashed: Dict[str, StaticAsset] = {}
+        self.load()
+
+    def load(self) -> None:
+        """ディレクトリを読み込み直す"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for path in sorted(self.root.rglob('*')):
+            if path.is_file() and not path.name.startswith('.'):
+                files[path.relative_to(self.root).as_posix()] = path
+        assets = {}
+        # HTML は他のファイルのハッシュを使って書き換えるため後回しにする
+        for name, path in sorted(files.items(), key=lambda item: item[0].endswith('.html')):
+            data = path.read_bytes()
+            mtime = path.stat().st_mtime
+            if name.endswith('.html'):
+                # 参照先が更新されると書き換えた内容も変わるため、Last-Modified は参照先も含めた
+                # 最も新しい更新時刻にする (If-Modified-Since で古い URL の HTML を返さない)
+                data, referenced_mtime = self._rewrite_references(name, data, assets)
+                mtime = max(mtime, referenced_mtime)
+            assets[name] = StaticAsset(name, data, mtime, self.cache_dir)
+        self._assets = assets
+        self._hashed = {asset.hashed_name: asset for asset in assets.values()}
+
+    @staticmethod
+    def _rewrite_references(name: str, data: bytes,
+                            assets: Dict[str, StaticAsset]) -> Tuple[bytes, float]:
+        """参照をハッシュ付きの名前に書き換え、(書き換えた内容, 参照先の最も新しい更新時刻) を取得"""
+        base = posixpath.dirname(name)
+        mtimes = [0]
+
+        def replace(match):
+            reference = match.group(2).decode('ascii', 'replace')
+            target = assets.get(posixpath.normpath(posixpath.join(base, reference)))
+            if target is None:
+                return match.group(0)
+            mtimes.append(target.mtime)
+            hashed = posixpath.join(posixpath.dirname(reference),
+                                    posixpath.basename(target.hashed_name))
+            return match.group(1) + hashed.encode('ascii') + match.group(3)
+
+        return REFERENCE_PATTERN.sub(replace, data), max(mtimes)
+
+    def url(self, name: str) -> str:
+        """ファイル名からハッシュ付きの URL を取得"""
+        return self.prefix + self._assets[name].hashed_name
+
+    def resolve(self, url_path: str) -> Tuple[Optional[StaticAsset], bool]:
+        """URL のパスから (ファイル, ハッシュ付きの URL か) を取得 (なければ (None, False))"""
+        if not url_path.startswith(self.prefix):
+            return None, False
+        name = url_path[len(self.prefix):]
+        if name == '' or name.endswith('/'):
+            name += INDEX_FILE
+        asset = self._hashed.get(name)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(name), False
+
+    def clear_cache(self) -> None:
+        """配信用のコピーと gzip 版を削除"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            'files': len(self._assets),
+            'bytes': sum(asset.size for asset in self._assets.values()),
+            'gzip_files': sum(1 for asset in self._assets.values() if asset.gzip_path),
+        }
+
+def parse_range(header: Optional[str], size: int):
+    """Range ヘッダーを解析
+
+    戻り値は (開始, 終了) の組 (終了を含む)、範囲がファイルの外なら 'unsatisfiable'、
+    指定がないか解釈できない・複数の範囲の場合は None (全体を返す)。
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # 末尾から end バイト
+        length = int(end)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+class StaticFileMixin:
+    """BaseHTTPRequestHandler に静的ファイルの配信を追加するミックスイン
+
+    サーバーの static_files (StaticFiles) からファイルを探し、本文は sendfile で
+    ファイルから直接ソケットに送る (Python の文字列やバイト列を経由しない)。
+    sendfile が使えないソケット (async モード) ではファイルを少しずつ読んで書き込む。
+    """
+
+    def send_static(self, url_path: str) -> bool:
+        """静的ファイルを返す (該当するファイルがなければ何も送らずに False)"""
+        static_files = getattr(self.server, 'static_files', None)
+        asset, immutable = static_files.resolve(url_path) if static_files else (None, False)
+        if asset is None:
+            return False
+
+        byte_range = parse_range(self.headers.get('Range'), asset.size) \
+            if self.command == 'GET' else None
+        if byte_range is not None and not self._if_range_matches(asset):
+            byte_range = None
+        # 範囲の指定は元のファイルに対して行う (gzip 版の途中からは返さない)
+        use_gzip = byte_range is None and asset.gzip_path is not None and \
+            negotiate_encoding(self.headers.get('Accept-Encoding')) == 'gzip'
+        etag = encoding_etag(asset.etag, 'gzip') if use_gzip else asset.etag
+
+        headers = {
+            'ETag': etag,
+            'Last-Modified': asset.last_modified,
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            'Accept-Ranges': 'bytes',
+        }
+        if asset.gzip_path is not None:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if self._not_modified(asset, etag):
+            self._send_static_headers(304, headers)
+            return True
+
+        if byte_range == 'unsatisfiable':
+            headers['Content-Range'] = f'bytes */{asset.size}'
+            headers['Content-Length'] = '0'
+            self._send_static_headers(416, headers)
+            return True
+
+        path, offset, count, status = asset.path, 0, asset.size, 200
+        if use_gzip:
+            path, count = asset.gzip_path, asset.gzip_size
+            headers['Content-Encoding'] = 'gzip'
+        elif byte_range is not None:
+            start, end = byte_range
+            offset, count, status = start, end - start + 1, 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{asset.size}'
+        headers['Content-Type'] = asset.content_type
+        headers['Content-Length'] = str(count)
+
+        with open(path, 'rb') as f:
+            self._send_static_headers(status, headers)
+            if self.command != 'HEAD':
+                self._send_file(f, offset, count)
+        return True
+
+    def _send_static_headers(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if not getattr(self.server, 'keep_alive', False):
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def _send_file(self, f, offset: int, count: int) -> None:
+        """ファイルの offset から count バイトを送る"""
+        sock = self.connection
+        if hasattr(sock, 'sendfile'):
+            # socket.sendfile は os.sendfile を使い、送信のタイムアウトも扱う
+            sock.sendfile(f, offset, count)
+            return
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(COPY_CHUNK_SIZE, count))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            count -= len(chunk)
+
+    def _not_modified(self, asset: StaticAsset, etag: str) -> bool:
+        """条件付きリクエストに 304 を返せるか (If-None-Match があれば If-Modified-Since より優先)"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return etag_matches(if_none_match, etag)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if not if_modified_since:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        return asset.mtime <= since
+
+    def _if_range_matches(self, asset: StaticAsset) -> bool:
+        """If-Range があれば、範囲を返してよいか (一致しなければ全体を返す)"""
+        if_range = self.headers.get('If-Range')
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"'):
+            return if_range == asset.etag
+        return if_range == asset.last_modified
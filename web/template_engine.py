@@ -0,0 +1,115 @@
+import html
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+# {{name}} は HTML エスケープして埋め込み、{{name|safe}} はそのまま埋め込む
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*(\w+)\s*(\|\s*safe\s*)?\}\}')
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+class Template:
+    """事前に分解したテンプレート
+
+    テンプレートは読み込み時に「固定の文字列」と「埋め込み位置」の並びに
+    分解しておき、描画時は値を埋めて1回の join で文字列にする。
+    """
+
+    def __init__(self, source: str, name: str = '<string>', version: int = 0):
+        self.name = name
+        # 読み込んだファイルの更新時刻 (描画結果をキャッシュする側が使う)
+        self.version = version
+        self.segments: List[Union[str, Tuple[str, bool]]] = self._compile(source)
+
+    @staticmethod
+    def _compile(source: str) -> List[Union[str, Tuple[str, bool]]]:
+        segments: List[Union[str, Tuple[str, bool]]] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            if match.start() > position:
+                segments.append(source[position:match.start()])
+            # (キー, エスケープするか)
+            segments.append((match.group(1), match.group(2) is None))
+            position = match.end()
+        if position < len(source):
+            segments.append(source[position:])
+        return segments
+
+    def render(self, **context) -> str:
+        """値を埋め込んだ文字列を返す (足りないキーがあれば KeyError)"""
+        escape = html.escape
+        parts = []
+        for segment in self.segments:
+            if segment.__class__ is str:
+                parts.append(segment)
+                continue
+            key, needs_escape = segment
+            try:
+                value = context[key]
+            except KeyError:
+                raise KeyError(f"テンプレート {self.name} の {key} に値が指定されていません")
+            parts.append(escape(str(value)) if needs_escape else str(value))
+        return ''.join(parts)
+
+    def render_stream(self, **context) -> Iterator[str]:
+        """値を埋め込みながら先頭から順に文字列を返す
+
+        文字列以外のイテラブル (ジェネレーターなど) を値に渡すと、その要素を
+        順に埋め込む。値のジェネレーターはそれより前の部分を返し終えてから
+        動き出すため、テンプレートの先頭を先に送信できる。
+        """
+        escape = html.escape
+        for segment in self.segments:
+            if segment.__class__ is str:
+                yield segment
+                continue
+            key, needs_escape = segment
+            try:
+                value = context[key]
+            except KeyError:
+                raise KeyError(f"テンプレート {self.name} の {key} に値が指定されていません")
+            if isinstance(value, str) or not hasattr(value, '__iter__'):
+                value = (value,)
+            for part in value:
+                yield escape(str(part)) if needs_escape else str(part)
+
+class TemplateLoader:
+    """templates ディレクトリのテンプレートを1回だけ読み込んで保持する
+
+    auto_reload を有効にすると (開発用)、取得のたびにファイルの更新時刻を
+    確認し、変わっていれば読み込み直す。
+    """
+
+    def __init__(self, directory: Path = TEMPLATE_DIR, auto_reload: bool = False):
+        self.directory = Path(directory)
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Template] = {}
+
+    def get(self, name: str) -> Template:
+        """テンプレートを取得"""
+        template = self._templates.get(name)
+        if template is not None and not self.auto_reload:
+            return template
+        path = self.directory / name
+        mtime = os.stat(path).st_mtime_ns
+        if template is not None and template.version == mtime:
+            return template
+        with open(path, "r", encoding="utf-8") as f:
+            template = Template(f.read(), name=name, version=mtime)
+        with self._lock:
+            self._templates[name] = template
+        return template
+
+_loader = TemplateLoader(auto_reload=os.environ.get('SHOP_DEV') == '1')
+
+def configure_templates(auto_reload: bool) -> None:
+    """共有のテンプレート読み込み設定を変更 (auto_reload は開発用)"""
+    global _loader
+    _loader = TemplateLoader(auto_reload=auto_reload)
+
+def get_template(name: str) -> Template:
+    """共有のローダーからテンプレートを取得"""
+    return _loader.get(name)
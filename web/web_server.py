@@ -1,59 +1,170 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
-import uuid
+import argparse
+import sys
 from pathlib import Path
-from render_select_all import render_products_page
+from render_select_all import (get_products_page, page_cache_stats, render_search_page,
+                               stream_products_page)
+from template_engine import configure_templates, get_template
+from data_backend import BACKENDS as DATA_BACKENDS, configure_data_backend, get_data_backend
+from static_files import CACHE_DIR as STATIC_CACHE_DIR, STATIC_ROOT, URL_PREFIX as STATIC_PREFIX
+from static_files import StaticFileMixin, StaticFiles
+from session_store import (BACKENDS as SESSION_BACKENDS, DEFAULT_TTL as SESSION_TTL,
+                           configure_session_store, get_session_store, parse_cookies)
 import re
-import http.client
-import json
-import html  # htmlモジュールを追加
 
-# セッション管理（実際のアプリケーションではデータベースやRedisなどを使用すべき）
-sessions = {}
+# プロジェクトルートへのパスを追加 (共通部品を読み込むため)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.http_cache import (applied_encoding, compress, encoding_etag, etag_matches,
+                               negotiate_encoding)
+from common.access_log import AccessLog
+from common.http_servers import SERVER_MODES, make_server
+from common.prefork import DRAIN_TIMEOUT, PreforkSupervisor
+from common.http_streaming import StreamingResponseMixin
+from common.metrics import MetricsMixin, MetricsRegistry
 
 # テスト用ユーザー（実際のアプリケーションではデータベースで管理すべき）
 USERS = {
     "admin": "password123"
 }
 
-class WebHandler(BaseHTTPRequestHandler):
-    def get_template(self, template_name):
-        """テンプレートファイルを読み込む"""
-        template_path = Path(__file__).parent / "templates" / template_name
-        with open(template_path, "r", encoding="utf-8") as f:
-            return f.read()
+class WebHandler(MetricsMixin, StaticFileMixin, StreamingResponseMixin, BaseHTTPRequestHandler):
+    # 持続的接続とチャンク転送での全件表示に必要
+    protocol_version = 'HTTP/1.1'
+    # 送受信のタイムアウト (threaded モードで次のリクエストを待つ秒数は
+    # サーバーの keep_alive_timeout)
+    timeout = 15
+    # ヘッダーと本文を別々に書き込むため、Nagle アルゴリズムと遅延 ACK が重なると
+    # 小さな応答が約40ミリ秒待たされる (TCP_NODELAY を設定する)
+    disable_nagle_algorithm = True
+    # メトリクスでルートごとに数えるパス (商品詳細は /product/{id} にまとめ、それ以外は other)
+    metrics_routes = frozenset(['/', '/products', '/logout', '/login', '/add_to_cart', '/metrics'])
+
+    def _metrics_route(self, path):
+        if path in self.metrics_routes:
+            return path
+        if path.startswith(STATIC_PREFIX):
+            return STATIC_PREFIX
+        return '/product/{id}' if re.match(r'/product/\d+$', path) else 'other'
+
+    def send_text(self, status, text):
+        """HTMLまたはテキストの本文を返す"""
+        body = text.encode()
+        with self._phase('write'):
+            self.send_response(status)
+            self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if not self._keep_alive():
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(body)
+
+    def send_redirect(self, location, headers=None):
+        """302 で location へリダイレクトする"""
+        self.send_response(302)
+        self.send_header('Location', location)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        if not self._keep_alive():
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def send_stream(self, parts):
+        """bytes のイテラブルを届いた順に送信する
+
+        先頭部分をすぐに送るため、応答全体の生成を待たずに表示が始まる。
+        """
+        self._start_stream('text/html; charset=utf-8',
+                           {'Cache-Control': 'private, no-store'})
+        try:
+            for part in parts:
+                self._write_chunk(part)
+        except Exception as e:
+            # ヘッダー送信後は終端を送らずに切断してクライアントに失敗を伝える
+            print(f"描画エラー: {e}")
+            self.close_connection = True
+            return
+        self._end_stream()
+
+    def send_html(self, body: bytes, etag=None, encoded=None):
+        """HTMLを返す
+
+        etag があれば If-None-Match と比較して一致すれば 304 を返す。
+        Accept-Encoding に応じて圧縮し、encoded (辞書) があれば圧縮結果を保持して使い回す。
+        """
+        # 小さい本文は圧縮しないため、ETag にも圧縮形式を付けない
+        content_encoding = applied_encoding(
+            negotiate_encoding(self.headers.get('Accept-Encoding')), len(body))
+        if etag:
+            etag = encoding_etag(etag, content_encoding)
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Vary', 'Accept-Encoding')
+                if not self._keep_alive():
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+                return
 
-    def apply_template(self, template, **kwargs):
-        """テンプレートに値を適用"""
-        for key, value in kwargs.items():
-            template = template.replace('{{' + key + '}}', str(value))
-        return template
+        if content_encoding:
+            compressed = encoded.get(content_encoding) if encoded is not None else None
+            if compressed is None:
+                with self._phase('compress'):
+                    compressed = compress(body, content_encoding)
+                if encoded is not None:
+                    encoded[content_encoding] = compressed
+            body = compressed
+
+        with self._phase('write'):
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Vary', 'Accept-Encoding')
+            if content_encoding:
+                self.send_header('Content-Encoding', content_encoding)
+            if etag:
+                self.send_header('ETag', etag)
+                # ログインが必要なページのため共有キャッシュには置かせず、毎回再検証させる
+                self.send_header('Cache-Control', 'private, no-cache')
+            if not self._keep_alive():
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(body)
+
+    def get_cookies(self):
+        """リクエストの Cookie を取得 (同じリクエストでは解析結果を使い回す)"""
+        if getattr(self, '_cookie_headers', None) is not self.headers:
+            self._cookie_headers = self.headers
+            self._cookies = parse_cookies(self.headers.get('Cookie'))
+        return self._cookies
+
+    def get_session_id(self):
+        """Cookie からセッションIDを取得 (なければ None)"""
+        return self.get_cookies().get('session')
 
     def check_session(self):
-        """セッションの確認"""
-        cookie = self.headers.get('Cookie')
-        if cookie:
-            for c in cookie.split(';'):
-                if c.strip().startswith('session='):
-                    session_id = c.split('=')[1].strip()
-                    return session_id in sessions
-        return False
+        """セッションの確認 (有効なら有効期限を延ばす)"""
+        return get_session_store().get(self.get_session_id()) is not None
+
+    def reserve_product(self, product_id, quantity, owner):
+        """在庫を引き当てる (戻り値は (ステータス, 応答データ))"""
+        try:
+            with self._phase('db'):
+                return get_data_backend().reserve(product_id, quantity, owner)
+        except Exception as e:
+            print(f"APIエラー: {e}")
+            return 503, {}
 
     def get_product_from_api(self, product_id):
-        """DBサーバーから特定の商品情報を取得"""
+        """データの取得先から特定の商品情報を取得 ({列名: 値} の辞書、なければ None)"""
         try:
-            conn = http.client.HTTPConnection("localhost", 8000)
-            conn.request("GET", f"/select?id={product_id}")
-            response = conn.getresponse()
-            data = json.loads(response.read().decode())
-            if data.get('products'):
-                return data['products'][0]
-            return None
+            with self._phase('db'):
+                return get_data_backend().product(int(product_id))
         except Exception as e:
             print(f"APIエラー: {e}")
             return None
-        finally:
-            conn.close()
 
     def do_GET(self):
         """GETリクエストの処理"""
@@ -66,84 +177,94 @@ class WebHandler(BaseHTTPRequestHandler):
             # ログインチェック
             if self.check_session():
                 # 既にログインしている場合は商品一覧へリダイレクト
-                self.send_response(302)
-                self.send_header('Location', '/products')
-                self.end_headers()
+                self.send_redirect('/products')
                 return
 
             # ログインページの表示
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            template = self.get_template("login.html")
-            self.wfile.write(template.encode())
+            with self._phase('render'):
+                html_content = get_template("login.html").render()
+            self.send_text(200, html_content)
 
         elif path == '/products':
             # ログインチェック
             if not self.check_session():
-                self.send_response(302)
-                self.send_header('Location', '/')
-                self.end_headers()
+                self.send_redirect('/')
+                return
+
+            params = parse_qs(urlparse(self.path).query)
+            query = params.get('q', [''])[0].strip()
+            if query:
+                # 検索結果の表示
+                offset = params.get('offset', ['0'])[0]
+                offset = int(offset) if offset.isdigit() else 0
+                with self._phase('render'):
+                    body = render_search_page(query, offset).encode()
+                self.send_html(body)
+                return
+
+            if params.get('stream', [''])[0] == '1':
+                # 全件表示は描画しながら送信する
+                self.send_stream(stream_products_page())
                 return
 
             # 商品一覧ページの表示
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            html_content = render_products_page()
-            self.wfile.write(html_content.encode())
+            cursor = params.get('cursor', [None])[0]
+            # DBへの再検証を含む (変更がなければ描画済みのページを使い回す)
+            with self._phase('render'):
+                page = get_products_page(cursor)
+            self.send_html(page['body'], etag=page['etag'], encoded=page['encoded'])
 
         elif path == '/logout':
-            # ログアウト処理
-            cookie = self.headers.get('Cookie')
-            if cookie:
-                for c in cookie.split(';'):
-                    if c.strip().startswith('session='):
-                        session_id = c.split('=')[1].strip()
-                        if session_id in sessions:
-                            del sessions[session_id]
-
-            self.send_response(302)
-            self.send_header('Location', '/')
-            self.end_headers()
+            # ログアウト処理 (ブラウザの Cookie も消す)
+            get_session_store().delete(self.get_session_id())
+            self.send_redirect('/', {'Set-Cookie': 'session=; Path=/; Max-Age=0; HttpOnly'})
+
+        elif path == '/metrics':
+            self._send_metrics()
+
+        elif path.startswith(STATIC_PREFIX):
+            # 静的ファイル (SPA) の配信
+            if not self.send_static(path):
+                self.send_text(404, "ファイルが見つかりません")
 
         elif product_match:
             # 商品詳細ページの表示
             if not self.check_session():
-                self.send_response(302)
-                self.send_header('Location', '/')
-                self.end_headers()
+                self.send_redirect('/')
                 return
 
             product_id = product_match.group(1)
             product = self.get_product_from_api(product_id)
             
             if product:
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html; charset=utf-8')
-                self.end_headers()
-                
-                template = self.get_template("product_detail.html")
-                html_content = self.apply_template(
-                    template,
-                    id=product[0],
-                    name=html.escape(product[1]),
-                    price=html.escape(str(product[2])),
-                    description=html.escape(product[3]),
-                    stock=html.escape(str(product[4]))
-                )
-                self.wfile.write(html_content.encode())
+                # 値はテンプレート側でエスケープされる
+                with self._phase('render'):
+                    html_content = get_template("product_detail.html").render(
+                        id=product['id'],
+                        name=product['name'],
+                        price=product['price'],
+                        description=product['description'],
+                        stock=product['stock']
+                    )
+                self.send_text(200, html_content)
             else:
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write("商品が見つかりません".encode())
+                self.send_text(404, "商品が見つかりません")
+
+        else:
+            self.send_text(404, "ページが見つかりません")
+
+    def do_HEAD(self):
+        """HEADリクエストの処理 (静的ファイルのみ)"""
+        if not self.send_static(urlparse(self.path).path):
+            self.send_error(404)
 
     def do_POST(self):
         """POSTリクエストの処理"""
+        # 持続的接続では本文を読み切らないと次のリクエストとずれるため先に読む
+        content_length = int(self.headers.get('Content-Length', 0))
+        post_data = self.rfile.read(content_length).decode('utf-8')
+
         if self.path == '/login':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length).decode('utf-8')
             params = parse_qs(post_data)
 
             username = params.get('username', [''])[0]
@@ -152,42 +273,156 @@ class WebHandler(BaseHTTPRequestHandler):
             # 認証チェック
             if username in USERS and USERS[username] == password:
                 # セッションの作成
-                session_id = str(uuid.uuid4())
-                sessions[session_id] = username
+                store = get_session_store()
+                session_id = store.create(username)
 
-                self.send_response(302)
-                self.send_header('Set-Cookie', f'session={session_id}')
-                self.send_header('Location', '/products')
-                self.end_headers()
+                self.send_redirect('/products', {
+                    'Set-Cookie': f'session={session_id}; Path=/; Max-Age={int(store.ttl)}; '
+                                  'HttpOnly; SameSite=Lax'})
             else:
                 # 認証失敗
-                self.send_response(401)
-                self.send_header('Content-type', 'text/html; charset=utf-8')
-                self.end_headers()
-                self.wfile.write("認証に失敗しました".encode())
+                self.send_text(401, "認証に失敗しました")
 
         elif self.path == '/add_to_cart':
-            if not self.check_session():
-                self.send_response(401)
-                self.end_headers()
+            username = get_session_store().get(self.get_session_id())
+            if username is None:
+                self.send_text(401, "ログインしてください")
                 return
 
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length).decode('utf-8')
             params = parse_qs(post_data)
             product_id = params.get('product_id', [''])[0]
+            quantity = params.get('quantity', ['1'])[0]
+            if not product_id.isdigit() or not quantity.isdigit() or int(quantity) < 1:
+                self.send_text(400, "商品または数量の指定が不正です")
+                return
 
-            # ここでカートに商品を追加する処理を実装
-            # （現在は仮の実装）
-            self.send_response(302)
-            self.send_header('Location', f'/product/{product_id}')
-            self.end_headers()
+            # 在庫をユーザー名で引き当てる (期限内に確定しなければ在庫に戻る)。
+            # 予約の持ち主はDBに保存され /reservations で参照できるため、
+            # 認証に使うセッションIDは渡さない
+            status, data = self.reserve_product(int(product_id), int(quantity), username)
+            if status == 200:
+                self.send_redirect(f'/product/{product_id}')
+            elif status == 409:
+                self.send_text(409, "在庫が不足しています")
+            elif status == 404:
+                self.send_text(404, "商品が見つかりません")
+            else:
+                self.send_text(503, "カートに追加できませんでした")
 
-def run_web_server(port=8001):
+        else:
+            self.send_text(404, "ページが見つかりません")
+
+def run_web_server(port=8001, mode='threaded', workers=8, db_host='localhost', db_port=8000,
+                   dev=False, access_log_sample=0.01, session_backend='memory',
+                   session_ttl=SESSION_TTL, session_db=None, static_root=STATIC_ROOT,
+                   static_cache=STATIC_CACHE_DIR, data_backend='http', db_path=None,
+                   processes=1, reuse_port=False, drain_timeout=DRAIN_TIMEOUT):
+    """Webサーバーを起動 (mode は db_server.run_server と同じ)
+
+    dev を指定するとテンプレートの更新を検知して読み込み直す。
+    /metrics と access_log_sample は db_server.run_server と同じ。
+    session_backend は memory (プロセス内) か sqlite (session_db のファイルを
+    複数のプロセスで共有し、再起動後も残る)。session_ttl は最後のアクセスからの有効期間 (秒)。
+    static_root のファイルを /static/ で配信する (static_cache に配信用のコピーと gzip 版を作る)。
+    data_backend は商品データの取得先。http は db_host:db_port のDBサーバーに
+    HTTP で問い合わせ、local は同じプロセスで db_path (省略時は db/shop.db) を直接読み書きする。
+    processes・reuse_port・drain_timeout は db_server.run_server と同じ。
+    ワーカーごとにリクエストが振り分けられるため、processes が2以上の場合は
+    セッションを共有できる sqlite を指定すること (描画済みページのキャッシュと
+    /metrics の値はワーカーごと。ワーカーごとの件数は web_workers_* で返す)。
+    """
+    if processes > 1 and session_backend == 'memory':
+        raise ValueError("processes が2以上の場合は session_backend に sqlite を指定してください "
+                         "(memory ではワーカー間でログイン状態を共有できません)")
     server_address = ('', port)
-    httpd = HTTPServer(server_address, WebHandler)
-    print(f'Starting web server on port {port}...')
-    httpd.serve_forever()
+
+    def serve(worker=None):
+        if dev:
+            configure_templates(auto_reload=True)
+        # ワーカーごとに1本ずつDBサーバーへの持続的接続 (local ではDBへの接続) を使えるようにする
+        if data_backend == 'local':
+            backend_options = {'pool_size': workers}
+            if db_path:
+                backend_options['db_path'] = db_path
+        else:
+            backend_options = {'host': db_host, 'port': db_port, 'pool_size': workers}
+        backend = configure_data_backend(data_backend, **backend_options)
+        backend.start()
+        session_options = {'ttl': session_ttl}
+        if session_backend == 'sqlite':
+            session_options['pool_size'] = workers
+            if session_db:
+                session_options['db_path'] = session_db
+        sessions = configure_session_store(session_backend, **session_options)
+        sessions.start()
+        httpd = make_server(server_address, WebHandler, mode=mode, workers=workers,
+                            sock=worker.socket if worker else None)
+        httpd.access_log = AccessLog(sample_rate=access_log_sample)
+        httpd.static_files = StaticFiles(static_root, static_cache)
+        httpd.metrics = MetricsRegistry('web')
+        httpd.metrics.add_stats('data_backend', f'データの取得先 ({backend.name})', backend.stats)
+        httpd.metrics.add_stats('page_cache', '描画済みページのキャッシュ', page_cache_stats)
+        httpd.metrics.add_stats('sessions', 'セッション', sessions.stats)
+        httpd.metrics.add_stats('static', '静的ファイル', httpd.static_files.stats)
+        httpd.metrics.add_stats('access_log', 'アクセスログ', httpd.access_log.stats)
+        try:
+            if worker is not None:
+                worker.serve(httpd)
+            else:
+                httpd.serve_forever()
+        finally:
+            backend.close()
+            sessions.close()
+            httpd.access_log.flush()
+
+    if processes > 1:
+        supervisor = PreforkSupervisor(server_address, processes, serve,
+                                       reuse_port=reuse_port, drain_timeout=drain_timeout,
+                                       name='web')
+        print(f'Starting web server on port {port} ({mode} x {processes} processes, '
+              f'data={data_backend})...')
+        supervisor.run()
+        return
+    print(f'Starting web server on port {port} ({mode}, data={data_backend})...')
+    serve()
 
 if __name__ == '__main__':
-    run_web_server()
+    parser = argparse.ArgumentParser(description='Webサーバー')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--mode', choices=SERVER_MODES, default='threaded',
+                        help='並行処理モード')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='ワーカースレッド数 (threaded / async)')
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', type=int, default=8000)
+    parser.add_argument('--dev', action='store_true',
+                        help='テンプレートの更新を検知して読み込み直す')
+    parser.add_argument('--access-log-sample', type=float, default=0.01,
+                        help='アクセスログに記録するリクエストの割合 (0〜1)')
+    parser.add_argument('--session-backend', choices=sorted(SESSION_BACKENDS), default='memory',
+                        help='セッションの保存先 (sqlite は複数プロセスで共有できる)')
+    parser.add_argument('--session-ttl', type=float, default=SESSION_TTL,
+                        help='セッションの有効期間 (秒、最後のアクセスから)')
+    parser.add_argument('--session-db', default=None,
+                        help='sqlite のセッションを保存するファイル (省略時は web/sessions.db)')
+    parser.add_argument('--static-root', default=STATIC_ROOT,
+                        help='/static/ で配信するディレクトリ (省略時は SPA)')
+    parser.add_argument('--static-cache', default=STATIC_CACHE_DIR,
+                        help='配信用のコピーと gzip 版を置くディレクトリ')
+    parser.add_argument('--data-backend', choices=sorted(DATA_BACKENDS), default='http',
+                        help='商品データの取得先 (http: DBサーバー、local: 同じプロセスでDBを直接読む)')
+    parser.add_argument('--db-path', default=None,
+                        help='local で使うDBファイル (省略時は db/shop.db)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='ワーカープロセス数 (2以上では --session-backend sqlite が必要)')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='各ワーカーが SO_REUSEPORT でそれぞれ待ち受ける (--processes と併用)')
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help='停止時に処理中のリクエストを待つ秒数 (--processes と併用)')
+    args = parser.parse_args()
+    if args.processes > 1 and args.session_backend == 'memory':
+        parser.error('--processes が2以上の場合は --session-backend sqlite を指定してください')
+    run_web_server(args.port, args.mode, args.workers, args.db_host, args.db_port, args.dev,
+                   args.access_log_sample, args.session_backend, args.session_ttl,
+                   args.session_db, args.static_root, args.static_cache, args.data_backend,
+                   args.db_path, args.processes, args.reuse_port, args.drain_timeout)